@@ -10,20 +10,42 @@ Then you can run the script with the following command :
 
     python Auto_Naccess.py pdb_name.pdb csv_file.csv /home/meraouna/Téléchargements/naccess2.1.1/naccess
 
+    python Auto_Naccess.py pdb_name.pdb csv_file.csv /path/to/naccess --jobs 4
+
+ without the naccess binary (in process Shrake-Rupley) :
+    python Auto_Naccess.py pdb_name.pdb csv_file.csv --backend shrake --n_points 100
+
+The copies of a chain (same interfaces, see Interface_Fingerprint.py) get the
+tables of the first copy instead of being computed again, --keep_duplicates
+computes every chain.
+
+The chain files and the tables are written in Results/<pdb>/chain_<chain>/,
+--results gives another directory than Results/ :
+
+    python Auto_Naccess.py pdb_name.pdb csv_file.csv --backend shrake --results /scratch/run1/
+
   Author
   ------
     Hocine Meraouna
 
 """
 
+import numpy as np
 import pandas as pd
 import os
+import shutil
+import tempfile
 import argparse
-from Bio.PDB import NACCESS 
-from Bio.PDB import PDBParser
+from concurrent.futures import ProcessPoolExecutor
+import Pdb_Structure as ps
+import Run_Metrics as rm
+import Interface_Fingerprint as ifp
 import warnings
 warnings.filterwarnings("ignore")
 
+#accessibility backends accepted by call_naccess()
+BACKENDS = ('naccess', 'shrake')
+
 
 def keep_nbr(x):
     return x.split('[')[0].split()[1]
@@ -31,9 +53,23 @@ def keep_nbr(x):
 
 def interacting_chains(csv):
     """
+    The function to get, for every interacting chain, the partner residues
+    around its interface ('chain resseq' keys).
+
+    Parameters
+    ----------
+    csv : string or pandas DataFrame
+        the InteractionSheet csv file or the DataFrame given by
+        Pisa_xml_parser.create_df()
+
+    Returns
+    -------
+    dictionary
     """
-
-    df = pd.read_csv(csv, usecols = [2,3,6,7]).drop_duplicates()
+    if isinstance(csv, pd.DataFrame):
+        df = csv[['chain1', 'res1', 'chain2', 'res2']].drop_duplicates()
+    else:
+        df = pd.read_csv(csv, usecols = [2,3,6,7]).drop_duplicates()
 
     df['res1'] = df['res1'].apply(keep_nbr)
     df['res2'] = df['res2'].apply(keep_nbr)
@@ -56,86 +92,514 @@ def interacting_chains(csv):
     return dico
 
 
-def pdb_solo_chains(pdb):
+def chain_duplicates(csv):
     """
+    The function to get the copies of the interacting chains, the chains
+    with the same interfaces (see Interface_Fingerprint.chain_duplicates()).
+
+    Parameters
+    ----------
+    csv : string or pandas DataFrame
+        the InteractionSheet csv file or the DataFrame given by
+        Pisa_xml_parser.create_df()
+
+    Returns
+    -------
+    dictionary
+        chain -> representative chain, only for the copies
     """
+    if not isinstance(csv, pd.DataFrame):
+        csv = pd.read_csv(csv, usecols=['chain1', 'res1', 'chain2', 'res2', 'interaction type'])
 
-    chains_lst = []
+    return ifp.chain_duplicates(csv)
 
-    with open(pdb, 'r') as pdb_file:
-        for line in pdb_file:
-            if line.startswith('ATOM'):
-                if len(line.split()[4]) > 1:
-                    chain = line.split()[4][0]
-                else:
-                    chain = line.split()[4]
-                if not os.path.exists('Results/'+pdb.split('/')[-1]+'/chain_'+chain):
-                    os.makedirs('Results/'+pdb.split('/')[-1]+'/chain_'+chain)
-                if chain not in chains_lst:
-                    f = open('Results/'+pdb.split('/')[-1]+'/chain_'+chain+'/'+chain+'_solo.pdb', 'w')
-                    chains_lst.append(chain)
-                else :
-                    f = open('Results/'+pdb.split('/')[-1]+'/chain_'+chain+'/'+chain+'_solo.pdb', 'a')
-                f.write(line)
-                f.close()
+
+def copy_access(df, rep, k):
+    """
+    The function to give the accessibility table of chain rep to its copy k.
+    """
+    df = df.copy()
+    df['chain'] = df['chain'].replace(rep, k)
+    return df
 
 
-def pdb_complex_chains(pdb, dico):
+def chain_atoms(atoms, k, sol_comp, dico=None, keys=None):
     """
+    The function to select the atoms of the solo or complex file of chain k,
+    the complex holds the chain and the partner residues around its interface.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+        the ATOM records
+    k : string
+        the chain name
+    sol_comp : string
+        'solo' or 'complex'
+    dico : dictionary
+        the dictionary given by interacting_chains(), needed for 'complex'
+    keys : numpy array
+        Pdb_Structure.residue_keys(atoms), computed when not given
+
+    Returns
+    -------
+    numpy structured array
     """
+    if sol_comp == 'solo':
+        return atoms[atoms['chain'] == k]
+    if keys is None:
+        keys = ps.residue_keys(atoms)
+
+    return atoms[(atoms['chain'] == k) | np.isin(keys, dico[k])]
+
+
+def short_chains(atoms):
+    """
+    The function to get the one character chains of a structure, they are
+    never given as alias to the longer chains (see
+    Pdb_Structure.chain_aliases()).
+
+    Returns
+    -------
+    list
+    """
+    return [c for c in ps.chains(atoms) if len(c) == 1]
+
+
+def chain_file(results, pdb, k, sol_comp):
+    """
+    The function to get the path of a chain file,
+    <results>/<pdb>/chain_<k>/<k>_<sol_comp>.pdb.
+    """
+    return os.path.join(results, pdb, 'chain_'+k, k+'_'+sol_comp+'.pdb')
+
+
+@rm.timed('chains.solo')
+def pdb_solo_chains(pdb, atoms=None, results='Results/'):
+    """
+    The function to write the <chain>_solo.pdb file of every chain.
+
+    Parameters
+    ----------
+    pdb : string
+        the pdb file
+    atoms : numpy structured array
+        the atoms given by Pdb_Structure.load_structure(), loaded from pdb
+        when not given
+    results : string
+        the results directory, the files are written in
+        <results>/<pdb>/chain_<chain>/
+
+    Returns
+    -------
+    Nothing
+    """
+    if atoms is None:
+        atoms = ps.load_structure(pdb)
+    atoms = atoms[atoms['record'] == 'ATOM']
+    taken = short_chains(atoms)
+
+    for chain in ps.chains(atoms):
+        solo_file = chain_file(results, pdb.split('/')[-1], chain, 'solo')
+        os.makedirs(os.path.dirname(solo_file), exist_ok=True)
+        ps.write_pdb(chain_atoms(atoms, chain, 'solo'), solo_file, ps.chain_aliases([chain], taken))
+
+
+@rm.timed('chains.complex')
+def pdb_complex_chains(pdb, dico, atoms=None, results='Results/'):
+    """
+    The function to write the <chain>_complex.pdb file of every interacting
+    chain, the chain and the partner residues around its interface.
+
+    Parameters
+    ----------
+    pdb : string
+        the pdb file
+    dico : dictionary
+        the dictionary given by interacting_chains()
+    atoms : numpy structured array
+        the atoms given by Pdb_Structure.load_structure(), loaded from pdb
+        when not given
+    results : string
+        the results directory, see pdb_solo_chains()
+
+    Returns
+    -------
+    Nothing
+    """
+    if atoms is None:
+        atoms = ps.load_structure(pdb)
+    atoms = atoms[atoms['record'] == 'ATOM']
+    taken = short_chains(atoms)
+    keys = ps.residue_keys(atoms)
 
     for k in dico:
-        f = open('Results/'+pdb.split('/')[-1]+'/chain_'+k+'/'+k+'_complex.pdb', 'w')#'_'+''.join(dico[k])+
-        with open(pdb, 'r') as pdb_file:
-            for line in pdb_file:
-                if line.startswith('ATOM'):
-                    if len(line.split()[4]) > 1:
-                        chain = line.split()[4][0]
-                        rsn = line.split()[4][1:]
-                    else:
-                        chain = line.split()[4]
-                        rsn = line.split()[5]
-                    if chain == k:
-                        f.write(line)
-                    elif chain+' '+rsn in dico[k]:
-                        f.write(line)
-        f.close()
-
-
-def run_naccess(k, sol_comp, naccess_path, pdb):
+        complex_atoms = chain_atoms(atoms, k, 'complex', dico, keys)
+        #k first so it gets the alias of its solo file
+        names = [k]+[c for c in ps.chains(complex_atoms) if c != k]
+        ps.write_pdb(complex_atoms, chain_file(results, pdb.split('/')[-1], k, 'complex'),
+                     ps.chain_aliases(names, taken))
+
+
+def written_chain(k, pdb, results='Results/'):
     """
+    The function to get the one character name chain k was written with in
+    its chain files (chains longer than one character are renamed by
+    Pdb_Structure.chain_aliases(), k is first in its solo and complex files
+    so it has the same alias in both).
+
+    Parameters
+    ----------
+    k : string
+        the chain name
+    pdb : string
+        the pdb file name (sub folder of results)
+    results : string
+        the results directory
+
+    Returns
+    -------
+    string
     """
+    if len(k) == 1:
+        return k
+
+    with open(chain_file(results, pdb, k, 'solo'), 'r') as solo:
+        for line in solo:
+            if line.startswith('ATOM'):
+                return line[21]
+
+    return k[0]
+
+
+def run_naccess(k, sol_comp, naccess_path, pdb, tmp_dir='/tmp', results='Results/'):
+    """
+    The function to run NACCESS on one chain file and read its per residue
+    accessibility.
+
+    Parameters
+    ----------
+    k : string
+        the chain name
+    sol_comp : string
+        'solo' or 'complex'
+    naccess_path : string
+        the full path to the naccess bin
+    pdb : string
+        the pdb file name (sub folder of results)
+    tmp_dir : string
+        the scratch directory given to NACCESS
+    results : string
+        the results directory
+
+    Returns
+    -------
+    pandas DataFrame
+    """
+    from Bio.PDB import NACCESS
+
     chain_csv_solo = {'chain': [], 'res': [], sol_comp+' access': []}
 
-    pdb_file = os.getcwd()+'/Results/'+pdb+'/chain_'+k+'/'+k+'_'+sol_comp+'.pdb'
-    p = PDBParser()
-    s = p.get_structure("X", pdb_file)
-    model = s[0]
-    n = NACCESS.NACCESS(model, pdb_file, naccess_binary=naccess_path)
-    
-    for e in n:
-        res = e[0].xtra['EXP_NACCESS']['res_name']
-        chain = e[0].full_id[2]
-        resnbr = str(e[0].full_id[3][1])
-        acc = e[0].xtra['EXP_NACCESS']['all_atoms_abs']
+    #NACCESS runs in tmp_dir, it needs the absolute path
+    pdb_file = os.path.abspath(chain_file(results, pdb, k, sol_comp))
+    rsa_data, asa_data = NACCESS.run_naccess(None, pdb_file, naccess=naccess_path, temp_path=tmp_dir)
+
+    for (chain, res_id), e in NACCESS.process_rsa_data(rsa_data).items():
         chain_csv_solo['chain'].append(chain)
-        chain_csv_solo['res'].append(res+' '+resnbr)
-        chain_csv_solo[sol_comp+' access'].append(acc)
+        chain_csv_solo['res'].append(e['res_name']+' '+str(res_id[1]))
+        chain_csv_solo[sol_comp+' access'].append(e['all_atoms_abs'])
 
     return pd.DataFrame.from_dict(chain_csv_solo)
 
 
-def call_naccess(dico, naccess_path, pdb):
+def sphere_points(n_points):
     """
+    The function to place n points evenly on the unit sphere (golden spiral).
+
+    Parameters
+    ----------
+    n_points : int
+
+    Returns
+    -------
+    numpy array of shape (n_points, 3)
     """
+    k = np.arange(n_points)
+    z = 1 - (2.0 / n_points) * (k + 0.5)
+    r = np.sqrt(1 - z * z)
+    longitude = k * np.pi * (3 - 5**0.5)
+
+    return np.stack([np.cos(longitude) * r, np.sin(longitude) * r, z], axis=1).astype(np.float32)
+
+
+def shrake_rupley(atoms, n_points=100, probe=1.40, chunk=4000000):
+    """
+    The function to compute the solvent accessible surface of every atom with
+    the Shrake-Rupley algorithm. The pairs of overlapping atoms are found with
+    a KD-tree and the sphere points of an atom are only tested against the
+    atoms overlapping it, chunk sphere points at a time. Biopython's
+    ShrakeRupley gives the same areas.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+        one alternate location per atom (see Pdb_Structure.first_altlocs())
+    n_points : int
+        number of points on each atom sphere
+    probe : float
+        probe radius in A
+    chunk : int
+        sphere point / neighbour tests held in memory at once
+
+    Returns
+    -------
+    numpy array
+        the accessible area of every atom in A²
+    """
+    from Bio.PDB.SASA import ATOMIC_RADII
+    from scipy.spatial import cKDTree
+
+    if len(atoms) == 0:
+        return np.zeros(0)
+
+    coords = atoms['xyz'].astype(np.float64)
+    radii = np.array([ATOMIC_RADII.get(e, 2.0) for e in atoms['element']]) + probe
+    sphere = sphere_points(n_points)
+
+    #both orders of every pair of overlapping spheres, sorted by atom
+    pairs = cKDTree(coords).query_pairs(2 * radii.max(), output_type='ndarray')
+    first = np.concatenate([pairs[:, 0], pairs[:, 1]])
+    other = np.concatenate([pairs[:, 1], pairs[:, 0]])
+    close = ((coords[first] - coords[other]) ** 2).sum(axis=1) < (radii[first] + radii[other]) ** 2
+    order = np.argsort(first[close], kind='stable')
+    first, other = first[close][order], other[close][order]
+    bounds = np.searchsorted(first, np.arange(len(atoms) + 1))
+
+    buried = np.zeros((len(atoms), n_points), dtype=bool)
+    step = max(1, chunk // n_points)
+    a = 0
+    while a < len(atoms):
+        b = min(len(atoms), max(a + 1, np.searchsorted(bounds, bounds[a] + step, side='right') - 1))
+        start, end = bounds[a], bounds[b]
+        if end > start:
+            i, j = first[start:end], other[start:end]
+            #|c_i + r_i s - c_j|² < r_j² written as one product with the sphere points
+            d = coords[i] - coords[j]
+            limit = (radii[j] ** 2 - radii[i] ** 2 - (d ** 2).sum(axis=1)) / (2 * radii[i])
+            hit = d @ sphere.T.astype(np.float64) < limit[:, None]
+            members = np.unique(i)
+            buried[members] = np.logical_or.reduceat(hit, bounds[members] - start, axis=0)
+        a = b
+
+    return (n_points - buried.sum(axis=1)) * 4 * np.pi * radii ** 2 / n_points
+
+
+def run_shrake_rupley(k, sol_comp, pdb, n_points=100, results='Results/'):
+    """
+    The function to compute the per residue accessibility in process with
+    shrake_rupley(), same columns as run_naccess().
+
+    Parameters
+    ----------
+    k : string
+        the chain name
+    sol_comp : string
+        'solo' or 'complex'
+    pdb : string
+        the pdb file name (sub folder of results)
+    n_points : int
+        number of points on each atom sphere, more points are more precise
+        but slower
+    results : string
+        the results directory
+
+    Returns
+    -------
+    pandas DataFrame
+    """
+    atoms = ps.load_structure(chain_file(results, pdb, k, sol_comp))
+
+    return residue_access(atoms, sol_comp, n_points=n_points)
+
+
+def residue_access(atoms, sol_comp, n_points=100):
+    """
+    The function to sum the shrake_rupley() accessibility of atoms by residue.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+    sol_comp : string
+        'solo' or 'complex', names the accessibility column
+    n_points : int
+        number of points on each atom sphere
+
+    Returns
+    -------
+    pandas DataFrame
+        chain, res and '<sol_comp> access' columns
+    """
+    atoms = ps.first_altlocs(atoms)
+    df = pd.DataFrame({'chain': atoms['chain'],
+                       'res': np.char.add(np.char.add(atoms['resname'], ' '), atoms['resseq'].astype('U')),
+                       sol_comp+' access': shrake_rupley(atoms, n_points=n_points)})
+    df = df.groupby(['chain', 'res'], sort=False, as_index=False)[sol_comp+' access'].sum()
+    df[sol_comp+' access'] = df[sol_comp+' access'].round(2)
+
+    return df
+
+
+def access_job(job):
+    """
+    The function running one (chain, solo/complex) accessibility job.
+    With the naccess backend the job gets a private scratch directory,
+    NACCESS writes fixed-name files in its working directory so two jobs
+    must never share one.
+
+    Parameters
+    ----------
+    job : tuple
+        (chain, 'solo' or 'complex', pdb, backend, naccess_path, n_points,
+        results)
+
+    Returns
+    -------
+    tuple
+        (chain, 'solo' or 'complex', pandas DataFrame)
+    """
+    k, sol_comp, pdb, backend, naccess_path, n_points, results = job
+
+    with rm.timer('access.'+backend, structure=pdb, chain=k, file=sol_comp):
+        if backend == 'shrake':
+            df = run_shrake_rupley(k, sol_comp, pdb, n_points=n_points, results=results)
+        else:
+            tmp_dir = tempfile.mkdtemp(prefix='naccess_'+k+'_'+sol_comp+'_')
+            try:
+                df = run_naccess(k, sol_comp, naccess_path, pdb, tmp_dir=tmp_dir, results=results)
+            finally:
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+    rm.count('chain_files')
+
+    alias = written_chain(k, pdb, results)
+    if alias != k:
+        df.loc[df['chain'] == alias, 'chain'] = k
+
+    return k, sol_comp, df
+
+
+def call_naccess(dico, naccess_path, pdb, jobs=1, backend='naccess', n_points=100, same=None, results='Results/'):
+    """
+    The function to compute the accessibility of the solo and complex file of
+    every chain and save the merged <chain>_access.csv tables.
+
+    Parameters
+    ----------
+    dico : dictionary
+        the dictionary given by interacting_chains()
+    naccess_path : string
+        the full path to the naccess bin, only used by the naccess backend
+    pdb : string
+        the pdb file name (sub folder of results)
+    jobs : int
+        number of worker processes, 1 runs everything in this process and
+        0 uses every core
+    backend : string
+        one of BACKENDS, 'naccess' runs the external binary and 'shrake'
+        computes the accessibility in process with shrake_rupley()
+    n_points : int
+        sphere point density of the shrake backend
+    same : dictionary
+        chain -> representative chain given by chain_duplicates(), the
+        accessibility of a copy is not computed but taken from its
+        representative
+    results : string
+        the results directory holding the chain files written by
+        pdb_solo_chains() and pdb_complex_chains()
+
+    Returns
+    -------
+    dictionary
+        chain -> the merged pandas DataFrame also saved in <chain>_access.csv
+    """
+    if backend not in BACKENDS:
+        raise ValueError("Unknown accessibility backend "+str(backend)+", use one of "+', '.join(BACKENDS))
+    if backend == 'naccess' and not naccess_path:
+        raise ValueError("The naccess backend needs the path to the naccess bin")
+
+    same = same or {}
+    rm.count('access_copies', len([keyy for keyy in dico if keyy in same]))
+    todo = [(keyy, sol_comp, pdb, backend, naccess_path, n_points, results)
+            for keyy in dico if keyy not in same for sol_comp in ('solo', 'complex')]
+
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    jobs = min(jobs, len(todo)) if todo else 1
+
+    tables = {}
+    if jobs == 1:
+        for job in todo:
+            print(" - "+backend+" on "+job[1]+" chains", job[0])
+            k, sol_comp, df = access_job(job)
+            tables[(k, sol_comp)] = df
+    else:
+        print(" - "+backend+" on "+str(len(todo))+" chain files with "+str(jobs)+" processes")
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            for k, sol_comp, df in executor.map(access_job, todo):
+                tables[(k, sol_comp)] = df
+
+    merged = {}
     for keyy in dico:
-        print(" - Naccess on solo chains", keyy)
-        df_solo = run_naccess(keyy, 'solo', naccess_path, pdb)
-        print(" - Naccess on complex chains", keyy)
-        df_comp = run_naccess(keyy, 'complex', naccess_path, pdb)
+        if keyy in same:
+            continue
+        merged[keyy] = pd.merge(tables[(keyy, 'solo')], tables[(keyy, 'complex')], on=["chain", "res"])
+    for keyy in dico:
+        if keyy in same:
+            merged[keyy] = copy_access(merged[same[keyy]], same[keyy], keyy)
+        merged[keyy].to_csv(os.path.join(results, pdb, 'chain_'+keyy, keyy+'_access.csv'))
+
+    return merged
+
 
-        both = pd.merge(df_solo, df_comp, on=["chain", "res"])
-        both.to_csv(os.getcwd()+'/Results/'+pdb+'/chain_'+keyy+'/'+keyy+'_access.csv')
+def chains_access(atoms, dico, n_points=100, same=None):
+    """
+    The function to compute in memory, with shrake_rupley(), the accessibility
+    call_naccess() gives for every interacting chain, without writing the
+    chain files.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+        the atoms given by Pdb_Structure.load_structure()
+    dico : dictionary
+        the dictionary given by interacting_chains()
+    n_points : int
+        number of points on each atom sphere
+    same : dictionary
+        chain -> representative chain given by chain_duplicates(), the copies
+        get the tables of their representative
+
+    Returns
+    -------
+    dictionary
+        chain -> pandas DataFrame with the chain, res, solo access and
+        complex access columns
+    """
+    atoms = atoms[atoms['record'] == 'ATOM']
+    keys = ps.residue_keys(atoms)
+    same = same or {}
+    merged = {}
+
+    for k in dico:
+        if k in same:
+            continue
+        solo = residue_access(chain_atoms(atoms, k, 'solo'), 'solo', n_points=n_points)
+        comp = residue_access(chain_atoms(atoms, k, 'complex', dico, keys), 'complex', n_points=n_points)
+        merged[k] = pd.merge(solo, comp, on=["chain", "res"])
+    for k in dico:
+        if k in same:
+            merged[k] = copy_access(merged[same[k]], same[k], k)
+
+    return merged
 
 
 
@@ -143,11 +607,21 @@ if __name__ == '__main__':
 
     PARSER = argparse.ArgumentParser()
 
-    PARSER.add_argument("pdb_file", help="the pdb file", type=str)
+    PARSER.add_argument("pdb_file", help="the pdb or mmCIF file", type=str)
 
     PARSER.add_argument("csv_file", help="the csv interactions file", type=str)
 
-    PARSER.add_argument("naccess_path", help="the full path to the naccess bin", type=str)
+    PARSER.add_argument("naccess_path", help="the full path to the naccess bin (not needed with --backend shrake)", type=str, nargs='?')
+
+    PARSER.add_argument("--jobs", help="number of parallel naccess processes (0 for all cores)", default=1, type=int)
+
+    PARSER.add_argument("--backend", help="accessibility backend", choices=BACKENDS, default='naccess', type=str)
+
+    PARSER.add_argument("--n_points", help="sphere point density of the shrake backend", default=100, type=int)
+
+    PARSER.add_argument("--keep_duplicates", help="compute every copy of a chain instead of copying the tables of the first one", action='store_true')
+
+    PARSER.add_argument("--results", help="the directory the chain files and tables are written in", default='Results/', type=str)
 
     ARGS = PARSER.parse_args()
 
@@ -157,22 +631,32 @@ if __name__ == '__main__':
 
     NACCESS_PATH = ARGS.naccess_path
 
+    JOBS = ARGS.jobs
+
+    BACKEND = ARGS.backend
+
+    if BACKEND == 'naccess' and NACCESS_PATH is None:
+        PARSER.error("naccess_path is required with the naccess backend")
+
     dic = interacting_chains(CSV)
 
+    ATOMS = ps.load_structure(PDB)
+
     print("1)- Generating Solo chains files :")
 
-    pdb_solo_chains(PDB)
+    pdb_solo_chains(PDB, ATOMS, results=ARGS.results)
 
     print("Done.")
 
     print("2)- Generating chains with interacting partners files :")
 
-    pdb_complex_chains(PDB, dic)
+    pdb_complex_chains(PDB, dic, ATOMS, results=ARGS.results)
 
     print('Done.')
 
     print("3)- Generating accessibility csv files :")
 
-    call_naccess(dic, NACCESS_PATH, PDB)
+    call_naccess(dic, NACCESS_PATH, PDB.split('/')[-1], jobs=JOBS, backend=BACKEND, n_points=ARGS.n_points,
+                 same=None if ARGS.keep_duplicates else chain_duplicates(CSV), results=ARGS.results)
 
     print('Done.')
@@ -0,0 +1,100 @@
+#!/usr/bin/python3
+"""
+Code to check that every PisaPy.py subcommand starts fast and only imports
+the heavy packages of its own step.
+
+  How to use
+  ----------
+Run the script with the following command :
+
+    python Bench_Imports.py
+    python Bench_Imports.py --max_seconds 1.5 --repeat 5
+
+Every subcommand is loaded (PisaPy.load()) in a fresh interpreter, the fastest
+of --repeat runs is kept. The script exits with status 1 when a subcommand
+takes more than --max_seconds or imports one of the HEAVY packages it is not
+allowed (ALLOWED).
+
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+#packages a subcommand must not import unless it is allowed below
+HEAVY = ('selenium', 'halo', 'matplotlib', 'Bio', 'networkx', 'seaborn', 'sklearn')
+
+ALLOWED = {'submit': ('selenium', 'halo')}
+
+SRC = os.path.dirname(os.path.abspath(__file__))
+
+PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import PisaPy
+PisaPy.load(sys.argv[1])
+seconds = time.perf_counter() - start
+print(json.dumps({'seconds': seconds, 'modules': sorted({m.split('.')[0] for m in sys.modules})}))
+"""
+
+
+def probe(command):
+    """
+    The function to load one subcommand in a fresh interpreter.
+
+    Returns
+    -------
+    dictionary
+        'seconds' and 'modules' (top level packages imported)
+    """
+    out = subprocess.run([sys.executable, '-c', PROBE, command], cwd=SRC, check=True,
+                         capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def bench(commands, repeat=3):
+    """
+    The function to time every subcommand.
+
+    Returns
+    -------
+    list of dictionaries
+        command, seconds and the heavy packages it imported
+    """
+    rows = []
+    for command in commands:
+        runs = [probe(command) for _ in range(repeat)]
+        rows.append({'command': command, 'seconds': min(r['seconds'] for r in runs),
+                     'heavy': [m for m in HEAVY if m in runs[0]['modules']]})
+    return rows
+
+
+if __name__ == '__main__':
+
+    sys.path.insert(0, SRC)
+    from PisaPy import COMMANDS
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("--commands", help="subcommands to check", nargs='+', choices=list(COMMANDS), default=list(COMMANDS))
+
+    PARSER.add_argument("--repeat", help="runs of each subcommand", default=3, type=int)
+
+    PARSER.add_argument("--max_seconds", help="import time allowed to a subcommand", default=2.0, type=float)
+
+    ARGS = PARSER.parse_args()
+
+    FAILED = []
+    for row in bench(ARGS.commands, ARGS.repeat):
+        extra = [m for m in row['heavy'] if m not in ALLOWED.get(row['command'], ())]
+        ok = row['seconds'] <= ARGS.max_seconds and not extra
+        print("%-10s %6.3f s  %-28s %s" % (row['command'], row['seconds'], ','.join(row['heavy']) or '-',
+                                          'ok' if ok else 'FAIL'))
+        if not ok:
+            FAILED.append(row['command'])
+
+    if FAILED:
+        print("Slow or heavy subcommands : "+', '.join(FAILED))
+        sys.exit(1)
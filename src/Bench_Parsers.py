@@ -0,0 +1,243 @@
+#!/usr/bin/python3
+"""
+Code to benchmark the xml parsers and analysis functions on synthetic PISA
+results (see Synthetic_Pisa.py) and to catch throughput regressions.
+
+  How to use
+  ----------
+First you need to have the python packages numpy and pandas.
+
+Record the baselines of this machine once :
+
+    python Bench_Parsers.py --save_baseline
+
+then check later versions against them, the script exits with status 1 when
+a function is more than --tolerance slower than its baseline, and with status
+2 when a function has no baseline for this scale on this machine :
+
+    python Bench_Parsers.py
+    python Bench_Parsers.py --chains 8 --interfaces 20 --bonds 200 --residues 1000 --tolerance 0.3
+
+Throughputs are given in items per second (bonds, interfaces, residues or
+atoms, see BENCHMARKS) for the fastest of --repeat runs. Baselines are kept in
+bench_baselines.json (--baseline) per scale, every run is appended to
+Results/ParserBenchmark.csv (--history). The baselines depend on the machine,
+so bench_baselines.json is not part of the repository.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from glob import glob
+import pandas as pd
+import Synthetic_Pisa as sp
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baselines.json')
+
+
+def bench_interfacetable_parse(data):
+    import Pisa_xml_parser as pxp
+    pxp.interfacetable_parse(data['table'])
+
+
+def bench_create_df(data):
+    import Pisa_xml_parser as pxp
+    pxp.create_df(data['parsed'])
+
+
+def bench_parse_interface(data):
+    import Parse_Interfacetable as pi
+    pi.parse_interface(data['table'])
+
+
+def bench_xmlbond_parser(data):
+    import Pisa_xml_parser as pxp
+    for xml_file in data['bond_files']:
+        pxp.xmlbond_parser(xml_file)
+
+
+def bench_xmlresidue_parser(data):
+    import Residue_xml_parser as rxp
+    for xml_file in data['residue_files']:
+        rxp.xmlresidue_parser(xml_file)
+
+
+def bench_interacting_chains(data):
+    import Auto_Naccess as an
+    an.interacting_chains(data['sheet'])
+
+
+def bench_load_pdb(data):
+    import Pdb_Structure as ps
+    ps.load_pdb(data['pdb'])
+
+
+#benchmark name, function, unit counted by the throughput
+BENCHMARKS = [('interfacetable_parse', bench_interfacetable_parse, 'bonds'),
+              ('create_df', bench_create_df, 'bonds'),
+              ('parse_interface', bench_parse_interface, 'interfaces'),
+              ('xmlbond_parser', bench_xmlbond_parser, 'bonds'),
+              ('xmlresidue_parser', bench_xmlresidue_parser, 'residues'),
+              ('interacting_chains', bench_interacting_chains, 'bonds'),
+              ('load_pdb', bench_load_pdb, 'atoms')]
+
+
+def prepare(out_dir, **scale):
+    """
+    The function to generate the synthetic files and the inputs of every
+    benchmark.
+
+    Returns
+    -------
+    dictionary
+    """
+    import Pisa_xml_parser as pxp
+
+    data = sp.generate(out_dir, **scale)
+    data['table'] = os.path.join(data['xml_dir'], 'interfacetable.xml')
+    data['bond_files'] = sorted(glob(os.path.join(data['xml_dir'], 'hydrogenbond*.xml')) +
+                                glob(os.path.join(data['xml_dir'], 'saltbridge*.xml')))
+    data['residue_files'] = sorted(glob(os.path.join(data['xml_dir'], 'residue*.xml')))
+    data['parsed'] = pxp.interfacetable_parse(data['table'])
+    data['sheet'] = os.path.join(out_dir, 'InteractionSheet.csv')
+    pxp.create_df(data['parsed']).to_csv(data['sheet'])
+
+    return data
+
+
+def run_benchmarks(data, repeat=5, names=None):
+    """
+    The function to time every benchmark.
+
+    Parameters
+    ----------
+    data : dictionary
+        given by prepare()
+    repeat : int
+        runs of each benchmark, the fastest one is kept
+    names : list
+        benchmarks to run, all of them when not given
+
+    Returns
+    -------
+    pandas DataFrame
+        benchmark, unit, items, seconds and items per second
+    """
+    rows = []
+    for name, function, unit in BENCHMARKS:
+        if names and name not in names:
+            continue
+        function(data)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function(data)
+            best = min(best, time.perf_counter() - start)
+        rows.append({'benchmark': name, 'unit': unit, 'items': data[unit],
+                     'seconds': best, 'throughput': data[unit] / best})
+
+    return pd.DataFrame(rows)
+
+
+def scale_key(scale):
+    return '{n_chains}c-{n_interfaces}i-{n_bonds}b-{n_residues}r'.format(**scale)
+
+
+def load_baselines(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baselines(path, key, df):
+    """
+    The function to store the throughputs of df as the baselines of a scale.
+    """
+    baselines = load_baselines(path)
+    baselines.setdefault(key, {}).update({r['benchmark']: r['throughput'] for r in df.to_dict('records')})
+    with open(path, 'w') as f:
+        json.dump(baselines, f, indent=1, sort_keys=True)
+
+
+def check_baselines(df, baselines, tolerance=0.2):
+    """
+    The function to compare the throughputs against their baselines.
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        given by run_benchmarks()
+    baselines : dictionary
+        benchmark -> baseline throughput
+    tolerance : float
+        allowed slowdown, 0.2 fails below 80% of the baseline
+
+    Returns
+    -------
+    pandas DataFrame
+        df with the baseline, ratio and regression columns
+    """
+    df = df.copy()
+    df['baseline'] = df['benchmark'].map(baselines)
+    df['ratio'] = df['throughput'] / df['baseline']
+    df['regression'] = df['ratio'] < 1 - tolerance
+    return df
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("--chains", help="number of chains", default=4, type=int)
+
+    PARSER.add_argument("--interfaces", help="number of interfaces", default=6, type=int)
+
+    PARSER.add_argument("--bonds", help="hydrogen bonds per interface", default=50, type=int)
+
+    PARSER.add_argument("--residues", help="residues per chain", default=300, type=int)
+
+    PARSER.add_argument("--repeat", help="runs of each benchmark", default=5, type=int)
+
+    PARSER.add_argument("--only", help="benchmarks to run", nargs='+', choices=[b[0] for b in BENCHMARKS], default=None)
+
+    PARSER.add_argument("--baseline", help="the baselines file", default=DEFAULT_BASELINE, type=str)
+
+    PARSER.add_argument("--save_baseline", help="store this run as the baselines of its scale", action='store_true')
+
+    PARSER.add_argument("--tolerance", help="allowed slowdown before failing (0.2 = 20%%)", default=0.2, type=float)
+
+    PARSER.add_argument("--history", help="csv file every run is appended to", default='Results/ParserBenchmark.csv', type=str)
+
+    ARGS = PARSER.parse_args()
+
+    SCALE = {'n_chains': ARGS.chains, 'n_interfaces': ARGS.interfaces,
+             'n_bonds': ARGS.bonds, 'n_residues': ARGS.residues}
+    KEY = scale_key(SCALE)
+
+    with tempfile.TemporaryDirectory(prefix='pisapy_bench_') as TMP:
+        DF = run_benchmarks(prepare(TMP, **SCALE), repeat=ARGS.repeat, names=ARGS.only)
+
+    DF = check_baselines(DF, load_baselines(ARGS.baseline).get(KEY, {}), ARGS.tolerance)
+    print(DF.to_string(index=False))
+
+    if ARGS.history:
+        os.makedirs(os.path.dirname(ARGS.history) or '.', exist_ok=True)
+        DF.assign(date=time.strftime('%Y-%m-%d %H:%M:%S'), scale=KEY).to_csv(
+            ARGS.history, mode='a', index=False, header=not os.path.isfile(ARGS.history))
+
+    if ARGS.save_baseline:
+        save_baselines(ARGS.baseline, KEY, DF)
+        print("Baselines of "+KEY+" saved in "+ARGS.baseline)
+    elif DF['baseline'].isna().any():
+        print("No baselines for "+', '.join(DF.loc[DF['baseline'].isna(), 'benchmark'])+" at "+KEY+
+              " in "+ARGS.baseline+", run with --save_baseline first")
+        sys.exit(2)
+    elif DF['regression'].any():
+        print("Throughput regression : "+', '.join(DF.loc[DF['regression'], 'benchmark']))
+        sys.exit(1)
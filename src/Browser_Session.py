@@ -0,0 +1,151 @@
+#!/usr/bin/python3
+"""
+Code for the Firefox sessions driving the PISA web server : a lean profile
+that skips what the xml downloads do not need, and the resident memory of
+each session read from /proc so a session grown too big can be recycled.
+
+  How to use
+  ----------
+The lean mode is used by PisaAuto_id.start(lean=True), and the memory check by
+PisaAuto_id.download_xmls(max_rss_mb=...) which restarts the session between
+two interfaces when it uses more than max_rss_mb. Every script submitting to
+PISA has the options :
+
+    python PisaAuto_id.py 6ta5 --lean --max_rss 800
+    python RunPisaPy.py "6ta5 6iol" --backend shrake --lean --max_rss 800
+
+The lean profile blocks images, media and web fonts, disables the caches, the
+browsing history and the cached previous pages, runs a single content process
+and returns from page loads at DOMContentLoaded (eager strategy). The memory of a session is the sum of the resident memory
+of geckodriver, Firefox and its content processes, found through the parent
+pids of /proc/<pid>/stat (Linux only, 0 elsewhere).
+
+The stylesheets and the back/forward list are left alone : the PISA pages lay
+out their buttons with css and the scripts go back to the interfaces page
+with driver.back().
+
+"""
+
+import os
+
+#firefox preferences of the lean profile
+LEAN_PREFERENCES = {'permissions.default.image': 2,
+                    'gfx.downloadable_fonts.enabled': False,
+                    'browser.display.use_document_fonts': 0,
+                    'media.autoplay.default': 5,
+                    'media.video_stats.enabled': False,
+                    'browser.cache.disk.enable': False,
+                    'browser.cache.memory.enable': False,
+                    'browser.cache.offline.enable': False,
+                    'network.http.use-cache': False,
+                    'places.history.enabled': False,
+                    'browser.sessionhistory.max_total_viewers': 0,
+                    'browser.sessionstore.max_tabs_undo': 0,
+                    'dom.ipc.processCount': 1,
+                    'fission.autostart': False,
+                    'extensions.pocket.enabled': False,
+                    'app.update.enabled': False,
+                    'datareporting.healthreport.uploadEnabled': False}
+
+
+def firefox_options(lean=False):
+    """
+    The function to build the Firefox options of a PISA session.
+
+    Parameters
+    ----------
+    lean : boolean
+        True to apply the lean profile
+
+    Returns
+    -------
+    selenium firefox Options
+    """
+    from selenium.webdriver.firefox.options import Options
+
+    options = Options()
+    options.add_argument("--headless")
+    if lean:
+        options.page_load_strategy = 'eager'
+        for key, value in LEAN_PREFERENCES.items():
+            options.set_preference(key, value)
+    return options
+
+
+def parent_pids():
+    """
+    The function to map every running pid to its parent pid.
+
+    Returns
+    -------
+    dictionary
+    """
+    parents = {}
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open('/proc/'+name+'/stat', 'r') as f:
+                #the command name is between parentheses and may contain spaces
+                fields = f.read().rsplit(')', 1)[1].split()
+        except (OSError, IndexError):
+            continue
+        parents[int(name)] = int(fields[1])
+    return parents
+
+
+def process_tree(pid):
+    """
+    The function to list a process and all its descendants.
+
+    Returns
+    -------
+    list of int
+    """
+    parents = parent_pids()
+    tree = [pid]
+    for p in tree:
+        tree.extend(child for child, parent in parents.items() if parent == p)
+    return tree
+
+
+def rss_mb(pid):
+    """
+    The function to read the resident memory of a process.
+
+    Returns
+    -------
+    float
+        resident memory in MB, 0 when the process is gone
+    """
+    try:
+        with open('/proc/'+str(pid)+'/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def session_rss_mb(driver):
+    """
+    The function to measure the resident memory of a browser session.
+
+    Parameters
+    ----------
+    driver : selenium webdriver
+
+    Returns
+    -------
+    float
+        resident memory in MB of geckodriver, firefox and its content
+        processes, 0 when it can not be read
+    """
+    try:
+        pid = driver.service.process.pid
+    except AttributeError:
+        return 0.0
+    if not os.path.isdir('/proc'):
+        return 0.0
+    return sum(rss_mb(p) for p in process_tree(pid))
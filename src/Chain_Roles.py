@@ -0,0 +1,241 @@
+#!/usr/bin/python3
+"""
+Code to name the role (protein) of every chain : the protein1/protein2
+columns of the InteractionSheet and the labels of the residue plots.
+
+  How to use
+  ----------
+The roles are given to the scripts with --roles, a json file in one of these
+formats :
+
+ roles of one structure, many chains per role :
+    {"Binder": ["A", "C"], "Target": ["B", "D"]}
+
+ roles of a campaign, by structure name (with or without extension), "default"
+ for the other structures :
+    {"structures": {"6ta5": {"Binder": ["A"], "Target": ["B", "C"]}},
+     "default": {"Binder": ["A"], "Target": ["B"]}}
+
+ the entity -> chains map written by Download_pdbfasta.py (<id>_chains.json),
+ the entities are the roles.
+
+    python Pisa_xml_parser.py Results/ --roles campaign_roles.json
+    python RunPisaPy.py "6ta5 6iol" --backend shrake --roles campaign_roles.json
+
+Without --roles, a pdb id uses its Results/<id>_chains.json when it was
+downloaded and DEFAULT_ROLES otherwise. From python :
+
+    import Chain_Roles as cr
+
+    roles = cr.resolve_roles('6ta5.pdb', 'campaign_roles.json')
+    cr.assign_roles(df['chain1'], roles)
+
+The roles are inverted once in a chain -> role index and assigned to a whole
+column with one map, a chain without role gets '' and is logged once.
+
+"""
+
+import json
+import logging
+import os
+import numpy as np
+import pandas as pd
+
+#chain A is generally the binder and chain B the target
+DEFAULT_ROLES = {'Binder': ['A'], 'Target': ['B']}
+
+
+def normalize(roles):
+    """
+    The function to write the chains of every role as a list.
+
+    Parameters
+    ----------
+    roles : dictionary
+        role -> chain or list of chains
+
+    Returns
+    -------
+    dictionary
+        role -> list of chains
+    """
+    return {role: [chains] if isinstance(chains, str) else list(chains) for role, chains in roles.items()}
+
+
+def chain_roles(roles):
+    """
+    The function to invert the roles in a chain -> role index.
+
+    Returns
+    -------
+    dictionary
+
+    Raises
+    ------
+    ValueError
+        when a chain has two roles
+    """
+    index = {}
+    for role, chains in normalize(roles).items():
+        for chain in chains:
+            if index.setdefault(chain, role) != role:
+                raise ValueError("Chain "+chain+" is both "+index[chain]+" and "+role)
+    return index
+
+
+def assign_roles(chains, roles):
+    """
+    The function to get the role of every chain of a column.
+
+    Parameters
+    ----------
+    chains : array-like of strings
+        e.g. the chain1 column of the bonds
+    roles : dictionary
+        role -> chains
+
+    Returns
+    -------
+    numpy array of strings
+        '' for the chains without role
+    """
+    column = pd.Series(np.asarray(chains, dtype=object))
+    assigned = column.map(chain_roles(roles))
+    unmapped = sorted(set(column[assigned.isna()]))
+    if unmapped:
+        logging.info("Chains without role : "+', '.join(unmapped))
+    return assigned.fillna('').to_numpy(dtype=object)
+
+
+def entity_roles(chain_map, entry=None):
+    """
+    The function to get the roles of an entity -> chains map written by
+    Download_pdbfasta.parse_fasta().
+
+    Parameters
+    ----------
+    chain_map : dictionary
+        entry -> list of {'name', 'chains'}
+    entry : string
+        the pdb entry to read, the first one of the map when not given
+
+    Returns
+    -------
+    dictionary
+        entity name -> list of chains
+    """
+    if entry is None or (entry.upper() not in chain_map and entry not in chain_map):
+        entry = next(iter(chain_map))
+
+    roles = {}
+    for entity in chain_map[entry.upper()] if entry.upper() in chain_map else chain_map[entry]:
+        roles.setdefault(entity['name'], []).extend(c for c in entity['chains']
+                                                    if c not in roles.get(entity['name'], []))
+    return roles
+
+
+def structure_id(name):
+    """
+    The function to get the id of a structure name, '6ta5.pdb' -> '6ta5'.
+    """
+    return os.path.basename(name.rstrip('/')).replace('_PDBePISA_xml_files', '').split('.')[0]
+
+
+def load_roles(json_file, structure=None):
+    """
+    The function to read the roles of a structure from a json file in one of
+    the formats of the module.
+
+    Parameters
+    ----------
+    json_file : string
+    structure : string
+        the structure name, for the campaign and entity map files
+
+    Returns
+    -------
+    dictionary or None
+        role -> list of chains, None when a campaign file has no entry and
+        no default for the structure
+    """
+    with open(json_file, 'r') as f:
+        config = json.load(f)
+
+    if 'structures' in config or 'default' in config:
+        entries = {structure_id(name).lower(): roles for name, roles in config.get('structures', {}).items()}
+        roles = entries.get(structure_id(structure).lower()) if structure else None
+        roles = roles if roles is not None else config.get('default')
+        return normalize(roles) if roles is not None else None
+
+    if all(isinstance(value, list) and value and isinstance(value[0], dict) for value in config.values()):
+        return entity_roles(config, structure_id(structure) if structure else None)
+
+    return normalize(config)
+
+
+def resolve_roles(structure, config=None, results='Results/'):
+    """
+    The function to find the roles of a structure : the --roles file, else
+    the entity map <results>/<id>_chains.json of Download_pdbfasta.py.
+
+    Returns
+    -------
+    dictionary or None
+        None when nothing is found, the scripts then use DEFAULT_ROLES
+    """
+    if config is not None:
+        roles = load_roles(config, structure)
+        if roles is not None:
+            return roles
+    chain_map = os.path.join(results, structure_id(structure)+'_chains.json')
+    if os.path.exists(chain_map):
+        return load_roles(chain_map, structure)
+    return None
+
+
+def role_segments(chains, roles=None):
+    """
+    The function to group the chains of a plot, in their order, by role.
+
+    Parameters
+    ----------
+    chains : list of strings
+        the chains in the order of the plot
+    roles : dictionary
+        role -> chains, DEFAULT_ROLES when not given
+
+    Returns
+    -------
+    list of tuples
+        (label, chains), the label is the role or the chain without role
+    """
+    index = chain_roles(DEFAULT_ROLES if roles is None else roles)
+    segments = []
+    for chain in chains:
+        label = index.get(chain, chain)
+        if segments and segments[-1][0] == label:
+            segments[-1][1].append(chain)
+        else:
+            segments.append((label, [chain]))
+    return segments
+
+
+def roles_for_file(path, roles=None):
+    """
+    The function to get the roles of the structure of a file written in
+    <results>/<structure folder>/, e.g. the residue0.xml of the plots.
+
+    Parameters
+    ----------
+    path : string
+    roles : dictionary or string
+        the roles, or the --roles json file read with resolve_roles()
+
+    Returns
+    -------
+    dictionary or None
+    """
+    if isinstance(roles, dict):
+        return roles
+    folder = os.path.dirname(os.path.abspath(path))
+    return resolve_roles(folder, roles, os.path.dirname(folder))
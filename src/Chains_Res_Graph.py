@@ -10,15 +10,19 @@ and InteractionSheet.csv file created by Pisa_xml_parser.py script.
 Then you can run the script with the following command :
     python Chains_Res_Graph.py InteractionSheet.csv
 
+The copies of a pair of chains (same bonds, see Interface_Fingerprint.py) are
+drawn once, the graph of the first pair is copied for the others and its title
+names every pair. --keep_duplicates draws every pair.
+
   Author
   ------
     Hocine Meraouna
 """
 
 import argparse
+import shutil
 import pandas as pd
-import networkx as nx
-import matplotlib.pyplot as plt
+import Interface_Fingerprint as ifp
 
 def get_chains(csv_file):
     """
@@ -26,19 +30,24 @@ def get_chains(csv_file):
 
     Parameters
     ----------
-    csv_file : string
-        the name of the csv file
+    csv_file : string or pandas DataFrame
+        the name of the csv file or the DataFrame given by
+        Pisa_xml_parser.create_df()
 
     Returns
     -------
     list
+        the (chain1, chain2) pairs, and the data frame
     """
-    data = pd.read_csv(csv_file, usecols = [2,3,4,6,7])
+    if isinstance(csv_file, pd.DataFrame):
+        data = csv_file[['chain1', 'res1', 'distance', 'chain2', 'res2', 'interaction type']]
+    else:
+        data = pd.read_csv(csv_file, usecols = [2,3,4,6,7,8])
     chains = []
 
     for r in data.iterrows():
-        if r[1]['chain1']+r[1]['chain2'] not in chains:
-            chains.append(r[1]['chain1']+r[1]['chain2'])
+        if (r[1]['chain1'], r[1]['chain2']) not in chains:
+            chains.append((r[1]['chain1'], r[1]['chain2']))
 
     return chains, data
 
@@ -48,7 +57,7 @@ def get_inter_res(chains, dataframe):
 
     Parameters
     ----------
-    chains : str
+    chains : tuple
         2 interacting chains names
     dataframe : pandas DataFrame
         data frame of interface interacting residues
@@ -121,6 +130,8 @@ def chains_graph(dico, lst1, lst2):
     -------
     networkx graph and a color map list
     """
+    import networkx as nx
+
     G = nx.Graph()
 
     color_map = []
@@ -139,7 +150,7 @@ def chains_graph(dico, lst1, lst2):
 
     return G, color_map
 
-def plot_graph(graph, color_map, chains):
+def plot_graph(graph, color_map, chains, copies=()):
     """
     The function to save the created graph as png.
 
@@ -149,25 +160,63 @@ def plot_graph(graph, color_map, chains):
         the graph given by chains_graph() function
     color_map : list
         the color map list
-    chains : str
+    chains : tuple
         the 2 interacting chains names
+    copies : list
+        the pairs of chains with the same graph, named in the title
 
     Returns
     -------
     Nothing
     """
+    import networkx as nx
+    import matplotlib.pyplot as plt
+
     plt.subplot()
     ax = plt.gca()
-    ax.set_title(chains+' graph')
+    ax.set_title(' = '.join(''.join(pair) for pair in [chains]+list(copies))+' graph')
 
     edges = graph.edges()
     weights = [graph[u][v]['weight'] for u,v in edges]
     pos = nx.circular_layout(graph)
     nx.draw(graph, pos, with_labels=True, node_color=color_map, font_weight='bold', edge_color=weights, node_size=30, font_size=6)
 
-    plt.savefig(chains+"_graph.png")
+    plt.savefig(''.join(chains)+"_graph.png")
     plt.close()
 
+def plot_graphs(chains, dataframe, dedupe=True):
+    """
+    The function to save the graph of every pair of chains, the copies of a
+    pair (Interface_Fingerprint.pair_duplicates()) get a copy of the graph of
+    the first one.
+
+    Parameters
+    ----------
+    chains : list
+        the pairs of chains given by get_chains()
+    dataframe : pandas DataFrame
+        the data frame given by get_chains()
+    dedupe : boolean
+        False draws every pair
+
+    Returns
+    -------
+    dictionary
+        pair -> the pair it was copied from, only for the copies
+    """
+    same = ifp.pair_duplicates(dataframe) if dedupe else {}
+    for chain in chains:
+        if chain in same:
+            continue
+        dico, c1_lst, c2_lst = get_inter_res(chain, dataframe)
+        graph, color_map = chains_graph(dico, c1_lst, c2_lst)
+        plot_graph(graph, color_map, chain, [k for k in chains if same.get(k) == chain])
+    for chain in chains:
+        if chain in same:
+            shutil.copyfile(''.join(same[chain])+"_graph.png", ''.join(chain)+"_graph.png")
+
+    return same
+
 
 
 if __name__ == '__main__':
@@ -176,13 +225,12 @@ if __name__ == '__main__':
 
     PARSER.add_argument("csv_file", help="the InteractionSheet csv file", type=str)
 
+    PARSER.add_argument("--keep_duplicates", help="draw every copy of a pair of chains", action='store_true')
+
     ARGS = PARSER.parse_args()
 
     CSV_FILE = ARGS.csv_file
 
     CHAINS, DF = get_chains(CSV_FILE)
 
-    for chain in CHAINS:
-        DICT, C1L, C2L = get_inter_res(chain, DF)
-        GRAPH, CMP = chains_graph(DICT, C1L, C2L)
-        plot_graph(GRAPH, CMP, chain)
+    plot_graphs(CHAINS, DF, dedupe=not ARGS.keep_duplicates)
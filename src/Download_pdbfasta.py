@@ -9,6 +9,19 @@ First you need to have the python packages .
 Then you can run the script with the following command :
     python Download_pdbfasta.py "6ta5 6iol"
 
+The ids are downloaded concurrently (--jobs) as gzipped files, structures
+already held in a local mirror directory are copied from it instead :
+    python Download_pdbfasta.py "6ta5 6iol" --jobs 16 --mirror /data/pdb --format cif
+
+Downloads go through the node's structure cache (see Structure_Cache.py), so an
+id fetched by any earlier run is copied from it.
+
+Each fasta file is split in one Results/<entity>.fasta file per entity and the
+entity -> chains map is saved in Results/<id>_chains.json, it can be loaded by
+Pisa_xml_parser.load_chain_map(). A combined fasta file with many entries is
+split with :
+    python Download_pdbfasta.py --split_fasta all_entries.fasta
+
   Author
   ------
     Hocine Meraouna
@@ -17,82 +30,442 @@ Then you can run the script with the following command :
 import argparse
 import requests
 import os
+import json
+import gzip
+import shutil
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from Structure_Cache import StructureCache, DEFAULT_SIZE
+import Run_Metrics as rm
+
+PDB_URL = 'https://files.rcsb.org/download/'
+FASTA_URL = 'https://www.rcsb.org/fasta/entry/'
+
+#structure formats that can be fetched
+FORMATS = ('pdb', 'cif')
+
+#seconds to wait for the server to connect and to send data
+TIMEOUT = (10, 60)
+
+_SESSION = None
+
+
+def make_session(pool_size=8, retries=3, backoff=0.5):
+    """
+    The function to create a pooled http session retrying failed requests.
+
+    Parameters
+    ----------
+    pool_size : int
+        number of connections kept open, at least the number of threads
+    retries : int
+        number of retries on connection errors and 429/5xx answers
+    backoff : float
+        the backoff factor between retries (0.5, 1, 2, ... seconds)
+
+    Returns
+    -------
+    requests Session
+    """
+    retry = Retry(total=retries, backoff_factor=backoff,
+                  status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
 
 
-def download_pdb(file_name):
+def get_session():
     """
+    The function to get the session shared by the download functions.
     """
+    global _SESSION
+    if _SESSION is None:
+        _SESSION = make_session()
 
-    url = 'https://files.rcsb.org/download/'+file_name+'.pdb'
-    r = requests.get(url, allow_redirects=True)
+    return _SESSION
 
-    if not os.path.exists('Results/'+file_name+'.pdb'):
-        os.makedirs('Results/'+file_name+'.pdb')
 
-    open('Results/'+file_name+'.pdb/'+file_name+'.pdb', 'wb').write(r.content)
+def validate_file(path, fmt):
+    """
+    The function to check a downloaded file is a structure or fasta file and
+    not an error page.
 
+    Parameters
+    ----------
+    path : string
+        the downloaded file
+    fmt : string
+        'pdb', 'cif' or 'fasta'
 
-def download_fasta(file_name):
+    Returns
+    -------
+    Nothing, raises ValueError on invalid content
     """
+    with open(path, 'rb') as f:
+        head = f.read(65536)
+
+    if fmt == 'fasta':
+        valid = head.startswith(b'>')
+    elif fmt == 'cif':
+        valid = head.lstrip().startswith(b'data_')
+    else:
+        valid = not head.lstrip().startswith(b'<') and \
+            any(head.startswith(record) or b'\n'+record in head
+                for record in (b'HEADER', b'CRYST1', b'ATOM', b'HETATM'))
+
+    if not valid:
+        raise ValueError(path+" is not a valid "+fmt+" file")
+
+
+def find_in_mirror(pdb_id, fmt, mirror):
+    """
+    The function to find a structure in a local mirror directory, either flat
+    (<id>.pdb, <id>.cif, gzipped or not) or with the wwPDB divided layout
+    (<id[1:3]>/pdb<id>.ent.gz, <id[1:3]>/<id>.cif.gz).
+
+    Parameters
+    ----------
+    pdb_id : string
+    fmt : string
+        'pdb' or 'cif'
+    mirror : string
+        the mirror directory
+
+    Returns
+    -------
+    string or None
+    """
+    low = pdb_id.lower()
+    names = [name+ext for name in (low, pdb_id.upper()) for ext in ('.'+fmt, '.'+fmt+'.gz')]
+    if fmt == 'pdb':
+        names += [os.path.join(low[1:3], 'pdb'+low+'.ent.gz'), 'pdb'+low+'.ent.gz', 'pdb'+low+'.ent']
+    else:
+        names += [os.path.join(low[1:3], low+'.cif.gz')]
+
+    for name in names:
+        if os.path.isfile(os.path.join(mirror, name)):
+            return os.path.join(mirror, name)
+
+    return None
+
+
+def _write_atomically(stream, dest, fmt, compressed):
+    """
+    The function to write a stream to dest through a temporary file,
+    decompressing it on the fly, and to move it in place once validated.
+    """
+    part = dest+'.part'
+    try:
+        with open(part, 'wb') as out:
+            if compressed:
+                with gzip.GzipFile(fileobj=stream) as unzipped:
+                    shutil.copyfileobj(unzipped, out, 1 << 20)
+            else:
+                shutil.copyfileobj(stream, out, 1 << 20)
+        validate_file(part, fmt)
+        os.replace(part, dest)
+    finally:
+        if os.path.exists(part):
+            os.remove(part)
+
+
+@rm.timed('fetch.structure')
+def fetch_structure(pdb_id, dest, fmt='pdb', session=None, mirror=None):
+    """
+    The function to get one structure file, from the mirror when it holds it,
+    otherwise from the RCSB as a gzipped file decompressed while streaming.
+
+    Parameters
+    ----------
+    pdb_id : string
+    dest : string
+        the output file
+    fmt : string
+        'pdb' or 'cif'
+    session : requests Session
+        the session given by make_session(), the shared one when not given
+    mirror : string
+        local mirror directory looked up first
+
+    Returns
+    -------
+    string
+        dest
+    """
+    if mirror:
+        local = find_in_mirror(pdb_id, fmt, mirror)
+        if local:
+            logging.info("Using "+local+" from the local mirror")
+            with open(local, 'rb') as stream:
+                _write_atomically(stream, dest, fmt, local.endswith('.gz'))
+            return dest
+
+    session = session or get_session()
+    for compressed in (True, False):
+        url = PDB_URL+pdb_id+'.'+fmt+('.gz' if compressed else '')
+        with session.get(url, stream=True, timeout=TIMEOUT) as r:
+            if r.status_code == 404 and compressed:
+                continue
+            r.raise_for_status()
+            r.raw.decode_content = not compressed
+            _write_atomically(r.raw, dest, fmt, compressed)
+            if getattr(r.raw, 'retries', None) is not None:
+                rm.count('retries', len(r.raw.retries.history))
+        rm.count('downloaded_bytes', os.path.getsize(dest))
+        return dest
+
+
+def download_pdb(file_name, session=None, mirror=None, fmt='pdb', cache=None):
+    """
+    The function to download a structure in Results/<id>.<fmt>/<id>.<fmt>.
+
+    Parameters
+    ----------
+    file_name : string
+        the pdb id
+    session : requests Session
+    mirror : string
+        local mirror directory looked up first
+    fmt : string
+        'pdb' or 'cif'
+    cache : Structure_Cache.StructureCache
+        cache read before downloading and filled after
+
+    Returns
+    -------
+    string
+        the downloaded file
+    """
+    if not os.path.exists('Results/'+file_name+'.'+fmt):
+        os.makedirs('Results/'+file_name+'.'+fmt)
+
+    dest = 'Results/'+file_name+'.'+fmt+'/'+file_name+'.'+fmt
+
+    if cache is not None and cache.copy_to(file_name, fmt, dest):
+        rm.count('cache_hits')
+        return dest
+
+    fetch_structure(file_name, dest, fmt=fmt, session=session, mirror=mirror)
+
+    if cache is not None:
+        cache.put(file_name, fmt, dest)
+
+    return dest
+
+
+def download_fasta(file_name, session=None, cache=None):
     """
+    The function to download the fasta file of a pdb id in Results/<id>/<id>.fasta.
 
-    url = 'https://www.rcsb.org/fasta/entry/'+file_name+'/display'
-    r = requests.get(url, allow_redirects=True)
+    Parameters
+    ----------
+    file_name : string
+        the pdb id
+    session : requests Session
+    cache : Structure_Cache.StructureCache
+        cache read before downloading and filled after
 
+    Returns
+    -------
+    string
+        the downloaded file
+    """
     if not os.path.exists('Results/'+file_name):
         os.makedirs('Results/'+file_name)
 
-    open('Results/'+file_name+'/'+file_name+'.fasta', 'wb').write(r.content)
+    dest = 'Results/'+file_name+'/'+file_name+'.fasta'
+
+    if cache is not None and cache.copy_to(file_name, 'fasta', dest):
+        return dest
+
+    session = session or get_session()
+
+    with session.get(FASTA_URL+file_name+'/display', stream=True, timeout=TIMEOUT) as r:
+        r.raise_for_status()
+        r.raw.decode_content = True
+        _write_atomically(r.raw, dest, 'fasta', False)
+
+    if cache is not None:
+        cache.put(file_name, 'fasta', dest)
 
+    return dest
 
-def parse_fasta(file_name):
+
+def fetch_all(ids, fmt='pdb', jobs=8, mirror=None, fasta=False, cache=None):
+    """
+    The function to download many structures (and their fasta files)
+    concurrently through one pooled session.
+
+    Parameters
+    ----------
+    ids : list
+        the pdb ids
+    fmt : string
+        'pdb' or 'cif'
+    jobs : int
+        number of concurrent downloads
+    mirror : string
+        local mirror directory looked up first
+    fasta : boolean
+        also download the fasta files
+    cache : Structure_Cache.StructureCache
+        cache read before downloading and filled after
+
+    Returns
+    -------
+    dictionary
+        pdb id -> downloaded file, or the exception raised for that id
     """
+    session = make_session(pool_size=jobs)
+
+    def fetch(pdb_id):
+        try:
+            path = download_pdb(pdb_id, session=session, mirror=mirror, fmt=fmt, cache=cache)
+            if fasta:
+                download_fasta(pdb_id, session=session, cache=cache)
+            return path
+        except (requests.RequestException, ValueError, OSError) as error:
+            logging.warning("Could not download "+pdb_id+": "+str(error))
+            return error
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        return dict(zip(ids, executor.map(fetch, ids)))
+
+
+def fasta_chains(field):
+    """
+    The function to read the chains of a fasta header field such as
+    'Chains A, B[auth C]', the author chain id is kept when given since it is
+    the one written in the pdb files and used by PISA.
+
+    Parameters
+    ----------
+    field : string
+
+    Returns
+    -------
+    list
     """
+    field = field.strip()
+    for prefix in ('Chains ', 'Chain '):
+        if field.startswith(prefix):
+            field = field[len(prefix):]
+            break
 
-    f = open('Results/dico_'+file_name+'.txt', 'w')
-    f.write('{')
-    i = 0
+    chains = []
+    for c in field.split(','):
+        c = c.strip()
+        if '[auth ' in c:
+            c = c.split('[auth ')[1].rstrip(']')
+        if c:
+            chains.append(c.strip())
 
-    with open('Results/'+file_name+'.fasta', 'r') as f_fasta:
-        for line in f_fasta:
-            if line.startswith('>'):
-                if i > 0:
-                    f2.close()
-                desc = line.split('|')
-                chains = desc[1].split('Chains ')[1].split(',')
-                f2 = open('Results/'+desc[0][1:]+'.fasta', 'w')
-                f2.write(line)
-                if i > 0:
-                    f.write(', ')
-                for n, c in enumerate(chains):
-                  if len(c) > 1:
-                    chains[n] = c.split('[')[0]
-                  chains[n] = chains[n].strip()
-                f.write('\"'+desc[2]+'\": \"'+''.join(chains)+'\"')
-                i += 1
-            else :
-                f2 = open('Results/'+desc[0][1:]+'.fasta', 'a')
-                f2.write(line)
-    
-    f2.close()
-    f.write('}')
-    f.close()
+    return chains
+
+
+def parse_fasta(file_name, out_dir='Results'):
+    """
+    The function to split a fasta file (one entry or a combined file with many
+    entries) in one fasta file per entity, in a single streaming pass, and to
+    save the entity -> chains map as json.
+
+    Parameters
+    ----------
+    file_name : string
+        a pdb id (Results/<id>/<id>.fasta or Results/<id>.fasta) or the path
+        of a fasta file
+    out_dir : string
+        the directory of the entity fasta files and of the json map
+
+    Returns
+    -------
+    string
+        the json map <out_dir>/<name>_chains.json, written as
+        {entry: [{"entity": "6TA5_1", "name": "...", "chains": ["A", "B"]}, ...]}
+    """
+    if os.path.isfile(file_name):
+        fasta = file_name
+    elif os.path.isfile('Results/'+file_name+'/'+file_name+'.fasta'):
+        fasta = 'Results/'+file_name+'/'+file_name+'.fasta'
+    else:
+        fasta = 'Results/'+file_name+'.fasta'
+
+    chain_map = {}
+    written = set()
+    out = None
+
+    try:
+        with open(fasta, 'r') as f_fasta:
+            for line in f_fasta:
+                if line.startswith('>'):
+                    if out is not None:
+                        out.close()
+                    desc = line[1:].rstrip('\n').split('|')
+                    entity = desc[0].strip()
+                    if entity not in written:
+                        chain_map.setdefault(entity.split('_')[0], []).append(
+                            {'entity': entity,
+                             'name': desc[2].strip() if len(desc) > 2 else entity,
+                             'chains': fasta_chains(desc[1]) if len(desc) > 1 else []})
+                    out = open(os.path.join(out_dir, entity+'.fasta'), 'a' if entity in written else 'w')
+                    written.add(entity)
+                    out.write(line)
+                elif out is not None:
+                    out.write(line)
+    finally:
+        if out is not None:
+            out.close()
+
+    json_file = os.path.join(out_dir, os.path.basename(file_name).split('.')[0]+'_chains.json')
+    with open(json_file, 'w') as f:
+        json.dump(chain_map, f)
+
+    return json_file
 
 
 if __name__ == '__main__':
 
     PARSER = argparse.ArgumentParser()
 
-    PARSER.add_argument("pdb_files", help="the pdb file ids separated by spaces", type=str)
+    PARSER.add_argument("pdb_files", help="the pdb file ids separated by spaces", nargs='?', default='', type=str)
+
+    PARSER.add_argument("--split_fasta", help="only split this (combined) fasta file", default=None, type=str)
+
+    PARSER.add_argument("--jobs", help="number of concurrent downloads", default=8, type=int)
+
+    PARSER.add_argument("--mirror", help="local mirror directory looked up before downloading", default=None, type=str)
+
+    PARSER.add_argument("--format", help="structure format", choices=FORMATS, default='pdb', type=str)
+
+    PARSER.add_argument("--cache_dir", help="shared structure cache directory (default $PISAPY_CACHE or ~/.cache/pisapy)", default=None, type=str)
+
+    PARSER.add_argument("--cache_size", help="size cap of the cache in MB", default=DEFAULT_SIZE // 1024**2, type=int)
+
+    PARSER.add_argument("--no_cache", help="do not use the structure cache", action='store_true')
 
     ARGS = PARSER.parse_args()
 
     PDB_FILES = ARGS.pdb_files
 
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
     if not os.path.exists('Results'):
         os.makedirs('Results')
 
-    for pdb in PDB_FILES.split():
-        download_pdb(pdb)
-        download_fasta(pdb)
-        parse_fasta(pdb)
+    if ARGS.split_fasta:
+        print(parse_fasta(ARGS.split_fasta))
+        raise SystemExit
+
+    CACHE = None if ARGS.no_cache else StructureCache(ARGS.cache_dir, ARGS.cache_size * 1024**2)
+
+    RESULTS = fetch_all(PDB_FILES.split(), fmt=ARGS.format, jobs=ARGS.jobs, mirror=ARGS.mirror, fasta=True, cache=CACHE)
+
+    for pdb, result in RESULTS.items():
+        if not isinstance(result, Exception):
+            parse_fasta(pdb)
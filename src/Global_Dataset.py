@@ -0,0 +1,376 @@
+#!/usr/bin/python3
+"""
+Code to keep global interface, bond and residue tables of every processed
+structure, updated one structure at a time instead of concatenating every
+csv file again.
+
+  How to use
+  ----------
+The datasets are updated by the aggregate stage of Pipeline_Dag.py (in
+Results/global/) and by PisaAuto_file.py --global_dir, from the csv files
+they already wrote (ingest_tables()). They can also be updated from the xml
+files (ingest_xml()), compacted and summarized with :
+
+    python Global_Dataset.py Results/global --ingest Results/
+    python Global_Dataset.py Results/global --compact
+    python Global_Dataset.py Results/global --stats
+
+or from python :
+
+    import Global_Dataset as gd
+
+    dataset = gd.GlobalDataset('Results/global')
+    dataset.ingest_xml('Results/6ta5.pdb_PDBePISA_xml_files')
+    dataset.read('bonds')
+    dataset.campaign_stats()
+
+Every table is partitioned : a structure first gets its own file,
+<root>/<table>/delta/<structure>.csv, which compact() merges into
+<root>/<table>/part-<n>.csv files (of about PART_ROWS rows). The rows are tagged with the STRUCTURE
+and its PROCESSED date. manifest.json gives the partition holding the
+current rows of every structure, a hash of its tables and its counts :
+ingesting a structure again with the same tables does nothing, with new
+tables it replaces the rows of the structure (the old rows of a part are
+ignored and dropped at the next compaction). campaign_stats() only reads
+the manifest, so the campaign statistics do not read the tables.
+
+"""
+
+import argparse
+import fcntl
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+from contextlib import contextmanager
+import pandas as pd
+
+TABLES = ('interfaces', 'bonds', 'residues')
+
+#rows of a compacted part
+PART_ROWS = 200000
+
+#columns read as text : structure names like 1e10 or NA must not become numbers
+#or missing values (keep_default_na=False would also turn the empty numeric
+#cells of the tables into strings)
+TEXT_COLUMNS = {'STRUCTURE': str, 'PROCESSED': str}
+
+
+def structure_key(name):
+    """
+    The function to turn a structure name into a partition file name.
+    """
+    return re.sub(r'[^A-Za-z0-9_.-]', '_', name)
+
+
+class GlobalDataset:
+    """
+    The partitioned global tables.
+
+    Parameters
+    ----------
+    root : string
+        the dataset directory
+    """
+
+    def __init__(self, root):
+        self.root = root
+        for table in TABLES:
+            os.makedirs(os.path.join(root, table, 'delta'), exist_ok=True)
+
+    @contextmanager
+    def _lock(self, shared=False):
+        with open(os.path.join(self.root, '.lock'), 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def manifest(self):
+        """
+        The structures of the dataset.
+
+        Returns
+        -------
+        dictionary
+            structure -> {'date', 'hash', 'files': table -> partition, 'counts'}
+        """
+        try:
+            with open(os.path.join(self.root, 'manifest.json'), 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def _save_manifest(self, manifest):
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.manifest')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f, indent=1, sort_keys=True)
+        os.replace(tmp, os.path.join(self.root, 'manifest.json'))
+
+    def _write(self, df, path):
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.part')
+        os.close(fd)
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, path)
+
+    def ingest(self, structure, tables, date=None):
+        """
+        The function to add or replace the rows of one structure.
+
+        Parameters
+        ----------
+        structure : string
+            the structure name
+        tables : dictionary
+            table -> pandas DataFrame, for the tables of TABLES
+        date : string
+            the processing date, today when not given
+
+        Returns
+        -------
+        boolean
+            False when the structure was already ingested with the same tables
+        """
+        digest = hashlib.sha1()
+        for table in TABLES:
+            digest.update(tables.get(table, pd.DataFrame()).to_csv(index=False).encode())
+        digest = digest.hexdigest()
+        date = date or time.strftime('%Y-%m-%d')
+
+        with self._lock():
+            manifest = self.manifest()
+            if manifest.get(structure, {}).get('hash') == digest:
+                return False
+
+            files = {}
+            for table in TABLES:
+                df = tables.get(table, pd.DataFrame()).copy()
+                df.insert(0, 'PROCESSED', date)
+                df.insert(0, 'STRUCTURE', structure)
+                files[table] = os.path.join(table, 'delta', structure_key(structure)+'.csv')
+                self._write(df, os.path.join(self.root, files[table]))
+
+            manifest[structure] = {'date': date, 'hash': digest, 'files': files,
+                                   'counts': summary_counts(tables)}
+            self._save_manifest(manifest)
+        return True
+
+    def ingest_tables(self, xml_dir, folder, name=None, prefix='', date=None):
+        """
+        The function to ingest the tables of a structure already written by
+        the parse step, only the residue<i>.xml files are parsed.
+
+        Parameters
+        ----------
+        xml_dir : string
+            the folder or archive of the xml files
+        folder : string
+            the folder of the InterfaceTable, InteractionSheet and
+            FingerprintTable csv files
+        name : string
+            the structure name, taken from xml_dir when not given
+        prefix : string
+            the prefix of the csv files, e.g. '6ta5_'
+        date : string
+            the processing date, today when not given
+
+        Returns
+        -------
+        boolean
+            False when nothing changed
+        """
+        import Interface_Fingerprint as ifp
+        import Pisa_Api
+
+        if name is None:
+            name = os.path.basename(os.path.abspath(xml_dir)).replace('_PDBePISA_xml_files', '')
+        path = os.path.join(folder, prefix)
+        fingerprints = pd.read_csv(path+'FingerprintTable.csv', index_col=0)
+        residues = Pisa_Api.read_residues(xml_dir, ifp.table_duplicates(fingerprints))
+        return self.ingest(name, {'interfaces': pd.read_csv(path+'InterfaceTable.csv', index_col=0),
+                                  'bonds': pd.read_csv(path+'InteractionSheet.csv', index_col=0),
+                                  'residues': residues}, date=date)
+
+    def ingest_xml(self, xml_dir, name=None, date=None, chains=None):
+        """
+        The function to parse the xml files of a structure (folder or archive)
+        and ingest its tables.
+
+        Parameters
+        ----------
+        xml_dir : string
+            the folder or archive of the xml files
+        name : string
+            the structure name, taken from xml_dir when not given
+        date : string
+            the processing date, today when not given
+        chains : dictionary
+            protein -> chains naming the proteins of the bonds (see
+            Chain_Roles.py)
+
+        Returns
+        -------
+        boolean
+            False when nothing changed
+        """
+        import Pisa_Api
+
+        result = Pisa_Api.process_structure(xml_dir, name=name, chains=chains)
+        return self.ingest(result.name, {'interfaces': result.interfaces, 'bonds': result.bonds,
+                                         'residues': result.residues}, date=date)
+
+    def read(self, table, structures=None):
+        """
+        The function to read the current rows of a table.
+
+        Parameters
+        ----------
+        table : string
+            one of TABLES
+        structures : list of strings
+            only these structures, every structure when not given
+
+        Returns
+        -------
+        pandas DataFrame
+        """
+        #shared lock, compact() must not remove the files being read
+        with self._lock(shared=True):
+            return self._read(table, structures)
+
+    def _read(self, table, structures=None):
+        manifest = self.manifest()
+        wanted = set(structures) if structures is not None else set(manifest)
+        by_file = {}
+        for structure in wanted & set(manifest):
+            if manifest[structure]['files'][table] is not None:
+                by_file.setdefault(manifest[structure]['files'][table], set()).add(structure)
+
+        frames = []
+        for path, names in sorted(by_file.items()):
+            df = pd.read_csv(os.path.join(self.root, path), converters=TEXT_COLUMNS)
+            frames.append(df[df['STRUCTURE'].isin(names)])
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True)
+
+    def compact(self, part_rows=PART_ROWS):
+        """
+        The function to merge the delta files and the parts of every table in
+        new parts, dropping the replaced rows.
+
+        Returns
+        -------
+        dictionary
+            table -> number of parts written
+        """
+        written = {}
+        with self._lock():
+            manifest = self.manifest()
+            for table in TABLES:
+                folder = os.path.join(self.root, table)
+                parts = sorted(f for f in os.listdir(folder) if f.startswith('part-'))
+                first = int(parts[-1][len('part-'):-len('.csv')]) + 1 if parts else 0
+                old = [os.path.join(folder, f) for f in parts]
+                old += [os.path.join(folder, 'delta', f) for f in os.listdir(os.path.join(folder, 'delta'))]
+                data = self._read(table)
+
+                #a structure is never split between two parts, structures without rows get no partition
+                for entry in manifest.values():
+                    entry['files'][table] = None
+                new, chunk, size = [], [], 0
+                groups = list(data.groupby('STRUCTURE', sort=True)) if not data.empty else []
+                for i, (structure, df) in enumerate(groups):
+                    chunk.append(df)
+                    size += len(df)
+                    if size >= part_rows or i == len(groups) - 1:
+                        name = os.path.join(table, 'part-%06d.csv' % (first + len(new)))
+                        self._write(pd.concat(chunk, ignore_index=True), os.path.join(self.root, name))
+                        new.append(os.path.join(self.root, name))
+                        for df in chunk:
+                            manifest[df['STRUCTURE'].iloc[0]]['files'][table] = name
+                        chunk, size = [], 0
+                written[table] = len(new)
+
+                self._save_manifest(manifest)
+                for path in old:
+                    if path not in new:
+                        os.remove(path)
+        return written
+
+    def campaign_stats(self):
+        """
+        The statistics of the whole campaign, from the manifest only.
+
+        Returns
+        -------
+        dictionary
+            structures, the totals of every count and the mean interface area
+        """
+        manifest = self.manifest()
+        totals = {'structures': len(manifest)}
+        for entry in manifest.values():
+            for name, value in entry['counts'].items():
+                totals[name] = totals.get(name, 0) + value
+        totals['mean_interface_area'] = (totals['interface_area'] / totals['interfaces']
+                                         if totals.get('interfaces') else 0.0)
+        return totals
+
+
+def summary_counts(tables):
+    """
+    The function to count the content of the tables of one structure.
+
+    Returns
+    -------
+    dictionary
+    """
+    interfaces = tables.get('interfaces', pd.DataFrame())
+    bonds = tables.get('bonds', pd.DataFrame())
+    residues = tables.get('residues', pd.DataFrame())
+    kinds = bonds['interaction type'].value_counts() if 'interaction type' in bonds else {}
+    return {'interfaces': int(len(interfaces)),
+            'bonds': int(len(bonds)),
+            'hydrogen_bonds': int(kinds.get('Hydrogen bond', 0)),
+            'salt_bridges': int(kinds.get('Salt bridge', 0)),
+            'residues': int(len(residues)),
+            #the interface area is written in the ΔiGkcal/mol column (see Pisa_Records.Interface)
+            'interface_area': float(pd.to_numeric(interfaces.get('ΔiGkcal/mol', pd.Series(dtype=float)),
+                                                  errors='coerce').sum())}
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("root", help="the global dataset directory", type=str)
+
+    PARSER.add_argument("--ingest", help="directory of the _PDBePISA_xml_files folders or archives to ingest", default=None, type=str)
+
+    PARSER.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
+
+    PARSER.add_argument("--compact", help="merge the delta files in parts", action='store_true')
+
+    PARSER.add_argument("--stats", help="print the campaign statistics", action='store_true')
+
+    ARGS = PARSER.parse_args()
+
+    DATASET = GlobalDataset(ARGS.root)
+
+    if ARGS.ingest:
+        from Chain_Roles import roles_for_file
+        from Parse_Interfacetable import find_xml_files
+
+        for XML_FILE in find_xml_files(ARGS.ingest):
+            CHANGED = DATASET.ingest_xml(os.path.dirname(XML_FILE), chains=roles_for_file(XML_FILE, ARGS.roles))
+            print(("Ingested " if CHANGED else "Unchanged ")+os.path.dirname(XML_FILE))
+
+    if ARGS.compact:
+        print(DATASET.compact())
+
+    if ARGS.stats:
+        for NAME, VALUE in DATASET.campaign_stats().items():
+            print(NAME, VALUE)
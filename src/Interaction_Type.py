@@ -38,9 +38,9 @@ def dict_inter_type(chains, dataframe):
     dico = {}
     for c in chains:
         dico2 = {}
-        dico2[dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts().index[0]] = dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts()[0]
+        dico2[dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts().index[0]] = dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts().iloc[0]
         if len(dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts()) > 1:
-            dico2[dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts().index[1]] = dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts()[1]
+            dico2[dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts().index[1]] = dataframe.loc[(dataframe['chain1'] == c[0]) & (dataframe['chain2'] == c[1])]['interaction type'].value_counts().iloc[1]
         dico[c] = dico2
 
     return dico
@@ -0,0 +1,308 @@
+#!/usr/bin/python3
+"""
+Code to fingerprint the interfaces : a hash of the bonded residue pairs and
+of the interface residues that does not depend on the chain labels, so the
+copies of an interface (homo-oligomers, crystal symmetry) are computed once
+and their results given to the other copies.
+
+  How to use
+  ----------
+The fingerprint of every interface is computed by
+Pisa_xml_parser.interfacetable_parse() (Interface.fingerprint) and written in
+<name>_FingerprintTable.csv by the parse stage of Pipeline_Dag.py. The tables
+of a structure can be checked with :
+
+    python Interface_Fingerprint.py Results/6ta5.pdb_PDBePISA_xml_files/interfacetable.xml
+
+or from python :
+
+    import Interface_Fingerprint as ifp
+
+    ifp.fingerprint_table(interfaces)     # interfaces of interfacetable_parse()
+    ifp.pair_duplicates(bonds)            # bonds of Pisa_xml_parser.create_df()
+    ifp.chain_duplicates(bonds)
+
+A pair of chains is written in its canonical orientation : the bonds
+(interaction type, residue of one side, residue of the other side) and the
+interface residues (side, residue) are sorted in both orientations and the
+smaller lists are hashed, 'swapped' tells that the second chain is the first
+side (None when both orientations are the same). The interface residues are
+the residues of residue<i>.xml with a buried area, the interfaces are
+fingerprinted from their bonds only when it was not downloaded, and so are
+the pairs of an InteractionSheet. Two pairs with the same fingerprint and
+orientation have the same bonded atoms, two chains with the same fingerprints
+on the same sides of all their pairs are copies of each other. The duplicates
+are used by the costly steps :
+
+    Auto_Naccess.call_naccess() / chains_access()   accessibility of one copy
+    Chains_Res_Graph.plot_graphs()                  graph of one copy
+
+and by Pisa_Api.read_residues() for the copies whose residue<i>.xml was not
+downloaded, the residue tables on disk are always read.
+
+Interfaces without bonds have no fingerprint and are never duplicates.
+
+"""
+
+import argparse
+import hashlib
+import xml.etree.ElementTree as ET
+import pandas as pd
+from Xml_Archive import open_xml, xml_exists
+
+#hexadecimal digits kept from the sha1
+LENGTH = 16
+
+
+def fingerprint(bonds, residues=()):
+    """
+    The function to hash the bonds and the interface residues of a pair of
+    chains.
+
+    Parameters
+    ----------
+    bonds : iterable of tuples
+        (interaction type, residue of the first chain, residue of the second
+        chain), e.g. ('Hydrogen bond', 'ASN  37[ ND2]', 'GLU  12[ OE1]')
+    residues : iterable of tuples
+        (side, residue) of the interface residues, side 1 for the first
+        chain and 2 for the second, e.g. (1, 'ASN 37')
+
+    Returns
+    -------
+    tuple
+        (fingerprint, swapped), (None, None) without bonds, swapped is True
+        when the canonical first side is the second chain and None when both
+        orientations are the same (symmetric pair)
+    """
+    bonds = [(kind, ' '.join(res1.split()), ' '.join(res2.split())) for kind, res1, res2 in bonds]
+    if not bonds:
+        return None, None
+    residues = [(str(side), ' '.join(residue.split())) for side, residue in residues]
+    forward = (sorted(bonds), sorted(residues))
+    backward = (sorted((kind, res2, res1) for kind, res1, res2 in bonds),
+                sorted(({'1': '2', '2': '1'}[side], residue) for side, residue in residues))
+    swapped = None if backward == forward else backward < forward
+    lines = ['\t'.join(row) for part in (backward if swapped else forward) for row in part]
+    return hashlib.sha1('\n'.join(lines).encode()).hexdigest()[:LENGTH], swapped
+
+
+def interface_residues(xml_file):
+    """
+    The function to read the interface residues of a residue<i>.xml file,
+    the residues with a buried area.
+
+    Returns
+    -------
+    list of tuples
+        (side, residue), e.g. (1, 'ASN 37'), empty when the file was not
+        downloaded
+    """
+    if not xml_exists(xml_file):
+        return []
+    with open_xml(xml_file) as f_xml:
+        root = ET.parse(f_xml).getroot()
+    residues = []
+    for side in (1, 2):
+        for residue in root.iter('RESIDUE%d' % side):
+            for row in residue.findall('RESIDUE'):
+                if float(row.find('BURIEDSURFACEAREA').text) > 0:
+                    residues.append((side, row.find('STRUCTURE').text.strip().split(':', 1)[-1]))
+    return residues
+
+
+def interface_fingerprint(interface, residues=()):
+    """
+    The function to fingerprint a Pisa_Records.Interface.
+
+    Parameters
+    ----------
+    interface : Pisa_Records.Interface
+    residues : list of tuples
+        the interface residues given by interface_residues()
+
+    Returns
+    -------
+    tuple
+        (fingerprint, swapped, (chain1, chain2)), the chains are None
+        without bonds
+    """
+    bonds, chains = [], None
+    for kind, records in interface.bonds():
+        bonds += [(kind, str(r1), str(r2)) for r1, r2 in zip(records.res1, records.res2)]
+        if chains is None and len(records):
+            chains = (str(records.chain1[0]), str(records.chain2[0]))
+    fp, swapped = fingerprint(bonds, residues)
+    return fp, swapped, chains
+
+
+def side_map(chains, swapped, rep_chains, rep_swapped):
+    """
+    The function to match the chains of a copy with the chains of its
+    representative.
+
+    Returns
+    -------
+    dictionary
+        chain of the representative -> chain of the copy
+    """
+    if swapped == rep_swapped:
+        return {rep_chains[0]: chains[0], rep_chains[1]: chains[1]}
+    return {rep_chains[0]: chains[1], rep_chains[1]: chains[0]}
+
+
+def fingerprint_table(interfaces):
+    """
+    The function to list the fingerprint of every interface and the
+    interface it is a copy of.
+
+    Parameters
+    ----------
+    interfaces : list
+        the Pisa_Records.Interface records given by
+        Pisa_xml_parser.interfacetable_parse()
+
+    Returns
+    -------
+    pandas DataFrame
+        INTERFACE, CHAIN1, CHAIN2, FINGERPRINT, SWAPPED and REPRESENTATIVE
+        (the first interface with the same fingerprint, itself when unique)
+    """
+    rows, first = [], {}
+    for interface in interfaces:
+        fp, swapped = interface.fingerprint, interface.swapped
+        chains = interface.chains or (None, None)
+        if fp is not None:
+            first.setdefault(fp, interface.number)
+        rows.append({'INTERFACE': interface.number, 'CHAIN1': chains[0], 'CHAIN2': chains[1],
+                     'FINGERPRINT': fp, 'SWAPPED': swapped,
+                     'REPRESENTATIVE': first[fp] if fp is not None else interface.number})
+    return pd.DataFrame(rows, columns=['INTERFACE', 'CHAIN1', 'CHAIN2', 'FINGERPRINT', 'SWAPPED',
+                                       'REPRESENTATIVE'])
+
+
+def interface_duplicates(interfaces):
+    """
+    The function to map every copy of an interface to its representative.
+
+    Returns
+    -------
+    dictionary
+        interface number -> (representative number, representative chain ->
+        chain of the copy), only for the copies
+    """
+    first, copies = {}, {}
+    for interface in interfaces:
+        if interface.fingerprint is None:
+            continue
+        rep = first.setdefault(interface.fingerprint, interface)
+        if rep is not interface:
+            copies[interface.number] = (rep.number, side_map(interface.chains, interface.swapped,
+                                                             rep.chains, rep.swapped))
+    return copies
+
+
+def table_duplicates(table):
+    """
+    The function to map every copy of an interface to its representative from
+    a FingerprintTable, like interface_duplicates().
+
+    Parameters
+    ----------
+    table : pandas DataFrame
+        the table given by fingerprint_table(), or read from its csv file
+
+    Returns
+    -------
+    dictionary
+        interface number -> (representative number, representative chain ->
+        chain of the copy), only for the copies
+    """
+    rows = {}
+    for row in table.itertuples(index=False):
+        swapped = None if pd.isna(row.SWAPPED) else str(row.SWAPPED) == 'True'
+        rows[int(row.INTERFACE)] = (int(row.REPRESENTATIVE), (str(row.CHAIN1), str(row.CHAIN2)), swapped)
+    copies = {}
+    for number, (rep, chains, swapped) in rows.items():
+        if rep != number and rep in rows:
+            copies[number] = (rep, side_map(chains, swapped, rows[rep][1], rows[rep][2]))
+    return copies
+
+
+def pair_fingerprints(bonds):
+    """
+    The function to fingerprint every pair of chains of an InteractionSheet.
+
+    Parameters
+    ----------
+    bonds : pandas DataFrame
+        the DataFrame given by Pisa_xml_parser.create_df()
+
+    Returns
+    -------
+    dictionary
+        (chain1, chain2) -> (fingerprint, swapped)
+    """
+    pairs = {}
+    columns = ['chain1', 'chain2', 'interaction type', 'res1', 'res2']
+    for (c1, c2), df in bonds[columns].groupby(['chain1', 'chain2'], sort=True):
+        pairs[(c1, c2)] = fingerprint(df[['interaction type', 'res1', 'res2']].itertuples(index=False, name=None))
+    return pairs
+
+
+def pair_duplicates(bonds):
+    """
+    The function to map every copy of a pair of chains to its representative,
+    in the same orientation (the graphs of Chains_Res_Graph.py are oriented).
+
+    Returns
+    -------
+    dictionary
+        ('C', 'D') -> ('A', 'B'), only for the copies
+    """
+    first, copies = {}, {}
+    for pair, key in pair_fingerprints(bonds).items():
+        rep = first.setdefault(key, pair)
+        if rep != pair:
+            copies[pair] = rep
+    return copies
+
+
+def chain_duplicates(bonds):
+    """
+    The function to map every copy of a chain to its representative : the
+    chains with the same fingerprints on the same sides of their pairs.
+
+    Returns
+    -------
+    dictionary
+        chain -> representative chain, only for the copies
+    """
+    signatures = {}
+    for (c1, c2), (fp, swapped) in pair_fingerprints(bonds).items():
+        #side 0 is the canonical first side, both chains of a symmetric pair are on side 0
+        signatures.setdefault(c1, []).append((fp, 1 if swapped else 0))
+        signatures.setdefault(c2, []).append((fp, 1 if swapped is False else 0))
+
+    first, copies = {}, {}
+    for chain in sorted(signatures):
+        rep = first.setdefault(tuple(sorted(signatures[chain])), chain)
+        if rep != chain:
+            copies[chain] = rep
+    return copies
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("xml_file", help="the interfacetable.xml file", type=str)
+
+    ARGS = PARSER.parse_args()
+
+    import Pisa_xml_parser as pxp
+
+    INTERFACES = pxp.interfacetable_parse(ARGS.xml_file)
+    TABLE = fingerprint_table(INTERFACES)
+    print(TABLE.to_string(index=False))
+    print(str(TABLE['REPRESENTATIVE'].nunique())+" unique interfaces out of "+str(len(TABLE)))
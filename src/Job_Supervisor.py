@@ -0,0 +1,261 @@
+#!/usr/bin/python3
+"""
+Code to supervise the PISA jobs : every job gets a wall-clock budget, its
+outcome is classified, transient failures are retried with a backoff and
+permanent failures are written to a dead-letter file so the batch goes on.
+
+  How to use
+  ----------
+The supervisor is used by Pipeline_Dag.py, PisaPy.py submit and
+PisaAuto_file.py around PisaAuto_file.pisa_job() :
+
+    import Job_Supervisor as js
+
+    outcome = js.supervise('6ta5', job, budget=1800, retries=2,
+                           dead_letter='Results/pisa_dead_letter.jsonl',
+                           limiter=Rate_Limiter.limiter())
+
+The waits of PisaAuto_id.py and PisaAuto_file.py go through wait_for(), which
+gives up with a 'timeout' failure when the budget of the job is spent, instead
+of polling the page forever. The outcomes are :
+
+    done                 the xml files were downloaded
+    no_contacts          PISA found no interface (not retried)
+    timeout              the job went over its budget (retried)
+    server_error         the server or the browser failed (retried)
+    download_incomplete  some xml files could not be downloaded (retried)
+    error                any other exception (not retried)
+
+A job still failing after its retries is appended to the dead-letter file as
+one json line (name, outcome, message, attempts, time), its partial xml
+folder is removed so a later run submits it again. The failures are counted
+in the run metrics (job_failures_<outcome>).
+
+"""
+
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from contextlib import contextmanager
+import Run_Metrics as rm
+
+#seconds each attempt of a job may run
+DEFAULT_BUDGET = 1800
+
+#attempts after the first one for the transient failures
+DEFAULT_RETRIES = 2
+
+#seconds before the first retry, doubled at each retry
+DEFAULT_BACKOFF = 60
+
+TRANSIENT = ('timeout', 'server_error', 'download_incomplete')
+
+#outcomes after which a structure is finished and never submitted again
+FINISHED = ('done', 'no_contacts')
+
+#texts of the error pages of the server and of its proxies
+SERVER_ERRORS = ('Service Unavailable', 'Internal Server Error', 'Bad Gateway', 'Gateway Time-out',
+                 'Proxy Error')
+
+_LOCAL = threading.local()
+
+
+class JobFailure(Exception):
+    """
+    A classified failure of a PISA job.
+
+    Parameters
+    ----------
+    kind : string
+        'no_contacts', 'timeout', 'server_error' or 'download_incomplete'
+    message : string
+    """
+
+    def __init__(self, kind, message=''):
+        super().__init__(kind+(': '+message if message else ''))
+        self.kind = kind
+
+
+@contextmanager
+def deadline(seconds):
+    """
+    The context manager giving the jobs of the current thread a wall-clock
+    budget, read by remaining() and wait_for().
+    """
+    previous = getattr(_LOCAL, 'deadline', None)
+    _LOCAL.deadline = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _LOCAL.deadline = previous
+
+
+def remaining():
+    """
+    The seconds left to the job of the current thread, None without budget.
+    """
+    end = getattr(_LOCAL, 'deadline', None)
+    return None if end is None else end - time.monotonic()
+
+
+def check_deadline(step=''):
+    """
+    The function raising a 'timeout' failure when the budget is spent.
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise JobFailure('timeout', 'budget spent before '+step if step else 'budget spent')
+
+
+def wait_for(condition, step, timeout=None, poll=0.5):
+    """
+    The function waiting until condition() is true.
+
+    Parameters
+    ----------
+    condition : function
+        returns a true value when the wait is over, it may raise JobFailure
+    step : string
+        the name of the wait, in the failure message
+    timeout : float
+        seconds to wait at most, the job budget also applies
+    poll : float
+        seconds between two checks
+
+    Returns
+    -------
+        the value returned by condition()
+    """
+    end = time.monotonic() + timeout if timeout is not None else None
+    left = remaining()
+    if left is not None:
+        end = min(end, time.monotonic() + left) if end is not None else time.monotonic() + left
+    while True:
+        value = condition()
+        if value:
+            return value
+        if end is not None and time.monotonic() >= end:
+            raise JobFailure('timeout', 'waiting for '+step)
+        time.sleep(poll)
+
+
+def check_server_error(page_source):
+    """
+    The function raising a 'server_error' failure when the page is an error
+    page of the server.
+    """
+    for text in SERVER_ERRORS:
+        if text in page_source:
+            raise JobFailure('server_error', text)
+
+
+def classify(error):
+    """
+    The function to classify an exception raised by a job.
+
+    Returns
+    -------
+    string
+        one of the outcomes
+    """
+    if isinstance(error, JobFailure):
+        return error.kind
+    try:
+        from selenium.common.exceptions import TimeoutException, WebDriverException
+    except ImportError:
+        return 'error'
+    if isinstance(error, TimeoutException):
+        return 'timeout'
+    if isinstance(error, WebDriverException):
+        return 'server_error'
+    return 'error'
+
+
+def write_dead_letter(path, **entry):
+    """
+    The function to append a failed job to the dead-letter file.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a') as f:
+        f.write(json.dumps(dict(entry, time=time.strftime('%Y-%m-%d %H:%M:%S')))+'\n')
+
+
+def read_dead_letters(path):
+    """
+    The function to read the dead-letter file.
+
+    Returns
+    -------
+    list of dictionaries
+    """
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def supervise(name, job, budget=DEFAULT_BUDGET, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF,
+              dead_letter=None, output=None, limiter=None):
+    """
+    The function to run one job under supervision.
+
+    Parameters
+    ----------
+    name : string
+        the structure name
+    job : function
+        runs the job, returns False when PISA found no contacts
+    budget : float
+        seconds each attempt may run
+    retries : int
+        attempts after the first one for the transient failures
+    backoff : float
+        seconds before the first retry, doubled at each retry
+    dead_letter : string
+        the dead-letter file, failures are only logged when not given
+    output : string
+        the xml folder of the job, removed before a retry and after a failure
+    limiter : Rate_Limiter.AdaptiveLimiter
+        each attempt runs in a slot of the limiter, its budget starts once
+        the slot is taken
+
+    Returns
+    -------
+    string
+        the outcome of the last attempt
+    """
+    def run():
+        with deadline(budget):
+            try:
+                return job()
+            except JobFailure as failure:
+                if failure.kind == 'no_contacts':
+                    return False
+                raise
+
+    for attempt in range(retries + 1):
+        try:
+            if limiter is None:
+                result = run()
+            else:
+                with limiter.slot(name):
+                    result = run()
+            return 'done' if result is not False else 'no_contacts'
+        except Exception as error:
+            kind = classify(error)
+            rm.count('job_failures_'+kind)
+            if output is not None and os.path.isdir(output):
+                shutil.rmtree(output)
+            if kind in TRANSIENT and attempt < retries:
+                pause = backoff * 2 ** attempt
+                logging.warning("%s failed (%s), retry %d/%d in %d s" % (name, error, attempt+1, retries, pause))
+                rm.count('retries')
+                time.sleep(pause)
+                continue
+            logging.error("%s failed (%s), giving up after %d attempts" % (name, error, attempt+1))
+            if dead_letter is not None:
+                write_dead_letter(dead_letter, name=name, outcome=kind, message=str(error), attempts=attempt+1)
+            return kind
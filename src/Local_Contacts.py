@@ -0,0 +1,348 @@
+#!/usr/bin/python3
+"""
+Code to find the inter-chain contacts, hydrogen bonds and salt bridges of a
+structure locally, from its coordinates, when the PISA server is slow or down,
+and to check the bonds given by PISA against them.
+
+  How to use
+  ----------
+    python Local_Contacts.py path/to/6ta5.pdb --out Results/
+    python Local_Contacts.py path_to_pdb_files/ --out Results/ --jobs 8
+
+writes Results/<name>/<name>_LocalInteractionSheet.csv (same columns as the
+InteractionSheet of Pisa_xml_parser.create_df()) and <name>_LocalContacts.csv
+(the residue contacts). With --compare the bonds of PISA are checked :
+
+    python Local_Contacts.py 6ta5.pdb --compare Results/6ta5.pdb/6ta5.pdb_InteractionSheet.csv
+
+writes <name>_ContactCheck.csv, every bond with its status : 'both',
+'local_only' or 'pisa_only'. In Pipeline_Dag.py and RunPisaPy.py,
+--local_contacts adds the contacts stage (it only needs the structure, so it
+still gives bonds when the PISA jobs fail) and the crosscheck stage.
+
+The atoms are binned in a cell list of the size of the cutoff and the pairs
+of the 27 cells around every atom are found with sorted cell keys and
+searchsorted, without a python loop over the atoms. The rules follow the
+PISA defaults : a hydrogen bond is a donor and an acceptor closer than
+HBOND_CUTOFF, a salt bridge a charged nitrogen and a carboxylate oxygen closer
+than SALT_CUTOFF, a residue contact two heavy atoms closer than
+CONTACT_CUTOFF. The hydrogen positions are not used, so the local bonds are
+candidates : PISA may reject some of them on the angles.
+
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import Pdb_Structure as ps
+import Pisa_xml_parser as pxp
+import Run_Metrics as rm
+from Interface_Fingerprint import interface_fingerprint
+from Pisa_Records import Bonds, Interface
+
+#distances in A
+HBOND_CUTOFF = 3.89
+SALT_CUTOFF = 4.0
+CONTACT_CUTOFF = 4.0
+
+#side chain donors and acceptors, the backbone N (but proline) and O are added
+DONORS = {'ARG': ('NE', 'NH1', 'NH2'), 'ASN': ('ND2',), 'GLN': ('NE2',), 'HIS': ('ND1', 'NE2'),
+          'LYS': ('NZ',), 'SER': ('OG',), 'THR': ('OG1',), 'TYR': ('OH',), 'TRP': ('NE1',),
+          'CYS': ('SG',)}
+ACCEPTORS = {'ASP': ('OD1', 'OD2'), 'GLU': ('OE1', 'OE2'), 'ASN': ('OD1',), 'GLN': ('OE1',),
+             'HIS': ('ND1', 'NE2'), 'SER': ('OG',), 'THR': ('OG1',), 'TYR': ('OH',), 'MET': ('SD',)}
+POSITIVE = {'ARG': ('NE', 'NH1', 'NH2'), 'LYS': ('NZ',), 'HIS': ('ND1', 'NE2')}
+NEGATIVE = {'ASP': ('OD1', 'OD2'), 'GLU': ('OE1', 'OE2')}
+
+#columns of compare()
+CHECK_COLUMNS = ['chain1', 'res1', 'chain2', 'res2', 'interaction type', 'distance local',
+                 'distance PISA', 'status']
+
+
+def atom_class(atoms, table, backbone=()):
+    """
+    The function to flag the atoms named in table (residue -> atom names).
+
+    Returns
+    -------
+    numpy array of booleans
+    """
+    keys = set((res, atom) for res, names in table.items() for atom in names)
+    flags = np.fromiter(((res, atom) in keys for res, atom in zip(atoms['resname'], atoms['atom'])),
+                        dtype=bool, count=len(atoms))
+    for atom in backbone:
+        flags |= (atoms['atom'] == atom) & (atoms['resname'] != 'PRO' if atom == 'N' else True)
+    return flags
+
+
+def close_pairs(coords, cutoff):
+    """
+    The function to find every pair of points closer than cutoff with a cell
+    list.
+
+    Parameters
+    ----------
+    coords : numpy array of shape (n, 3)
+    cutoff : float
+
+    Returns
+    -------
+    tuple
+        (i, j, distance) numpy arrays, with i < j
+    """
+    if len(coords) < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0)
+
+    cells = np.floor((coords - coords.min(axis=0)) / cutoff).astype(np.int64) + 1
+    size = cells.max(axis=0) + 2
+    key = (cells[:, 0] * size[1] + cells[:, 1]) * size[2] + cells[:, 2]
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+
+    first, second = [], []
+    for dx in (-1, 0, 1):
+        for dy in (-1, 0, 1):
+            for dz in (-1, 0, 1):
+                around = key + (dx * size[1] + dy) * size[2] + dz
+                starts = np.searchsorted(sorted_key, around, side='left')
+                counts = np.searchsorted(sorted_key, around, side='right') - starts
+                i = np.repeat(np.arange(len(coords)), counts)
+                offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+                j = order[np.repeat(starts, counts) + offsets]
+                keep = i < j
+                first.append(i[keep])
+                second.append(j[keep])
+
+    i, j = np.concatenate(first), np.concatenate(second)
+    distance = np.sqrt(((coords[i] - coords[j]) ** 2).sum(axis=1))
+    keep = distance <= cutoff
+    return i[keep], j[keep], distance[keep]
+
+
+def residue_field(atoms, atom=True):
+    """
+    The function to write the residues like PISA does, e.g. 'ASN  37[ ND2]'
+    ('ASN 37' without the atom).
+
+    Returns
+    -------
+    numpy array of strings
+    """
+    resseq = np.char.add(atoms['resseq'].astype('U'), np.char.strip(atoms['icode']))
+    if not atom:
+        return np.char.add(np.char.add(atoms['resname'], ' '), resseq)
+    names = np.where(np.char.str_len(atoms['atom']) < 4, np.char.add(' ', np.char.ljust(atoms['atom'], 3)),
+                     atoms['atom'])
+    return np.char.add(np.char.add(np.char.add(atoms['resname'], np.char.rjust(resseq, 4)), '['),
+                       np.char.add(names, ']'))
+
+
+def interface_atoms(atoms):
+    """
+    The function to keep the heavy protein atoms of the first alternate
+    location.
+    """
+    keep = (atoms['record'] == 'ATOM') & (atoms['element'] != 'H') & np.isin(atoms['altloc'], ('', 'A'))
+    return atoms[keep]
+
+
+def _oriented(atoms, i, j, chain_order):
+    #the chain found first in the file is chain1, like the interfaces of PISA
+    rank = np.array([chain_order[c] for c in atoms['chain']])
+    swap = rank[i] > rank[j]
+    return np.where(swap, j, i), np.where(swap, i, j)
+
+
+def find_bonds(atoms):
+    """
+    The function to find the inter-chain hydrogen bonds and salt bridges.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+        given by Pdb_Structure.load_structure()
+
+    Returns
+    -------
+    list of Pisa_Records.Interface
+        one interface per pair of chains, with their fingerprints
+    """
+    atoms = interface_atoms(atoms)
+    donor = atom_class(atoms, DONORS, backbone=('N',))
+    acceptor = atom_class(atoms, ACCEPTORS, backbone=('O', 'OXT'))
+    positive = atom_class(atoms, POSITIVE)
+    negative = atom_class(atoms, NEGATIVE)
+
+    polar = np.flatnonzero(donor | acceptor | positive | negative)
+    i, j, distance = close_pairs(atoms['xyz'][polar].astype(np.float64), max(HBOND_CUTOFF, SALT_CUTOFF))
+    i, j = polar[i], polar[j]
+    inter = atoms['chain'][i] != atoms['chain'][j]
+    i, j, distance = i[inter], j[inter], distance[inter]
+
+    chain_order = {c: n for n, c in enumerate(ps.chains(atoms))}
+    i, j = _oriented(atoms, i, j, chain_order)
+    hbond = (((donor[i] & acceptor[j]) | (acceptor[i] & donor[j])) & (distance <= HBOND_CUTOFF))
+    salt = (((positive[i] & negative[j]) | (negative[i] & positive[j])) & (distance <= SALT_CUTOFF))
+
+    fields = residue_field(atoms)
+    pairs = sorted(set(zip(atoms['chain'][i], atoms['chain'][j])), key=lambda p: (chain_order[p[0]], chain_order[p[1]]))
+    interfaces = []
+    for number, (c1, c2) in enumerate(pairs, 1):
+        pair = (atoms['chain'][i] == c1) & (atoms['chain'][j] == c2)
+        kinds = []
+        for flags in (hbond & pair, salt & pair):
+            order = np.lexsort((distance[flags], j[flags], i[flags]))
+            a, b, d = i[flags][order], j[flags][order], distance[flags][order]
+            kinds.append(Bonds(atoms['chain'][a], fields[a], np.round(d, 2), atoms['chain'][b], fields[b]))
+        interface = Interface(number, kinds[0], kinds[1])
+        if len(interface):
+            interface.fingerprint, interface.swapped, interface.chains = interface_fingerprint(interface)
+            interfaces.append(interface)
+
+    rm.count('local_bonds', sum(len(interface) for interface in interfaces))
+    return interfaces
+
+
+def residue_contacts(atoms, cutoff=CONTACT_CUTOFF):
+    """
+    The function to find the residues of two chains with heavy atoms closer
+    than cutoff.
+
+    Returns
+    -------
+    pandas DataFrame
+        chain1, res1, chain2, res2 and the shortest distance of the atoms
+    """
+    atoms = interface_atoms(atoms)
+    i, j, distance = close_pairs(atoms['xyz'].astype(np.float64), cutoff)
+    inter = atoms['chain'][i] != atoms['chain'][j]
+    i, j, distance = i[inter], j[inter], distance[inter]
+    i, j = _oriented(atoms, i, j, {c: n for n, c in enumerate(ps.chains(atoms))})
+
+    fields = residue_field(atoms, atom=False)
+    df = pd.DataFrame({'chain1': atoms['chain'][i].astype(object), 'res1': fields[i].astype(object),
+                       'chain2': atoms['chain'][j].astype(object), 'res2': fields[j].astype(object),
+                       'distance': np.round(distance, 2)})
+    return df.groupby(['chain1', 'res1', 'chain2', 'res2'], sort=False, as_index=False)['distance'].min()
+
+
+def local_interactions(structure, chains=None):
+    """
+    The function to give the local bonds of a structure as an InteractionSheet.
+
+    Parameters
+    ----------
+    structure : string or numpy structured array
+        the pdb or mmCIF file or the atoms given by Pdb_Structure.load_structure()
+    chains : dictionary
+        protein -> chains, see Pisa_xml_parser.create_df()
+
+    Returns
+    -------
+    pandas DataFrame
+        the columns of Pisa_xml_parser.create_df(), the ΔiG columns are NaN
+    """
+    atoms = ps.load_structure(structure) if isinstance(structure, str) else structure
+    with rm.timer('contacts.local'):
+        return pxp.create_df(find_bonds(atoms), chains)
+
+
+def _bond_keys(df):
+    #one key per bond whatever the orientation, the atoms written without the padding
+    sides = [(df['chain1'] + ':' + df['res1'].str.split().str.join(' ')),
+             (df['chain2'] + ':' + df['res2'].str.split().str.join(' '))]
+    low = np.where(sides[0] <= sides[1], sides[0], sides[1])
+    high = np.where(sides[0] <= sides[1], sides[1], sides[0])
+    return pd.Series(df['interaction type'].values + '|' + low + '|' + high, index=df.index)
+
+
+def compare(local, pisa):
+    """
+    The function to check the bonds of PISA against the local bonds.
+
+    Parameters
+    ----------
+    local : pandas DataFrame
+        given by local_interactions()
+    pisa : pandas DataFrame
+        the InteractionSheet of PISA (Pisa_xml_parser.create_df())
+
+    Returns
+    -------
+    pandas DataFrame
+        CHECK_COLUMNS, status is 'both', 'local_only' or 'pisa_only'
+    """
+    columns = ['chain1', 'res1', 'chain2', 'res2', 'interaction type', 'distance']
+    left = local[columns].assign(key=_bond_keys(local)).drop_duplicates('key')
+    right = pisa[columns].assign(key=_bond_keys(pisa)).drop_duplicates('key')
+    merged = left.merge(right, on='key', how='outer', suffixes=(' local', ' PISA'), indicator=True)
+
+    for column in ('chain1', 'res1', 'chain2', 'res2', 'interaction type'):
+        merged[column] = merged[column+' PISA'].fillna(merged[column+' local'])
+    merged['status'] = merged['_merge'].map({'both': 'both', 'left_only': 'local_only', 'right_only': 'pisa_only'})
+
+    for status, n in merged['status'].value_counts().items():
+        rm.count('contacts_'+status, int(n))
+    return merged[CHECK_COLUMNS].sort_values(['status', 'chain1', 'chain2', 'res1'], ignore_index=True)
+
+
+def contacts_job(job):
+    """
+    The function writing the local tables of one structure.
+
+    Parameters
+    ----------
+    job : tuple
+        (structure file, output directory, InteractionSheet of PISA or None)
+
+    Returns
+    -------
+    string
+        the output folder
+    """
+    structure, out_dir, pisa_sheet = job
+    name = os.path.basename(structure)
+    folder = os.path.join(out_dir, name)
+    os.makedirs(folder, exist_ok=True)
+
+    atoms = ps.load_structure(structure)
+    local = local_interactions(atoms)
+    local.to_csv(os.path.join(folder, name+'_LocalInteractionSheet.csv'))
+    residue_contacts(atoms).to_csv(os.path.join(folder, name+'_LocalContacts.csv'))
+    if pisa_sheet is not None and os.path.exists(pisa_sheet):
+        compare(local, pd.read_csv(pisa_sheet, index_col=0)).to_csv(os.path.join(folder, name+'_ContactCheck.csv'))
+    return folder
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("structure", help="a pdb or mmCIF file or a directory of structure files", type=str)
+
+    PARSER.add_argument("--out", help="the output directory", default='Results/', type=str)
+
+    PARSER.add_argument("--compare", help="the InteractionSheet of PISA to check (single structure)", default=None, type=str)
+
+    PARSER.add_argument("--jobs", help="number of worker processes (0 for all cores)", default=1, type=int)
+
+    ARGS = PARSER.parse_args()
+
+    if os.path.isdir(ARGS.structure):
+        FILES = [os.path.join(ARGS.structure, f) for f in sorted(os.listdir(ARGS.structure), key=str.lower)
+                 if f.split('.')[-1].lower() in ps.STRUCTURE_EXTENSIONS]
+    else:
+        FILES = [ARGS.structure]
+
+    TODO = [(f, ARGS.out, ARGS.compare) for f in FILES]
+    JOBS = ARGS.jobs or os.cpu_count() or 1
+
+    if JOBS == 1 or len(TODO) < 2:
+        for JOB in TODO:
+            print("Written in "+contacts_job(JOB))
+    else:
+        with ProcessPoolExecutor(max_workers=min(JOBS, len(TODO))) as EXECUTOR:
+            for FOLDER in EXECUTOR.map(contacts_job, TODO):
+                print("Written in "+FOLDER)
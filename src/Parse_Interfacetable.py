@@ -18,17 +18,20 @@ Then you can run the script with the following command :
 import argparse
 import pandas as pd
 import os.path
+import Run_Metrics as rm
+from Pisa_Artifacts import missing_inputs
+from Xml_Archive import open_xml, xml_exists, output_dir, SUFFIX, EXTENSION
 
 def find_chain(xml_file):
     """
     """
     chains = ['/', '/']
-    with open(xml_file, "r") as f_xml:
+    with open_xml(xml_file) as f_xml:
         for line in f_xml :
             if line.startswith('<STRUCTURE1>'):
-                chains[0] = line.split('>')[1].strip()[0]
+                chains[0] = line.split('>')[1].split(':')[0].strip()
             if line.startswith('<STRUCTURE2>'):
-                chains[1] = line.split('>')[1].strip()[0]
+                chains[1] = line.split('>')[1].split(':')[0].strip()
                 return chains
     return chains
 
@@ -36,7 +39,7 @@ def get_surf(xml_file):
     """
     """
     s = 1
-    with open(xml_file, 'r') as f_xml:
+    with open_xml(xml_file) as f_xml:
         for line in f_xml:
             if line.startswith('<STRUCTURE2>'):
                 s = 2
@@ -46,6 +49,7 @@ def get_surf(xml_file):
                 x2 = float(line.split('>')[1].split('<')[0])
     return ((x1+x2)/2)
 
+@rm.timed('parse.interface')
 def parse_interface(xml_file):
     """
     """
@@ -55,20 +59,21 @@ def parse_interface(xml_file):
         'Nhb': [], 'Nsb': [], 'Nds': [], 'CSS': [], 'InterfaceSurface': []}
 
     path = '/'.join(xml_file.split('/')[:-1])
+    missing_inputs(path, 'Parse_Interfacetable')
 
-    with open(xml_file, 'r') as f_xml:
+    with open_xml(xml_file) as f_xml:
         for line in f_xml :
             if line.startswith('<INTERFACENO>'):
-                if os.path.isfile(path+"/hydrogenbond"+str(int(line.split('>')[1].split('<')[0])-1)+".xml"):
+                if xml_exists(path+"/hydrogenbond"+str(int(line.split('>')[1].split('<')[0])-1)+".xml"):
                     dico['Chain 1'].append(find_chain(path+"/hydrogenbond"+str(int(line.split('>')[1].split('<')[0])-1)+".xml")[0])
                     dico['Chain 2'].append(find_chain(path+"/hydrogenbond"+str(int(line.split('>')[1].split('<')[0])-1)+".xml")[1])
-                elif os.path.isfile(path+"/saltbridge"+str(int(line.split('>')[1].split('<')[0])-1)+".xml"):
+                elif xml_exists(path+"/saltbridge"+str(int(line.split('>')[1].split('<')[0])-1)+".xml"):
                     dico['Chain 1'].append(find_chain(path+"/saltbridge"+str(int(line.split('>')[1].split('<')[0])-1)+".xml")[0])
                     dico['Chain 2'].append(find_chain(path+"/saltbridge"+str(int(line.split('>')[1].split('<')[0])-1)+".xml")[1])
                 else:
                     dico['Chain 1'].append('?')
                     dico['Chain 2'].append('?')
-                if os.path.isfile(path+"/interfacesummary"+str(int(line.split('>')[1].split('<')[0])-1)+".xml"):
+                if xml_exists(path+"/interfacesummary"+str(int(line.split('>')[1].split('<')[0])-1)+".xml"):
                     dico['InterfaceSurface'].append(get_surf(path+"/interfacesummary"+str(int(line.split('>')[1].split('<')[0])-1)+".xml"))
 
             if line.startswith('<INTERFACENRESIDUES1>'):
@@ -110,14 +115,20 @@ def parse_interface(xml_file):
     return dico
 
 def find_xml_files(root_dir, filename="interfacetable.xml"):
-    xml_files = []
+    # dictionary keys : a folder and its archive give the file once, in order
+    xml_files = {}
     for root, dirs, files in os.walk(root_dir):
         # Only go one level deep
         if root.count(os.sep) - root_dir.count(os.sep) < 2:
             for file in files:
                 if file == filename:
-                    xml_files.append(os.path.join(root, file))
-    return xml_files
+                    xml_files[os.path.join(root, file)] = None
+                # xml files packed by Xml_Archive.py, read in place
+                elif file.endswith(SUFFIX+EXTENSION):
+                    xml_file = os.path.join(root, file[:-len(EXTENSION)], filename)
+                    if xml_file not in xml_files and xml_exists(xml_file):
+                        xml_files[xml_file] = None
+    return list(xml_files)
 
 if __name__ == '__main__':
 
@@ -133,5 +144,5 @@ if __name__ == '__main__':
 
     for xml_file in xml_files:
         df = pd.DataFrame.from_dict(parse_interface(xml_file))
-        output_file = os.path.join(os.path.dirname(xml_file), "InterfaceTable.csv")
+        output_file = os.path.join(output_dir(xml_file), "InterfaceTable.csv")
         df.to_csv(output_file)
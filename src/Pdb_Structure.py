@@ -0,0 +1,479 @@
+#!/usr/bin/python3
+"""
+Code to load the ATOM/HETATM records of a pdb or mmCIF file once into a columnar
+NumPy structured array shared by the chain splitting and accessibility stages.
+
+  How to use
+  ----------
+First you need to have the python package numpy.
+
+The module is imported by Auto_Naccess.py and RunPisaPy.py, but it can be run
+on a pdb or mmCIF file to print its chains :
+
+    python Pdb_Structure.py pdb_name.pdb
+    python Pdb_Structure.py assembly.cif
+
+Each atom is one row of the array with the fields of ATOM_DTYPE, so
+selections are boolean masks :
+
+    atoms = load_pdb('6ta5.pdb')
+    chain_a = atoms[atoms['chain'] == 'A']
+
+"""
+
+import argparse
+import mmap
+import re
+import string
+import numpy as np
+
+#file extensions accepted as structure input
+STRUCTURE_EXTENSIONS = ('pdb', 'cif', 'mmcif')
+
+#longest chain name, mmCIF author chain ids of big assemblies are often 5-6 characters
+CHAIN_WIDTH = 16
+
+ATOM_DTYPE = np.dtype([('record', 'U6'), ('serial', 'i4'), ('atom', 'U4'),
+                       ('altloc', 'U1'), ('resname', 'U5'), ('chain', 'U%d' % CHAIN_WIDTH),
+                       ('resseq', 'i4'), ('icode', 'U1'), ('xyz', 'f4', (3,)),
+                       ('occupancy', 'f4'), ('bfactor', 'f4'), ('element', 'U2')])
+
+#fixed pdb columns of an ATOM/HETATM record, read straight from the padded lines
+PDB_COLUMNS = np.dtype({'names': ['record', 'serial', 'atom', 'altloc', 'resname', 'chain',
+                                  'resseq', 'icode', 'x', 'y', 'z', 'occupancy', 'bfactor',
+                                  'element'],
+                        'formats': ['S6', 'S5', 'S4', 'S1', 'S3', 'S1', 'S4', 'S1', 'S8',
+                                    'S8', 'S8', 'S6', 'S6', 'S2'],
+                        'offsets': [0, 6, 12, 16, 17, 21, 22, 26, 30, 38, 46, 54, 60, 76],
+                        'itemsize': 80})
+
+
+def _to_number(column, dtype, default=0):
+    """
+    The function to convert a fixed width byte column, blank fields get the default.
+
+    Parameters
+    ----------
+    column : numpy array
+        the byte strings
+    dtype : type
+        int or float
+    default : number
+        the value of blank fields
+
+    Returns
+    -------
+    numpy array
+    """
+    column = np.char.strip(column)
+    blank = column == b''
+    if blank.any():
+        column = np.where(blank, str(default).encode(), column)
+
+    return column.astype(dtype)
+
+
+def _serials(column):
+    """
+    The function to read the atom serial column, the blank or non-numeric
+    serials (hybrid-36 like A0000 or ***** past 99,999 atoms) get the running
+    index of the atom, only write_pdb() uses the serials.
+
+    Parameters
+    ----------
+    column : numpy array
+        the byte strings
+
+    Returns
+    -------
+    numpy array
+    """
+    column = np.char.strip(column)
+    numeric = np.char.isdigit(column)
+    if numeric.all():
+        return column.astype(int)
+
+    serials = np.arange(1, len(column) + 1)
+    serials[numeric] = column[numeric].astype(int)
+    return serials
+
+
+def guess_element(atom_names):
+    """
+    The function to guess the elements from the atom names when the element
+    columns are empty (first letter that is not a digit).
+
+    Parameters
+    ----------
+    atom_names : numpy array
+        the atom names
+
+    Returns
+    -------
+    numpy array
+    """
+    return np.char.upper(np.char.lstrip(atom_names, '0123456789').astype('U1'))
+
+
+def from_columns(record, serial, atom, altloc, resname, chain, resseq, icode,
+                 xyz, occupancy, bfactor, element):
+    """
+    The function to build the structured atom array from its columns.
+
+    Returns
+    -------
+    numpy structured array
+
+    Raises
+    ------
+    ValueError
+        when a chain name is longer than CHAIN_WIDTH, it would be cut and
+        merged with the other chains of the same prefix
+    """
+    chain = np.asarray(chain, dtype=str)
+    if chain.size and np.char.str_len(chain).max() > CHAIN_WIDTH:
+        raise ValueError("Chain names longer than %d characters : %s" % (
+            CHAIN_WIDTH, ', '.join(sorted(set(chain[np.char.str_len(chain) > CHAIN_WIDTH])))))
+    atoms = np.zeros(len(record), dtype=ATOM_DTYPE)
+    atoms['record'] = record
+    atoms['serial'] = serial
+    atoms['atom'] = atom
+    atoms['altloc'] = altloc
+    atoms['resname'] = resname
+    atoms['chain'] = chain
+    atoms['resseq'] = resseq
+    atoms['icode'] = icode
+    atoms['xyz'] = xyz
+    atoms['occupancy'] = occupancy
+    atoms['bfactor'] = bfactor
+    element = np.asarray(element, dtype='U2')
+    missing = element == ''
+    if missing.any():
+        element[missing] = guess_element(np.asarray(atom)[missing])
+    atoms['element'] = element
+
+    return atoms
+
+
+def load_pdb(pdb):
+    """
+    The function to parse the ATOM and HETATM records of the first model of a
+    pdb file, using the fixed pdb columns.
+
+    Parameters
+    ----------
+    pdb : string
+        the pdb file
+
+    Returns
+    -------
+    numpy structured array
+        one row per atom with the fields of ATOM_DTYPE
+    """
+    lines = []
+
+    with open(pdb, 'rb') as pdb_file:
+        for line in pdb_file:
+            if line.startswith((b'ATOM', b'HETATM')):
+                lines.append(line.rstrip(b'\r\n').ljust(80)[:80])
+            elif line.startswith(b'ENDMDL'):
+                break
+
+    raw = np.frombuffer(b''.join(lines), dtype=PDB_COLUMNS)
+
+    def text(name):
+        return np.char.strip(raw[name]).astype('U')
+
+    xyz = np.stack([_to_number(raw['x'], float), _to_number(raw['y'], float),
+                    _to_number(raw['z'], float)], axis=1)
+
+    return from_columns(text('record'), _serials(raw['serial']), text('atom'),
+                        text('altloc'), text('resname'), text('chain'),
+                        _to_number(raw['resseq'], int), text('icode'), xyz,
+                        _to_number(raw['occupancy'], float, 1),
+                        _to_number(raw['bfactor'], float), text('element'))
+
+
+#characters of the pdb chain column given to the long mmCIF chain names
+ALIAS_CHARACTERS = string.ascii_uppercase+string.ascii_lowercase+string.digits
+
+#_atom_site items read by load_cif(), the first one found of each tuple is used
+CIF_ITEMS = {'record': ('group_PDB',), 'serial': ('id',),
+             'atom': ('auth_atom_id', 'label_atom_id'), 'altloc': ('label_alt_id',),
+             'resname': ('auth_comp_id', 'label_comp_id'),
+             'chain': ('auth_asym_id', 'label_asym_id'),
+             'resseq': ('auth_seq_id', 'label_seq_id'), 'icode': ('pdbx_PDB_ins_code',),
+             'x': ('Cartn_x',), 'y': ('Cartn_y',), 'z': ('Cartn_z',),
+             'occupancy': ('occupancy',), 'bfactor': ('B_iso_or_equiv',),
+             'element': ('type_symbol',), 'model': ('pdbx_PDB_model_num',)}
+
+CIF_TOKENS = re.compile(r"""'(.*?)'(?=\s|$)|"(.*?)"(?=\s|$)|(\S+)""")
+
+
+def cif_tokens(line):
+    """
+    The function to split a mmCIF data line, quoted values may hold spaces.
+
+    Parameters
+    ----------
+    line : string
+
+    Returns
+    -------
+    list
+    """
+    if '"' not in line and "'" not in line:
+        return line.split()
+
+    return [m.group(1) if m.group(1) is not None else
+            m.group(2) if m.group(2) is not None else m.group(3)
+            for m in CIF_TOKENS.finditer(line)]
+
+
+def _cif_chunk(rows, columns):
+    """
+    The function to convert a chunk of _atom_site rows to the atom array.
+    """
+    cols = list(zip(*rows))
+
+    def col(name, default=''):
+        if columns[name] is None:
+            return np.full(len(rows), default)
+        values = np.array(cols[columns[name]])
+        return np.where(np.isin(values, ('.', '?')), default, values)
+
+    xyz = np.stack([col('x').astype(float), col('y').astype(float), col('z').astype(float)], axis=1)
+
+    return from_columns(col('record', 'ATOM'), col('serial', '0').astype(int), col('atom'),
+                        col('altloc'), col('resname'), col('chain'),
+                        col('resseq', '0').astype(int), col('icode'), xyz,
+                        col('occupancy', '1').astype(float), col('bfactor', '0').astype(float),
+                        np.char.upper(col('element')))
+
+
+def load_cif(cif, chunk_size=100000):
+    """
+    The function to stream the _atom_site loop of the first model of a mmCIF
+    file into the atom array. The file is memory-mapped and read line by line,
+    rows are converted every chunk_size atoms so only one chunk of text is
+    held in memory next to the arrays. Chain names are the author chain ids
+    and may be several characters long.
+
+    Parameters
+    ----------
+    cif : string
+        the mmCIF file
+    chunk_size : int
+        number of atoms converted at once
+
+    Returns
+    -------
+    numpy structured array
+        one row per atom with the fields of ATOM_DTYPE
+    """
+    chunks = []
+    rows = []
+    header = []
+    columns = None
+    model = None
+
+    with open(cif, 'rb') as cif_file, \
+            mmap.mmap(cif_file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        in_loop = False
+        for raw in iter(mm.readline, b''):
+            line = raw.decode('utf-8', 'replace').strip()
+            if line == 'loop_':
+                in_loop = True
+                header = []
+                continue
+            if in_loop and line.startswith('_atom_site.'):
+                header.append(line.split('.', 1)[1])
+                continue
+            if not header:
+                in_loop = False
+                continue
+            if columns is None:
+                columns = {name: next((header.index(item) for item in items if item in header), None)
+                           for name, items in CIF_ITEMS.items()}
+            if not line or line.startswith(('#', '_', 'loop_', 'data_')):
+                break
+            tokens = cif_tokens(line)
+            if columns['model'] is not None:
+                if model is None:
+                    model = tokens[columns['model']]
+                elif tokens[columns['model']] != model:
+                    break
+            rows.append(tokens)
+            if len(rows) >= chunk_size:
+                chunks.append(_cif_chunk(rows, columns))
+                rows = []
+
+    if rows:
+        chunks.append(_cif_chunk(rows, columns))
+    if not chunks:
+        return np.zeros(0, dtype=ATOM_DTYPE)
+
+    return np.concatenate(chunks)
+
+
+def load_structure(path):
+    """
+    The function to load a pdb or mmCIF structure file into the atom array.
+
+    Parameters
+    ----------
+    path : string
+        the structure file
+
+    Returns
+    -------
+    numpy structured array
+    """
+    if path.lower().endswith(('.cif', '.mmcif')):
+        return load_cif(path)
+
+    return load_pdb(path)
+
+
+def chains(atoms):
+    """
+    The function to get the chain names in order of appearance.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+
+    Returns
+    -------
+    list
+    """
+    names, first = np.unique(atoms['chain'], return_index=True)
+
+    return [str(name) for name in names[np.argsort(first)]]
+
+
+def residue_keys(atoms):
+    """
+    The function to get the 'chain resseq' key of every atom, the same keys
+    as the ones given by Auto_Naccess.interacting_chains().
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+
+    Returns
+    -------
+    numpy array
+    """
+    return np.char.add(np.char.add(atoms['chain'], ' '), atoms['resseq'].astype('U'))
+
+
+def first_altlocs(atoms):
+    """
+    The function to keep one alternate location of every atom, the first one
+    of the file, as Biopython does.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+
+    Returns
+    -------
+    numpy structured array
+    """
+    alternate = atoms['altloc'] != ''
+    if not alternate.any():
+        return atoms
+    keys = np.char.add(np.char.add(residue_keys(atoms[alternate]), atoms['icode'][alternate]),
+                       np.char.add(' ', atoms['atom'][alternate]))
+    keep = ~alternate
+    keep[np.flatnonzero(alternate)[np.unique(keys, return_index=True)[1]]] = True
+
+    return atoms[keep]
+
+
+def chain_aliases(names, taken=()):
+    """
+    The function to give the chains of one written pdb file a one character
+    name for the pdb chain column. One character chains keep their name,
+    longer mmCIF chain names get the free characters in the order of names,
+    so the first chain of a file gets the same alias in every file written
+    with the same taken characters.
+
+    Parameters
+    ----------
+    names : list
+        the chains of the file
+    taken : iterable
+        characters never given as alias, e.g. the one character chains of
+        the whole structure
+
+    Returns
+    -------
+    dictionary
+        chain -> alias, only for the chains longer than one character
+
+    Raises
+    ------
+    ValueError
+        when the file holds more long chains than free characters (62 at
+        most), two chains would share a name
+    """
+    long_names = [n for n in names if len(n) > 1]
+    pool = [c for c in ALIAS_CHARACTERS if c not in names and c not in taken]
+    if len(long_names) > len(pool):
+        raise ValueError("%d chains with names longer than one character in one pdb file, only %d free "
+                         "chain characters" % (len(long_names), len(pool)))
+
+    return dict(zip(long_names, pool))
+
+
+def _atom_name(name, element):
+    if len(name) < 4 and len(element) < 2:
+        return ' '+name.ljust(3)
+    return name.ljust(4)
+
+
+def write_pdb(atoms, path, aliases=None):
+    """
+    The function to write atoms as pdb ATOM/HETATM records.
+
+    Parameters
+    ----------
+    atoms : numpy structured array
+    path : string
+        the output pdb file
+    aliases : dictionary
+        one character names of the chains longer than one character, given
+        by chain_aliases() for the chains of this file
+
+    Returns
+    -------
+    Nothing
+    """
+    aliases = aliases or {}
+
+    with open(path, 'w') as f:
+        for a in atoms:
+            f.write("%-6s%5d %4s%1s%3s %1s%4d%1s   %8.3f%8.3f%8.3f%6.2f%6.2f          %2s\n"
+                    % (a['record'], a['serial'] % 100000, _atom_name(a['atom'], a['element']),
+                       a['altloc'], a['resname'][:3], aliases.get(a['chain'], a['chain'][:1]), a['resseq'], a['icode'],
+                       a['xyz'][0], a['xyz'][1], a['xyz'][2], a['occupancy'], a['bfactor'],
+                       a['element']))
+        f.write("END\n")
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("pdb_file", help="the pdb file", type=str)
+
+    ARGS = PARSER.parse_args()
+
+    ATOMS = load_structure(ARGS.pdb_file)
+
+    for chain in chains(ATOMS):
+        mask = ATOMS['chain'] == chain
+        print(chain, np.count_nonzero(mask), 'atoms',
+              len(np.unique(ATOMS['resseq'][mask])), 'residues')
@@ -0,0 +1,547 @@
+#!/usr/bin/python3
+"""
+Code to run the PisaPy pipeline as one task graph per structure instead of
+fixed phases over every structure.
+
+  How to use
+  ----------
+The orchestrator is used by RunPisaPy.py, it can also be run directly :
+
+ with pdb ids:
+    python Pipeline_Dag.py "6ta5 6iol" --backend shrake
+
+ with pdb files:
+    python Pipeline_Dag.py path_to_pdb_files/ --d 1 /path/to/naccess
+
+It takes the options of RunPisaPy.py, both read them with parse_args().
+
+Every structure goes through the stages of STAGES :
+
+    fetch ----------------\\
+    pisa --> parse --> chains --> access
+                  |--> plots
+                  |--> aggregate
+    fetch --> contacts --> crosscheck <-- parse
+
+A stage starts as soon as the stages it depends on are done for that
+structure, so a slow structure only delays its own later stages. Each stage
+kind has its own concurrency limit (network downloads, browser sessions on
+the PISA server, cpu work and the external accessibility binary). The PISA
+jobs are also paced by Rate_Limiter.py : the browser sessions in use start at
+one and grow up to --browser_jobs while the server answers fast. The state of
+every task is saved in Results/pipeline_state.json after each task, tasks
+already done are skipped when the pipeline is run again. The timings and
+counters of the run are written in Results/metrics/ (see Run_Metrics.py).
+The aggregate stage adds the tables of every structure to the global
+datasets of Results/global/ (see Global_Dataset.py). With --local_contacts,
+the contacts stage finds the bonds from the coordinates (see
+Local_Contacts.py), even when the PISA job of the structure fails, and the
+crosscheck stage checks the bonds of PISA against them. With --profile, every
+stage is profiled and Results/profile/run-<id>/profile_report.txt ranks the
+functions and allocation sites of each stage (see Run_Profiler.py).
+
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
+from Structure_Cache import DEFAULT_SIZE
+from Pisa_Artifacts import PROFILES
+import Run_Metrics as rm
+import Run_Profiler as rp
+import Rate_Limiter as rl
+
+#stage name, stage kind, stages it depends on
+STAGES = [('fetch', 'network', ()),
+          ('pisa', 'browser', ()),
+          ('parse', 'cpu', ('pisa',)),
+          ('chains', 'cpu', ('fetch', 'parse')),
+          ('access', 'binary', ('chains',)),
+          ('plots', 'cpu', ('parse',)),
+          ('aggregate', 'cpu', ('parse',)),
+          ('contacts', 'cpu', ('fetch',)),
+          ('crosscheck', 'cpu', ('contacts', 'parse'))]
+
+ORDER = {stage: i for i, (stage, kind, needs) in enumerate(STAGES)}
+
+#default number of tasks of each stage kind running at once
+DEFAULT_LIMITS = {'network': 8, 'browser': 2, 'cpu': os.cpu_count() or 1,
+                  'binary': os.cpu_count() or 1}
+
+#stage kinds run in threads, the others in worker processes
+THREAD_KINDS = ('network', 'browser')
+
+STATE_FILE = 'pipeline_state.json'
+
+
+def xml_folder(task):
+    return os.path.join(task['results'], task['name']+'_PDBePISA_xml_files')
+
+
+def out_folder(task):
+    return os.path.join(task['results'], task['name'])
+
+
+def stage_fetch(task):
+    """
+    Stage downloading the structure of a pdb id (nothing to do for files).
+    """
+    if task['pdb_id'] is None:
+        return True
+    import Download_pdbfasta as dpf
+    from Structure_Cache import StructureCache
+
+    cache = StructureCache(task['cache_dir'], task['cache_size']) if task['cache'] else None
+    dpf.download_pdb(task['pdb_id'], cache=cache)
+    return True
+
+
+def stage_pisa(task):
+    """
+    Stage running PISA on the structure and downloading its xml files.
+
+    Returns
+    -------
+    boolean
+        False when PISA found no contacts
+    """
+    import PisaAuto_file as paf
+    import Job_Supervisor as js
+
+    structure = None if task['pdb_id'] is not None else os.path.abspath(task['structure'])
+    outcome = js.supervise(task['name'],
+                           lambda: paf.pisa_job(task['name'], task['results'], pdb_id=task['pdb_id'],
+                                                pdb_file=structure, lean=task.get('lean', False),
+                                                max_rss_mb=task.get('max_rss'),
+                                                profile=task.get('download_profile', 'all'),
+                                                archive=task.get('archive', False)),
+                           budget=task.get('job_budget', js.DEFAULT_BUDGET),
+                           retries=task.get('retries', js.DEFAULT_RETRIES),
+                           dead_letter=os.path.join(task['results'], 'pisa_dead_letter.jsonl'),
+                           output=xml_folder(task), limiter=rl.limiter())
+    if outcome not in ('done', 'no_contacts'):
+        raise RuntimeError("PISA job "+outcome+", see pisa_dead_letter.jsonl")
+
+    return outcome == 'done'
+
+
+def stage_parse(task):
+    """
+    Stage writing the InteractionSheet, InterfaceTable and FingerprintTable
+    csv files.
+    """
+    import pandas as pd
+    import Pisa_xml_parser as pxp
+    import Parse_Interfacetable as pi
+    import Chain_Roles as cr
+
+    xml = os.path.join(xml_folder(task), 'interfacetable.xml')
+    os.makedirs(out_folder(task), exist_ok=True)
+    prefix = os.path.join(out_folder(task), task['name'])
+
+    interfaces = pxp.interfacetable_parse(xml)
+    roles = cr.resolve_roles(task['name'], task.get('roles'), task['results'])
+    bonds = pxp.create_df(interfaces, roles)
+    bonds.to_csv(prefix+'_InteractionSheet.csv')
+    #counted here only, the other stages parse the same xml files again
+    rm.count('interfaces', len(interfaces))
+    rm.count('bonds', len(bonds))
+    pxp.fingerprint_table(interfaces).to_csv(prefix+'_FingerprintTable.csv')
+    pd.DataFrame.from_dict(pi.parse_interface(xml)).to_csv(prefix+'_InterfaceTable.csv')
+    return True
+
+
+def stage_chains(task):
+    """
+    Stage writing the solo and complex chain files.
+    """
+    import Auto_Naccess as an
+    import Pdb_Structure as ps
+
+    dic = an.interacting_chains(os.path.join(out_folder(task), task['name']+'_InteractionSheet.csv'))
+    atoms = ps.load_structure(task['structure'])
+    an.pdb_solo_chains(task['structure'], atoms, results=task['results'])
+    an.pdb_complex_chains(task['structure'], dic, atoms, results=task['results'])
+    return True
+
+
+def stage_access(task):
+    """
+    Stage computing the accessibility tables of every interacting chain, the
+    copies of a chain (Interface_Fingerprint.py) get the tables of the first
+    copy. The chain files are spread over task['access_jobs'] processes.
+    """
+    import Auto_Naccess as an
+
+    sheet = os.path.join(out_folder(task), task['name']+'_InteractionSheet.csv')
+    dic = an.interacting_chains(sheet)
+    an.call_naccess(dic, task['nacc_path'], task['name'], jobs=task.get('access_jobs', 1),
+                    backend=task['backend'], n_points=task['n_points'],
+                    same=an.chain_duplicates(sheet) if task.get('dedupe', True) else None,
+                    results=task['results'])
+    return True
+
+
+def stage_plots(task):
+    """
+    Stage writing the ResidueTable and the residue plot.
+    """
+    import Residue_xml_parser as rxp
+    import Chain_Roles as cr
+
+    from Xml_Archive import xml_exists
+
+    xml = os.path.join(xml_folder(task), 'residue0.xml')
+    if task['plots'] == 'skip' or not xml_exists(xml):
+        if task['plots'] != 'skip':
+            logging.info(task['name']+": no residue0.xml, download profile "+' '.join(task.get('download_profile', ['all'])))
+        return True
+    rxp.render_residue_plots([xml], jobs=1, plots=task['plots'],
+                             roles=cr.resolve_roles(task['name'], task.get('roles'), task['results']))
+    return True
+
+
+def stage_aggregate(task):
+    """
+    Stage adding the interfaces, bonds and residues of the structure to the
+    global datasets, from the tables written by the parse stage.
+    """
+    from Global_Dataset import GlobalDataset
+
+    GlobalDataset(os.path.join(task['results'], 'global')).ingest_tables(xml_folder(task), out_folder(task),
+                                                                         name=task['name'], prefix=task['name']+'_')
+    return True
+
+
+def stage_contacts(task):
+    """
+    Stage writing the LocalInteractionSheet and LocalContacts csv files, from
+    the coordinates only.
+    """
+    if not task.get('local_contacts', False):
+        return True
+    import Local_Contacts as lc
+
+    lc.contacts_job((task['structure'], task['results'], None))
+    return True
+
+
+def stage_crosscheck(task):
+    """
+    Stage checking the bonds of PISA against the local bonds.
+    """
+    if not task.get('local_contacts', False):
+        return True
+    import pandas as pd
+    import Local_Contacts as lc
+
+    prefix = os.path.join(out_folder(task), task['name'])
+    check = lc.compare(pd.read_csv(prefix+'_LocalInteractionSheet.csv', index_col=0),
+                       pd.read_csv(prefix+'_InteractionSheet.csv', index_col=0))
+    check.to_csv(prefix+'_ContactCheck.csv')
+    counts = check['status'].value_counts()
+    if counts.get('local_only', 0) or counts.get('pisa_only', 0):
+        logging.info("%s: %d bonds only found locally, %d only by PISA" % (task['name'], counts.get('local_only', 0),
+                                                                          counts.get('pisa_only', 0)))
+    return True
+
+
+STAGE_FUNCTIONS = {'fetch': stage_fetch, 'pisa': stage_pisa, 'parse': stage_parse,
+                   'chains': stage_chains, 'access': stage_access, 'plots': stage_plots,
+                   'aggregate': stage_aggregate, 'contacts': stage_contacts,
+                   'crosscheck': stage_crosscheck}
+
+
+def run_stage(stage, task):
+    """
+    The function executed by the workers, runs one stage of one structure.
+
+    Returns
+    -------
+    tuple
+        (result of the stage, seconds)
+    """
+    start = time.perf_counter()
+    with rm.timer('stage.'+stage, structure=task['name']), rp.profiled(stage, task.get('profile'), task['name']):
+        result = STAGE_FUNCTIONS[stage](task)
+    return result, time.perf_counter() - start
+
+
+def load_state(results):
+    """
+    The function to read the saved task states.
+
+    Parameters
+    ----------
+    results : string
+        the Results directory
+
+    Returns
+    -------
+    dictionary
+        structure name -> stage -> {'status': ..., ...}
+    """
+    try:
+        with open(os.path.join(results, STATE_FILE), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(results, state):
+    """
+    The function to write the task states atomically.
+    """
+    fd, tmp = tempfile.mkstemp(dir=results, prefix='.'+STATE_FILE)
+    with os.fdopen(fd, 'w') as f:
+        json.dump(state, f, indent=1)
+    os.replace(tmp, os.path.join(results, STATE_FILE))
+
+
+def make_tasks(inputs, is_dir, results='Results/', **options):
+    """
+    The function to describe every structure of the run.
+
+    Parameters
+    ----------
+    inputs : string
+        pdb ids separated by spaces or path to a directory with structure files
+    is_dir : boolean
+        True when inputs is a directory
+    results : string
+        the Results directory
+    options :
+        nacc_path, backend, n_points, plots, cache, cache_dir, cache_size,
+        lean and max_rss (browser sessions), job_budget and retries (PISA jobs),
+        download_profile and archive (xml storage), dedupe (copies of the
+        chains, see Interface_Fingerprint.py), local_contacts (contacts and
+        crosscheck stages), roles (the --roles file of Chain_Roles.py),
+        profile (profile the stages, see Run_Profiler.py), access_jobs
+        (processes of the access stage of one structure, see run_pipeline())
+
+    Returns
+    -------
+    list of dictionaries
+    """
+    from Pdb_Structure import STRUCTURE_EXTENSIONS
+
+    tasks = []
+    if is_dir:
+        for f in sorted(os.listdir(inputs), key=str.lower):
+            path = os.path.join(inputs, f)
+            if os.path.isfile(path) and f.split('.')[-1].lower() in STRUCTURE_EXTENSIONS:
+                tasks.append(dict(options, name=f, pdb_id=None, structure=path, results=results))
+    else:
+        for pdb_id in inputs.split():
+            tasks.append(dict(options, name=pdb_id+'.pdb', pdb_id=pdb_id, results=results,
+                              structure=os.path.join(results, pdb_id+'.pdb', pdb_id+'.pdb')))
+
+    return tasks
+
+
+def run_pipeline(tasks, limits=None, results='Results/', force=False, metrics_dir=None, pisa_rate=12):
+    """
+    The function to run the task graph of every structure.
+
+    Parameters
+    ----------
+    tasks : list
+        the structures given by make_tasks()
+    limits : dictionary
+        stage kind -> number of tasks running at once, DEFAULT_LIMITS
+        completes it. The 'binary' processes are shared by the access tasks
+        running at once : a task without access_jobs gets limits['binary']
+        divided by the number of structures (at least 1), so a single large
+        complex still uses every process
+    results : string
+        the Results directory holding the state file
+    force : boolean
+        run again the tasks already done
+    metrics_dir : string
+        directory of the run metrics, <results>/metrics when not given
+    pisa_rate : float
+        PISA submissions per minute at start, adapted by the limiter
+
+    Returns
+    -------
+    dictionary
+        the final task states
+    """
+    limits = dict(DEFAULT_LIMITS, **(limits or {}))
+    os.makedirs(results, exist_ok=True)
+    run_id = os.path.basename(rm.start_run(metrics_dir or os.path.join(results, 'metrics'), script='Pipeline_Dag',
+                                           structures=len(tasks), limits=limits)).split('.')[0]
+    profile = os.path.join(results, 'profile', run_id) if any(task.get('profile') for task in tasks) else None
+    tasks = [dict(task, profile=profile) if task.get('profile') else task for task in tasks]
+    access_jobs = max(1, limits['binary'] // max(1, len(tasks)))
+    tasks = [dict(task, access_jobs=task.get('access_jobs') or access_jobs) for task in tasks]
+    rl.configure(rate=pisa_rate / 60, max_concurrency=limits['browser'])
+    state = {} if force else load_state(results)
+    deps = {stage: needs for stage, kind, needs in STAGES}
+    kinds = {stage: kind for stage, kind, needs in STAGES}
+
+    executors = {kind: (ThreadPoolExecutor if kind in THREAD_KINDS else ProcessPoolExecutor)(max_workers=limits[kind])
+                 for kind in set(kinds.values())}
+    by_name = {task['name']: task for task in tasks}
+    pending = {(task['name'], stage) for task in tasks for stage, kind, needs in STAGES
+               if state.get(task['name'], {}).get(stage, {}).get('status') not in ('done', 'skipped')}
+    for name, stage in pending:
+        state.get(name, {}).pop(stage, None)
+    running = {}
+
+    def status(name, stage):
+        return state.get(name, {}).get(stage, {}).get('status')
+
+    def mark(name, stage, **entry):
+        state.setdefault(name, {})[stage] = dict(entry, time=time.strftime('%Y-%m-%d %H:%M:%S'))
+
+    try:
+        while pending or running:
+            waiting = len(pending)
+            for name, stage in sorted(pending, key=lambda t: ORDER[t[1]]):
+                needs = [status(name, need) for need in deps[stage]]
+                if any(s in ('skipped', 'failed', 'blocked') for s in needs):
+                    pending.discard((name, stage))
+                    blocked = 'skipped' if 'skipped' in needs and 'failed' not in needs and 'blocked' not in needs else 'blocked'
+                    mark(name, stage, status=blocked)
+                    logging.info(name+" "+stage+": "+blocked)
+                elif all(s == 'done' for s in needs):
+                    pending.discard((name, stage))
+                    mark(name, stage, status='running')
+                    running[executors[kinds[stage]].submit(run_stage, stage, by_name[name])] = (name, stage)
+            save_state(results, state)
+            if not running:
+                if len(pending) == waiting:
+                    raise RuntimeError("Unresolvable tasks: "+str(sorted(pending)))
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, stage = running.pop(future)
+                try:
+                    result, seconds = future.result()
+                except Exception as error:
+                    mark(name, stage, status='failed', error=repr(error))
+                    logging.warning(name+" "+stage+" failed: "+repr(error))
+                    continue
+                mark(name, stage, status='done' if result is not False else 'skipped', seconds=round(seconds, 3))
+                logging.info(name+" "+stage+" "+state[name][stage]['status']+" in "+str(round(seconds, 1))+" s")
+                if result is False:
+                    logging.info(name+": no contacts found")
+    finally:
+        for executor in executors.values():
+            executor.shutdown(wait=True, cancel_futures=True)
+        for name, stage in running.values():
+            mark(name, stage, status='interrupted')
+        save_state(results, state)
+        for task in tasks:
+            for stage, entry in state.get(task['name'], {}).items():
+                rm.count('tasks_'+entry['status'], stage=stage)
+        logging.info("Metrics written in %s", rm.finish_run())
+        if profile is not None:
+            logging.info("Profile written in "+str(rp.write_report(profile)))
+
+    return state
+
+
+def add_arguments(parser):
+    """
+    The function to add the orchestrator options to a command line parser.
+    """
+    parser.add_argument("--network_jobs", help="downloads running at once", default=DEFAULT_LIMITS['network'], type=int)
+    parser.add_argument("--browser_jobs", help="PISA browser sessions running at once", default=DEFAULT_LIMITS['browser'], type=int)
+    parser.add_argument("--pisa_rate", help="PISA submissions per minute at start, lowered when the server slows down", default=12, type=float)
+    parser.add_argument("--lean", help="run the PISA browser sessions with a minimal firefox profile", action='store_true')
+    parser.add_argument("--max_rss", help="restart a PISA browser session once it uses more than this many MB", default=None, type=float)
+    parser.add_argument("--download_profile", help="the xml files to download: bonds, residues, summary or all (see Pisa_Artifacts.py)", nargs='+', choices=list(PROFILES), default=['all'])
+    parser.add_argument("--archive", help="store the xml files of each structure in one zip archive read in place", action='store_true')
+    parser.add_argument("--job_budget", help="seconds a PISA job may run before it is stopped and retried", default=1800, type=float)
+    parser.add_argument("--retries", help="retries of a PISA job after a timeout, a server error or an incomplete download", default=2, type=int)
+    parser.add_argument("--cpu_jobs", help="parsing, chain and plot tasks running at once", default=DEFAULT_LIMITS['cpu'], type=int)
+    parser.add_argument("--jobs", help="accessibility processes (0 for all cores), shared by the structures of the run", default=0, type=int)
+    parser.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
+    parser.add_argument("--local_contacts", help="also find the bonds from the coordinates and check the bonds of PISA (see Local_Contacts.py)", action='store_true')
+    parser.add_argument("--keep_duplicates", help="compute the accessibility of every copy of a chain (see Interface_Fingerprint.py)", action='store_true')
+    parser.add_argument("--force", help="run again the tasks already done", action='store_true')
+    parser.add_argument("--profile", help="profile the cpu time and memory of every stage, report in Results/profile/ (see Run_Profiler.py)", action='store_true')
+    parser.add_argument("--metrics_dir", help="directory of the run metrics (json lines events and Prometheus file), default Results/metrics", default=None, type=str)
+
+
+def limits_from(args):
+    return {'network': args.network_jobs, 'browser': args.browser_jobs,
+            'cpu': args.cpu_jobs, 'binary': args.jobs or DEFAULT_LIMITS['binary']}
+
+
+def make_parser():
+    """
+    The function to build the command line parser of RunPisaPy.py and of this
+    script.
+
+    Returns
+    -------
+    argparse.ArgumentParser
+    """
+    from Auto_Naccess import BACKENDS
+    from Residue_xml_parser import PLOT_MODES
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("pdb_id", help="pdb ids separated by spaces or path to a directory with pdb or mmCIF files", type=str)
+    parser.add_argument("--d", help="0 if it's a pdb id and 1 if it's path to pdb files", default=0, type=int)
+    parser.add_argument("nacc_path", help="the full path to the naccess bin (not needed with --backend shrake)", type=str, nargs='?')
+    parser.add_argument("--backend", help="accessibility backend", choices=BACKENDS, default='naccess', type=str)
+    parser.add_argument("--n_points", help="sphere point density of the shrake backend", default=100, type=int)
+    parser.add_argument("--cache_dir", help="shared structure cache directory (default $PISAPY_CACHE or ~/.cache/pisapy)", default=None, type=str)
+    parser.add_argument("--cache_size", help="size cap of the structure cache in MB", default=DEFAULT_SIZE // 1024**2, type=int)
+    parser.add_argument("--no_cache", help="do not use the structure cache", action='store_true')
+    parser.add_argument("--plots", help="eager renders the residue plots, lazy leaves them to Residue_xml_parser.py --render_pending, skip never plots", choices=PLOT_MODES, default='eager', type=str)
+    add_arguments(parser)
+    return parser
+
+
+def parse_args(argv=None):
+    """
+    The function to read the command line of RunPisaPy.py and of this script.
+
+    Returns
+    -------
+    argparse.Namespace
+    """
+    parser = make_parser()
+    args = parser.parse_args(argv)
+    if args.backend == 'naccess' and args.nacc_path is None:
+        parser.error("nacc_path is required with the naccess backend")
+    return args
+
+
+def tasks_from(args):
+    """
+    The function to describe every structure of the command line, see
+    make_tasks().
+    """
+    pdb_id = args.pdb_id
+    if args.d == 1 and not pdb_id.endswith('/'):
+        pdb_id += '/'
+    return make_tasks(pdb_id, args.d == 1, nacc_path=args.nacc_path, backend=args.backend,
+                      n_points=args.n_points, plots=args.plots, cache=not args.no_cache,
+                      cache_dir=args.cache_dir, cache_size=args.cache_size * 1024**2,
+                      lean=args.lean, max_rss=args.max_rss, job_budget=args.job_budget,
+                      retries=args.retries, download_profile=args.download_profile,
+                      archive=args.archive, dedupe=not args.keep_duplicates,
+                      local_contacts=args.local_contacts, roles=args.roles,
+                      profile=args.profile)
+
+
+if __name__ == '__main__':
+
+    ARGS = parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    run_pipeline(tasks_from(ARGS), limits=limits_from(ARGS), force=ARGS.force, metrics_dir=ARGS.metrics_dir,
+                 pisa_rate=ARGS.pisa_rate)
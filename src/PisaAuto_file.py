@@ -8,12 +8,41 @@ generated xml files.
 
 First you need to have the python packages selenium, halo and argparse installed 
 and the PisaAuto_id.py script, you also need the pdb files on witch you want to 
-run pisa.
+run pisa (.pdb, .cif or .mmcif files).
 
 Then you can run the script with the following command :
 
     python PisaAuto_file.py path_to_pdb_files_folder/
 
+Several nodes can share one directory on a shared filesystem, each structure
+is then claimed with a lease file (see Work_Lease.py) :
+
+    python PisaAuto_file.py path_to_pdb_files_folder/ --distributed
+
+Every structure is a supervised job (see Job_Supervisor.py) : it is stopped
+after --job_budget seconds, retried after a timeout, a server error or an
+incomplete download, and written to pisa_dead_letter.jsonl in the folder when
+it still fails, the other structures go on.
+
+With --download_profile only the xml files some steps need are downloaded
+(see Pisa_Artifacts.py), e.g. bonds and interface areas for a binder
+screening :
+
+    python PisaAuto_file.py path_to_pdb_files_folder/ --download_profile bonds
+
+With --archive the xml files of each structure are packed in
+<name>_PDBePISA_xml_files.zip, read in place by the parsers (see
+Xml_Archive.py).
+
+With --global_dir the tables of every structure are added to global
+datasets (see Global_Dataset.py) :
+
+    python PisaAuto_file.py path_to_pdb_files_folder/ --global_dir Results/global
+
+With --profile every PISA job and every parsing step is profiled (cpu time
+and memory), the ranked report is written in
+<pdb_path>/profile/run-<id>/profile_report.txt (see Run_Profiler.py).
+
 
 Note that right now it's made for firefox browser but adding other browsers 
 isn't hard to implement (ex: driver = webdriver.Chrome() for chrome).
@@ -34,16 +63,24 @@ import pandas as pd
 from os import listdir
 from os.path import isfile
 import argparse
-import matplotlib.pyplot as plt
-from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
 from selenium.common.exceptions import NoSuchElementException
 from halo import Halo
 import PisaAuto_id as pisa
 from Parse_Interfacetable import parse_interface, find_xml_files
 from Pisa_xml_parser import create_df, interfacetable_parse
-from Residue_xml_parser import xmlresidue_parser, plot_residue_data
+from Interface_Fingerprint import fingerprint_table
+from Residue_xml_parser import render_residue_plots, PLOT_MODES
+from Pdb_Structure import STRUCTURE_EXTENSIONS
+import Run_Metrics as rm
+from Work_Lease import LeaseDir, DEFAULT_TTL
+import Rate_Limiter as rl
+import Job_Supervisor as js
+from Pisa_Artifacts import PROFILES
+from Xml_Archive import output_dir, pack, stored
+from Global_Dataset import GlobalDataset
+from Chain_Roles import roles_for_file
+from Run_Profiler import profiled, write_report
 import logging
 from datetime import datetime
 
@@ -97,8 +134,14 @@ def launch_pdb_file(driver, pdb_file):
 
     driver.find_element(By.NAME, "btn_upload").click()
 
-    while(not check_exists_by_name('btn_submit_interfaces', driver)):
-        pass
+    def uploaded():
+        if check_exists_by_name('btn_submit_interfaces', driver):
+            return True
+        js.check_server_error(driver.page_source)
+        return False
+
+    with rm.timer('pisa.upload', structure=pdb_file.split('/')[-1]):
+        js.wait_for(uploaded, 'the upload of '+pdb_file)
 
     driver.find_element(By.NAME, "btn_submit_interfaces").click()
 
@@ -113,30 +156,116 @@ def launch_pdb_file(driver, pdb_file):
 
     time.sleep(4)
 
-    if driver.find_element(By.CLASS_NAME, "phead").text.startswith("No"):
+    rm.count('structures')
 
+    try:
+        contacts = pisa.wait_results(driver, pdb_file.split('/')[-1])
+    finally:
         spinner.stop()
+
+    if not contacts:
         
         logging.info('No Contacts found')
 
+        rm.count('no_contacts')
+
         return driver, False
 
-    else:
-        while(not check_exists_by_name('downloadXML', driver)):
-            pass
+    time.sleep(4)
 
-        time.sleep(4)
+    return driver, True
 
-        spinner.stop()
 
-        return driver, True
+def pisa_job(name, path, pdb_id=None, pdb_file=None, lean=False, max_rss_mb=None, profile='all',
+             archive=False):
+    """
+    The function to run PISA on one structure and to download its xml files
+    in <path><name>_PDBePISA_xml_files, the browser session is always quit.
+
+    Parameters
+    ----------
+    name : string
+        the structure name
+    path : string
+        the output directory, ending with a separator
+    pdb_id : string
+        the pdb id to submit, pdb_file is uploaded when not given
+    pdb_file : string
+        the full path of the structure file to upload
+    lean : boolean
+        run firefox with the lean profile
+    max_rss_mb : float
+        memory threshold in MB after which the session is restarted
+    profile : string or list of strings
+        the download profiles (see Pisa_Artifacts.py)
+    archive : boolean
+        pack the xml files in <path><name>_PDBePISA_xml_files.zip (see
+        Xml_Archive.py)
+
+    Returns
+    -------
+    boolean
+        False when PISA found no contacts
+    """
+    def relaunch():
+        driver = pisa.start(lean)
+        try:
+            if pdb_file is None:
+                return pisa.launch_pdb_id(driver, pdb_id), True
+            return launch_pdb_file(driver, pdb_file)
+        except BaseException:
+            driver.quit()
+            raise
+
+    driver, contacts = relaunch()
+    try:
+        if contacts:
+            driver = pisa.download_xmls(driver, name, path=path, max_rss_mb=max_rss_mb,
+                                        relaunch=lambda: relaunch()[0], profile=profile)
+    finally:
+        driver.quit()
+
+    if contacts and archive:
+        pack(path+name+'_PDBePISA_xml_files')
+
+    return contacts
 
 
 if __name__ == '__main__':
 
     PARSER = argparse.ArgumentParser()
 
-    PARSER.add_argument("pdb_path", help="the path of the pdb files directory", type=str)
+    PARSER.add_argument("pdb_path", help="the path of the pdb or mmCIF files directory", type=str)
+
+    PARSER.add_argument("--plots", help="eager renders the residue plots, lazy leaves them to Residue_xml_parser.py --render_pending, skip never plots", choices=PLOT_MODES, default='eager', type=str)
+
+    PARSER.add_argument("--plot_jobs", help="number of residue parsing and plotting processes (0 for all cores)", default=1, type=int)
+
+    PARSER.add_argument("--metrics_dir", help="directory of the run metrics (json lines events and Prometheus file), default <pdb_path>/metrics", default=None, type=str)
+
+    PARSER.add_argument("--pisa_rate", help="PISA submissions per minute at start, lowered when the server slows down", default=12, type=float)
+
+    PARSER.add_argument("--download_profile", help="the xml files to download (see Pisa_Artifacts.py)", nargs='+', choices=list(PROFILES), default=['all'])
+
+    PARSER.add_argument("--archive", help="store the xml files of each structure in one zip archive read in place (see Xml_Archive.py)", action='store_true')
+
+    PARSER.add_argument("--lean", help="run firefox with a minimal profile (no images, fonts, caches or history)", action='store_true')
+
+    PARSER.add_argument("--max_rss", help="restart the browser session once it uses more than this many MB", default=None, type=float)
+
+    PARSER.add_argument("--job_budget", help="seconds a PISA job may run before it is stopped and retried", default=js.DEFAULT_BUDGET, type=float)
+
+    PARSER.add_argument("--retries", help="retries of a PISA job after a timeout, a server error or an incomplete download", default=js.DEFAULT_RETRIES, type=int)
+
+    PARSER.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
+
+    PARSER.add_argument("--global_dir", help="add the tables of every structure to the global datasets of this directory (see Global_Dataset.py)", default=None, type=str)
+
+    PARSER.add_argument("--profile", help="profile the cpu time and memory of every step, report in <pdb_path>/profile/ (see Run_Profiler.py)", action='store_true')
+
+    PARSER.add_argument("--distributed", help="claim every structure with a lease file so several nodes can work on the same directory", action='store_true')
+
+    PARSER.add_argument("--lease_ttl", help="seconds without heartbeat after which the lease of a crashed node is reclaimed", default=DEFAULT_TTL, type=int)
 
     ARGS = PARSER.parse_args()
 
@@ -155,45 +284,99 @@ if __name__ == '__main__':
                         handlers=[logging.FileHandler(log_filename, mode='a'),
                                   logging.StreamHandler(sys.stdout)])
 
+    RUN_ID = os.path.basename(rm.start_run(ARGS.metrics_dir or os.path.join(PDB_PATH, 'metrics'),
+                                           script='PisaAuto_file', inputs=PDB_PATH)).split('.')[0]
+
+    PROFILE = os.path.join(PDB_PATH, 'profile', RUN_ID) if ARGS.profile else None
+
     PDB_FILES = sorted([PDB_PATH+f for f in listdir(PDB_PATH) 
         if ((isfile(PDB_PATH+f)) and 
-            (f.split(".")[-1] == "pdb"))], key=str.lower)
+            (f.split(".")[-1].lower() in STRUCTURE_EXTENSIONS))], key=str.lower)
+
+    LIMITER = rl.configure(rate=ARGS.pisa_rate / 60, max_concurrency=1)
+
+    DEAD_LETTER = os.path.join(PDB_PATH, 'pisa_dead_letter.jsonl')
+
+    LEASES = LeaseDir(os.path.join(PDB_PATH, '.leases'), ttl=ARGS.lease_ttl) if ARGS.distributed else None
 
     for i, file in enumerate(PDB_FILES):
-        output_folder = os.path.join(PDB_PATH, file.split('/')[-1] + '_PDBePISA_xml_files')
-        if os.path.exists(output_folder):
+        name = file.split('/')[-1]
+        output_folder = os.path.join(PDB_PATH, name + '_PDBePISA_xml_files')
+        #with leases an existing folder still under lease is a crashed node's partial result
+        if stored(output_folder) and (LEASES is None or LEASES.owner_of(name) is None):
             logging.info(f"Folder {output_folder} already exists. Skipping {file}.")
             continue
+        if LEASES is not None and not LEASES.claim(name):
+            continue
         logging.info("## pdb file "+str(i+1)+"/"+str(len(PDB_FILES)))
-        driver = pisa.start()
-        driver, boo = launch_pdb_file(driver, file)
-        if boo:
-            pisa.download_xmls(driver, file.split('/')[-1], path=PDB_PATH)
-        driver.quit()
+        try:
+            with profiled('pisa', PROFILE, name):
+                OUTCOME = js.supervise(name, lambda: pisa_job(name, PDB_PATH, pdb_file=file, lean=ARGS.lean, max_rss_mb=ARGS.max_rss,
+                                                              profile=ARGS.download_profile, archive=ARGS.archive),
+                                       budget=ARGS.job_budget, retries=ARGS.retries, dead_letter=DEAD_LETTER,
+                                       output=output_folder, limiter=LIMITER)
+        except BaseException:
+            if LEASES is not None:
+                LEASES.release(name)
+            raise
+        if LEASES is not None:
+            #a dead-lettered structure is left for a later run or another node
+            LEASES.release(name, done=OUTCOME in js.FINISHED)
     
     xml_files = find_xml_files(ROOT_DIR)
 
+    if LEASES is not None:
+        #parse the finished structures no other node is parsing
+        xml_files = [xml_file for xml_file in xml_files
+                     if LEASES.owner_of(os.path.basename(os.path.dirname(xml_file))[:-len('_PDBePISA_xml_files')]) is None
+                     and LEASES.claim('parse_'+os.path.basename(os.path.dirname(xml_file)))]
+
     logging.info("5-Parsing InterfaceTable.xml files")
     for xml_file in xml_files:
-        df = pd.DataFrame.from_dict(parse_interface(xml_file))
-        output_file = os.path.join(os.path.dirname(xml_file), "InterfaceTable.csv")
-        df.to_csv(output_file)
+        with profiled('interfaces', PROFILE, os.path.basename(os.path.dirname(xml_file))):
+            df = pd.DataFrame.from_dict(parse_interface(xml_file))
+            output_file = os.path.join(output_dir(xml_file), "InterfaceTable.csv")
+            with rm.timer('write.csv'):
+                df.to_csv(output_file)
 
     for xml_file in xml_files:
         logging.info(f"Processing {xml_file}")
-        df = create_df(interfacetable_parse(xml_file))
-        output_file = os.path.join(os.path.dirname(xml_file), "InteractionSheet.csv")
-        df.to_csv(output_file)
+        with profiled('bonds', PROFILE, os.path.basename(os.path.dirname(xml_file))):
+            interfaces = interfacetable_parse(xml_file)
+            df = create_df(interfaces, roles_for_file(xml_file, ARGS.roles))
+            rm.count('interfaces', len(interfaces))
+            rm.count('bonds', len(df))
+            output_file = os.path.join(output_dir(xml_file), "InteractionSheet.csv")
+            with rm.timer('write.csv'):
+                df.to_csv(output_file)
+                fingerprint_table(interfaces).to_csv(os.path.join(output_dir(xml_file), "FingerprintTable.csv"))
     logging.info("Done")
 
     logging.info("6-Parsing Residue0.xml files")
     residue_xml_files = find_xml_files(ROOT_DIR, filename="residue0.xml")
+    if LEASES is not None:
+        parsed = {os.path.dirname(xml_file) for xml_file in xml_files}
+        residue_xml_files = [xml_file for xml_file in residue_xml_files if os.path.dirname(xml_file) in parsed]
 
-    for xml_file in residue_xml_files:
-        df = xmlresidue_parser(xml_file)
-        output_file = os.path.join(os.path.dirname(xml_file), "ResidueTable.csv")
-        df.to_csv(output_file)
-        plot_residue_data(df)
-        plt.savefig(os.path.join(os.path.dirname(xml_file), "ResiduePlot.pdf"))
-        plt.close
+    #with --plot_jobs above 1 the plots are drawn in worker processes, only their dispatch is profiled
+    with profiled('residues', PROFILE):
+        render_residue_plots(residue_xml_files, jobs=ARGS.plot_jobs, plots=ARGS.plots, roles=ARGS.roles)
     logging.info("Done")
+
+    if ARGS.global_dir:
+        logging.info("7-Updating the global datasets")
+        DATASET = GlobalDataset(ARGS.global_dir)
+        for xml_file in xml_files:
+            with profiled('global', PROFILE, os.path.basename(os.path.dirname(xml_file))):
+                DATASET.ingest_tables(os.path.dirname(xml_file), output_dir(xml_file))
+        logging.info("Done")
+
+    if LEASES is not None:
+        for xml_file in xml_files:
+            LEASES.release('parse_'+os.path.basename(os.path.dirname(xml_file)), done=True)
+        LEASES.close()
+
+    logging.info("Metrics written in %s", rm.finish_run())
+
+    if PROFILE is not None:
+        logging.info("Profile written in %s", write_report(PROFILE))
@@ -15,7 +15,17 @@ Note that right now it's made for firefox browser but adding other browsers
 isn't hard to implement (ex: driver = webdriver.Chrome() for chrome).
 Also note that only the interface table, the residues interaction and interfacing 
 residues xml files are downloaded. 
-hard
+
+With --lean the browser runs with a minimal profile (see Browser_Session.py),
+with --max_rss the session is restarted between two interfaces once it uses
+more than the given MB :
+
+    python PisaAuto_id.py pdb_id --lean --max_rss 800
+
+With --download_profile only the xml files some steps need are downloaded
+(see Pisa_Artifacts.py), e.g. the bonds for a binder screening :
+
+    python PisaAuto_id.py pdb_id --download_profile bonds
 
   Author
   ------
@@ -25,17 +35,24 @@ hard
 
 import time
 import os
+import sys
 import argparse
 from selenium import webdriver
-from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.common.by import By
-from selenium.webdriver.firefox.options import Options
 from selenium.common.exceptions import NoSuchElementException
 from halo import Halo
 import logging
+import Run_Metrics as rm
+import Job_Supervisor as js
+from Pisa_Artifacts import ARTIFACTS, PROFILES, artifact_kind, profile_artifacts, write_manifest
+from Browser_Session import firefox_options, session_rss_mb
 from datetime import datetime
 
 
+#seconds a page may take to load
+PAGE_TIMEOUT = 120
+
+
 def check_exists_by_name(name, driver):
     """
     The function to check if an element is present on the webdriver.
@@ -57,14 +74,44 @@ def check_exists_by_name(name, driver):
     return True
 
 
-def start():
+def wait_results(driver, name):
+    """
+    The function waiting for the results page of PISA, within the budget of
+    the job (see Job_Supervisor.py).
+
+    Parameters
+    ----------
+    driver : selenium webdriver
+    name : string
+        the structure name
+
+    Returns
+    -------
+    boolean
+        True when the results are ready, False when PISA found no contacts
+    """
+    def ready():
+        if check_exists_by_name('downloadXML', driver):
+            return 'results'
+        heads = driver.find_elements(By.CLASS_NAME, "phead")
+        if heads and heads[0].text.startswith("No"):
+            return 'no_contacts'
+        js.check_server_error(driver.page_source)
+        return None
+
+    with rm.timer('pisa.wait', structure=name):
+        return js.wait_for(ready, 'the PISA results of '+name) == 'results'
+
+
+def start(lean=False):
     """
     The function to access to the pisa web server.
     I'm using firefox but it can be changed for other browsers.
     
     Parameters
     ----------
-    None
+    lean : boolean
+        True to run firefox with the lean profile of Browser_Session.py
     
     Returns
     -------
@@ -72,13 +119,13 @@ def start():
     """
     logging.info("1- Accessing to PISA website :")
 
-    options = Options()
-    options.add_argument("--headless")
-    driver = webdriver.Firefox(options=options)
-    driver.get("https://www.ebi.ac.uk/pdbe/pisa/")
+    with rm.timer('pisa.start'):
+        driver = webdriver.Firefox(options=firefox_options(lean))
+        driver.set_page_load_timeout(PAGE_TIMEOUT)
+        driver.get("https://www.ebi.ac.uk/pdbe/pisa/")
 
-    launch = driver.find_element(By.NAME, "start_server")
-    launch.click()
+        launch = driver.find_element(By.NAME, "start_server")
+        launch.click()
 
     logging.info("Done")
 
@@ -99,6 +146,11 @@ def launch_pdb_id(driver, pdb_id):
     Returns
     -------
     selenium webdriver
+
+    Raises
+    ------
+    Job_Supervisor.JobFailure
+        'no_contacts' when PISA found no interface
     """
     logging.info("2- Submitting "+pdb_id+" to PISA :")
 
@@ -118,16 +170,89 @@ def launch_pdb_id(driver, pdb_id):
     interface = driver.find_element(By.NAME, "btn_submit_interfaces")
     interface.click()
 
-    while(not check_exists_by_name('downloadXML', driver)):
-        pass
+    try:
+        contacts = wait_results(driver, pdb_id)
+    finally:
+        spinner.stop()
 
-    time.sleep(2)
+    rm.count('structures')
 
-    spinner.stop()
+    if not contacts:
+        logging.info('No Contacts found')
+        rm.count('no_contacts')
+        raise js.JobFailure('no_contacts', pdb_id)
+
+    time.sleep(2)
 
     return driver
 
-def download_xmls(driver, pdb_id, path):
+def save_page(driver, file_name):
+    """
+    The function to write the page of the current window in an xml file.
+
+    Parameters
+    ----------
+    driver : selenium webdriver
+    file_name : string
+        the output xml file
+
+    Returns
+    -------
+    Nothing
+    """
+    with rm.timer('pisa.write_xml'):
+        with open(file_name, 'w') as f:
+            f.write(driver.page_source)
+
+    rm.count('artifacts')
+    rm.count('artifact_bytes', os.path.getsize(file_name))
+
+def check_memory(driver, max_rss_mb=None, relaunch=None):
+    """
+    The function to measure the memory of the session and to replace it by a
+    new one when it uses more than max_rss_mb.
+
+    Parameters
+    ----------
+    driver : selenium webdriver
+    max_rss_mb : float
+        memory threshold in MB, None to never recycle
+    relaunch : function
+        returns a new webdriver on the interfaces page of the same structure
+
+    Returns
+    -------
+    selenium webdriver
+        driver or the new session
+    """
+    rss = session_rss_mb(driver)
+    rm.gauge('browser_rss_mb', round(rss, 1))
+    if max_rss_mb is None or relaunch is None or rss <= max_rss_mb:
+        return driver
+
+    logging.info("Browser session uses %.0f MB, starting a new one" % rss)
+    driver.quit()
+    rm.count('browser_recycles')
+    return relaunch()
+
+def button_kind(button):
+    """
+    The function to guess which xml file a downloadXML button gives from its
+    form, before clicking it.
+
+    Returns
+    -------
+    string or None
+        one of Pisa_Artifacts.ARTIFACTS, None when unknown
+    """
+    try:
+        html = button.find_element(By.XPATH, './ancestor::form[1]').get_attribute('outerHTML') or ''
+    except NoSuchElementException:
+        return None
+    kinds = [kind for kind in ARTIFACTS if kind in html.lower()]
+    return kinds[0] if len(kinds) == 1 else None
+
+def download_xmls(driver, pdb_id, path, max_rss_mb=None, relaunch=None, profile='all'):
     """
     The function to download the xml files.
 
@@ -135,11 +260,32 @@ def download_xmls(driver, pdb_id, path):
     ----------
     driver : selenium webdriver
     pdb_id : string
+    path : string
+        the output directory
+    max_rss_mb : float
+        memory threshold in MB of the session, checked before each interface
+    relaunch : function
+        returns a new webdriver on the interfaces page of the same structure,
+        needed to recycle the session
+    profile : string or list of strings
+        the download profiles (see Pisa_Artifacts.py), the other xml files of
+        the interface pages are not downloaded
     
     Returns
     -------
-    Nothing
+    selenium webdriver
+        the session in use at the end, to quit by the caller
+
+    Raises
+    ------
+    Job_Supervisor.JobFailure
+        'download_incomplete' when an xml file can not be downloaded,
+        'timeout' when the budget of the job is spent
     """
+    with rm.timer('pisa.download', structure=pdb_id):
+        return _download_xmls(driver, pdb_id, path, max_rss_mb, relaunch, profile)
+
+def _download_xmls(driver, pdb_id, path, max_rss_mb=None, relaunch=None, profile='all'):
     logging.info("Done")
 
     logging.info("4- Downloading xml files :")
@@ -160,18 +306,19 @@ def download_xmls(driver, pdb_id, path):
             break
         time.sleep(2)
         retries -= 1
+        rm.count('retries')
 
     if xml == 'about:blank':
         logging.info("Error: Could not download the xml files")
         driver.close()
         driver.switch_to.window(driver.window_handles[0])
-        return
+        spinner.stop()
+        raise js.JobFailure('download_incomplete', 'interface table of '+pdb_id)
 
     if not os.path.exists(path+pdb_id+'_PDBePISA_xml_files'):
         os.makedirs(path+pdb_id+'_PDBePISA_xml_files')
 
-    with open(path+pdb_id+'_PDBePISA_xml_files'+'/'+xml.split('/')[-1], 'w') as f:
-        f.write(driver.page_source)
+    save_page(driver, path+pdb_id+'_PDBePISA_xml_files'+'/'+xml.split('/')[-1])
 
     time.sleep(3)
 
@@ -190,8 +337,17 @@ def download_xmls(driver, pdb_id, path):
 
     spinner.stop()
 
+    rm.count('pisa_interfaces', len(inter_lst))
+
+    wanted = profile_artifacts(profile)
+    layout = {}
+
     for i in inter_lst:
 
+        js.check_deadline('interface '+i)
+
+        driver = check_memory(driver, max_rss_mb, relaunch)
+
         spinner = Halo(text="Downloading files "+i+"/"+str(len(inter_lst)), spinner='dots')
         spinner.start()
 
@@ -203,17 +359,33 @@ def download_xmls(driver, pdb_id, path):
 
         xmls = driver.find_elements(By.NAME, 'downloadXML')
 
-        for i in range(1,len(xmls)):
-            driver.execute_script("arguments[0].scrollIntoView();", xmls[i])
-            xmls[i].click()
+        if len(xmls) < 2:
+            spinner.stop()
+            raise js.JobFailure('download_incomplete', 'no xml file on the page of interface '+i)
+
+        for j in range(1,len(xmls)):
+            #the layout learned from the urls first, the guess from the form only for a new layout
+            kind = layout.get((len(xmls), j))
+            if kind is None:
+                kind = button_kind(xmls[j])
+            if wanted is not None and kind is not None and kind not in wanted:
+                rm.count('artifacts_skipped')
+                continue
+
+            driver.execute_script("arguments[0].scrollIntoView();", xmls[j])
+            xmls[j].click()
 
             time.sleep(3)
 
             driver.switch_to.window(driver.window_handles[1])
             xml = driver.current_url
 
-            with open(path+pdb_id+'_PDBePISA_xml_files'+'/'+xml.split('/')[-1], 'w') as f:
-                f.write(driver.page_source)
+            #the pages of the interfaces share their layout, remember which button gives which file
+            layout[(len(xmls), j)] = artifact_kind(xml)
+            if wanted is None or layout[(len(xmls), j)] in wanted:
+                save_page(driver, path+pdb_id+'_PDBePISA_xml_files'+'/'+xml.split('/')[-1])
+            else:
+                rm.count('artifacts_skipped')
 
             time.sleep(3)
 
@@ -231,8 +403,14 @@ def download_xmls(driver, pdb_id, path):
 
     spinner.stop()
 
+    write_manifest(path+pdb_id+'_PDBePISA_xml_files', profile)
+
+    check_memory(driver)
+
     logging.info("Done")
 
+    return driver
+
 
 if __name__ == '__main__':
 
@@ -240,6 +418,14 @@ if __name__ == '__main__':
 
     PARSER.add_argument("pdb_id", help="the id of the pdb you want to run pisa on", type=str)
 
+    PARSER.add_argument("--path", help="the output directory", default='./', type=str)
+
+    PARSER.add_argument("--download_profile", help="the xml files to download (see Pisa_Artifacts.py)", nargs='+', choices=list(PROFILES), default=['all'])
+
+    PARSER.add_argument("--lean", help="run firefox with a minimal profile (no images, fonts, caches or history)", action='store_true')
+
+    PARSER.add_argument("--max_rss", help="restart the browser session once it uses more than this many MB", default=None, type=float)
+
     ARGS = PARSER.parse_args()
 
     PDB_ID = ARGS.pdb_id
@@ -253,4 +439,8 @@ if __name__ == '__main__':
                                   logging.StreamHandler(sys.stdout)])
 
 
-    download_xmls(launch_pdb_id(start(), PDB_ID), PDB_ID)
+    def relaunch():
+        return launch_pdb_id(start(ARGS.lean), PDB_ID)
+
+    download_xmls(relaunch(), PDB_ID, os.path.join(ARGS.path, ''), ARGS.max_rss, relaunch,
+                  ARGS.download_profile).quit()
@@ -0,0 +1,256 @@
+#!/usr/bin/python3
+"""
+Code giving one entry point to every step of PisaPy, as subcommands.
+
+  How to use
+  ----------
+Each subcommand only imports the modules of its own step, so a parse or
+summary run does not pay for selenium, matplotlib or Biopython :
+
+    python PisaPy.py submit "6ta5 6iol"                     (PISA on pdb ids)
+    python PisaPy.py submit path_to_pdb_files/ --d 1        (PISA on pdb files)
+    python PisaPy.py parse path/to/pisa_results/ --chain_map 6ta5_chains.json
+    python PisaPy.py parse path/to/pisa_results/ --roles campaign_roles.json
+    python PisaPy.py residues path/to/pisa_results/ --jobs 8 --plots lazy
+    python PisaPy.py access pdb_name.pdb InteractionSheet.csv --backend shrake
+    python PisaPy.py summarize InteractionSheet.csv
+    python PisaPy.py graph InteractionSheet.csv
+    python PisaPy.py contacts path/to/6ta5.pdb --compare InteractionSheet.csv
+
+The whole pipeline is run by RunPisaPy.py. The import time of every subcommand
+is checked by Bench_Imports.py. --profile, before the subcommand, writes the
+cpu and memory profile of the step in a run-<id>/ folder of its directory :
+
+    python PisaPy.py --profile Results/profile/ residues path/to/pisa_results/
+
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import sys
+from Pisa_Artifacts import PROFILES
+
+#modules imported by each subcommand
+COMMANDS = {'submit': ('PisaAuto_id', 'PisaAuto_file'),
+            'parse': ('Pisa_xml_parser', 'Parse_Interfacetable'),
+            'residues': ('Residue_xml_parser',),
+            'access': ('Auto_Naccess',),
+            'summarize': ('Interaction_Type',),
+            'graph': ('Chains_Res_Graph',),
+            'contacts': ('Local_Contacts',)}
+
+
+def load(command):
+    """
+    The function to import the modules of a subcommand.
+
+    Returns
+    -------
+    list
+        the modules
+    """
+    return [importlib.import_module(name) for name in COMMANDS[command]]
+
+
+def cmd_submit(args):
+    """
+    Subcommand running PISA and downloading the xml files.
+    """
+    pai, paf = load('submit')
+    import Rate_Limiter as rl
+    import Job_Supervisor as js
+    import Xml_Archive as xa
+    limiter = rl.configure(rate=args.pisa_rate / 60, max_concurrency=1)
+
+    if args.d == 1:
+        from Pdb_Structure import STRUCTURE_EXTENSIONS
+        path = os.path.join(args.inputs, '')
+        todo = [(f, os.path.abspath(path+f)) for f in sorted(os.listdir(path), key=str.lower)
+                if os.path.isfile(path+f) and f.split('.')[-1].lower() in STRUCTURE_EXTENSIONS]
+    else:
+        path = os.path.join(args.results, '')
+        todo = [(pdb_id, None) for pdb_id in args.inputs.split()]
+
+    for name, pdb_file in todo:
+        if xa.stored(path+name+'_PDBePISA_xml_files'):
+            logging.info("Skipping "+name+", its xml files already exist")
+            continue
+        js.supervise(name, lambda: paf.pisa_job(name, path, pdb_id=None if pdb_file else name, pdb_file=pdb_file,
+                                                lean=args.lean, max_rss_mb=args.max_rss,
+                                                profile=args.download_profile, archive=args.archive),
+                     budget=args.job_budget, retries=args.retries, output=path+name+'_PDBePISA_xml_files',
+                     dead_letter=path+'pisa_dead_letter.jsonl', limiter=limiter)
+
+
+def cmd_parse(args):
+    """
+    Subcommand writing the InterfaceTable.csv, InteractionSheet.csv and
+    FingerprintTable.csv files next to every interfacetable.xml.
+    """
+    import pandas as pd
+    pxp, pi = load('parse')
+
+    if args.chain_map:
+        pxp.DICT_CHAINS = pxp.load_chain_map(args.chain_map)
+
+    from Xml_Archive import output_dir
+    import Chain_Roles as cr
+
+    for xml_file in pi.find_xml_files(args.root_dir):
+        logging.info("Processing "+xml_file)
+        pd.DataFrame.from_dict(pi.parse_interface(xml_file)).to_csv(
+            os.path.join(output_dir(xml_file), "InterfaceTable.csv"))
+        interfaces = pxp.interfacetable_parse(xml_file)
+        roles = cr.roles_for_file(xml_file, args.roles) if args.roles or not args.chain_map else None
+        pxp.create_df(interfaces, roles).to_csv(os.path.join(output_dir(xml_file), "InteractionSheet.csv"))
+        pxp.fingerprint_table(interfaces).to_csv(os.path.join(output_dir(xml_file), "FingerprintTable.csv"))
+
+
+def cmd_residues(args):
+    """
+    Subcommand writing the ResidueTable.csv files and the residue plots.
+    """
+    rxp, = load('residues')
+
+    if args.render_pending:
+        rxp.render_pending(args.root_dir, jobs=args.jobs, roles=args.roles)
+    else:
+        rxp.render_residue_plots(rxp.find_xml_files(args.root_dir, filename="residue0.xml"),
+                                 jobs=args.jobs, plots=args.plots, roles=args.roles)
+
+
+def cmd_access(args):
+    """
+    Subcommand writing the chain files and the accessibility tables.
+    """
+    an, = load('access')
+    import Pdb_Structure as ps
+
+    if args.backend == 'naccess' and args.naccess_path is None:
+        sys.exit("naccess_path is required with the naccess backend")
+
+    dic = an.interacting_chains(args.csv_file)
+    atoms = ps.load_structure(args.pdb_file)
+    an.pdb_solo_chains(args.pdb_file, atoms, results=args.results)
+    an.pdb_complex_chains(args.pdb_file, dic, atoms, results=args.results)
+    an.call_naccess(dic, args.naccess_path, args.pdb_file.split('/')[-1], jobs=args.jobs,
+                    backend=args.backend, n_points=args.n_points,
+                    same=None if args.keep_duplicates else an.chain_duplicates(args.csv_file),
+                    results=args.results)
+
+
+def cmd_summarize(args):
+    """
+    Subcommand writing the major interaction type of every pair of chains.
+    """
+    import pandas as pd
+    it, = load('summarize')
+
+    data = pd.read_csv(args.csv_file, usecols=[2, 3, 4, 5, 6, 7, 8])
+    pd.DataFrame.from_dict(it.inter_type_prct(it.dict_inter_type(it.get_chains(data), data))).to_csv(args.out)
+
+
+def cmd_graph(args):
+    """
+    Subcommand drawing the residue graph of every pair of chains.
+    """
+    crg, = load('graph')
+
+    chains, df = crg.get_chains(args.csv_file)
+    crg.plot_graphs(chains, df, dedupe=not args.keep_duplicates)
+
+
+def cmd_contacts(args):
+    """
+    Subcommand finding the bonds locally, from the coordinates, and checking
+    the bonds of PISA against them.
+    """
+    lc, = load('contacts')
+
+    print("Written in "+lc.contacts_job((args.structure, args.out, args.compare)))
+
+
+def make_parser():
+    """
+    The function to build the command line parser, it only imports the
+    download profiles of Pisa_Artifacts.py (standard library only).
+    """
+    parser = argparse.ArgumentParser(description="PisaPy steps, see RunPisaPy.py for the whole pipeline")
+    parser.add_argument("--profile", help="profile the cpu time and memory of the subcommand in this directory (see Run_Profiler.py)", default=None, type=str)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    p = sub.add_parser('submit', help="run PISA and download its xml files")
+    p.add_argument("inputs", help="pdb ids separated by spaces or path to a directory with pdb or mmCIF files", type=str)
+    p.add_argument("--d", help="0 if it's a pdb id and 1 if it's path to pdb files", default=0, type=int)
+    p.add_argument("--results", help="output directory of the pdb id xml files", default='Results/', type=str)
+    p.add_argument("--pisa_rate", help="PISA submissions per minute at start, lowered when the server slows down", default=12, type=float)
+    p.add_argument("--lean", help="run firefox with a minimal profile (no images, fonts, caches or history)", action='store_true')
+    p.add_argument("--max_rss", help="restart the browser session once it uses more than this many MB", default=None, type=float)
+    p.add_argument("--download_profile", help="the xml files to download: bonds, residues, summary or all (see Pisa_Artifacts.py)", nargs='+', choices=list(PROFILES), default=['all'])
+    p.add_argument("--archive", help="store the xml files of each structure in one zip archive read in place", action='store_true')
+    p.add_argument("--job_budget", help="seconds a PISA job may run before it is stopped and retried", default=1800, type=float)
+    p.add_argument("--retries", help="retries of a PISA job after a timeout, a server error or an incomplete download", default=2, type=int)
+    p.set_defaults(function=cmd_submit)
+
+    p = sub.add_parser('parse', help="write InterfaceTable.csv and InteractionSheet.csv")
+    p.add_argument("root_dir", help="the root directory to search for interfacetable.xml files", type=str)
+    p.add_argument("--chain_map", help="the <id>_chains.json map written by Download_pdbfasta.py", default=None, type=str)
+    p.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
+    p.set_defaults(function=cmd_parse)
+
+    p = sub.add_parser('residues', help="write ResidueTable.csv and the residue plots")
+    p.add_argument("root_dir", help="the root directory to search for residue0.xml files", type=str)
+    p.add_argument("--plots", help="eager renders the plots, lazy leaves them to --render_pending, skip never plots", choices=('eager', 'lazy', 'skip'), default='eager', type=str)
+    p.add_argument("--jobs", help="number of worker processes (0 for all cores)", default=1, type=int)
+    p.add_argument("--render_pending", help="only render the plots left pending by --plots lazy", action='store_true')
+    p.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
+    p.set_defaults(function=cmd_residues)
+
+    p = sub.add_parser('access', help="write the chain files and accessibility tables")
+    p.add_argument("pdb_file", help="the pdb or mmCIF file", type=str)
+    p.add_argument("csv_file", help="the InteractionSheet csv file", type=str)
+    p.add_argument("naccess_path", help="the full path to the naccess bin (not needed with --backend shrake)", type=str, nargs='?')
+    p.add_argument("--jobs", help="number of parallel accessibility processes (0 for all cores)", default=1, type=int)
+    p.add_argument("--backend", help="accessibility backend", choices=('naccess', 'shrake'), default='naccess', type=str)
+    p.add_argument("--n_points", help="sphere point density of the shrake backend", default=100, type=int)
+    p.add_argument("--keep_duplicates", help="compute every copy of a chain instead of copying the tables of the first one", action='store_true')
+    p.add_argument("--results", help="the directory the chain files and tables are written in", default='Results/', type=str)
+    p.set_defaults(function=cmd_access)
+
+    p = sub.add_parser('summarize', help="write the major interaction type of every pair of chains")
+    p.add_argument("csv_file", help="the InteractionSheet csv file", type=str)
+    p.add_argument("--out", help="the output csv file", default='MajorInteractionType.csv', type=str)
+    p.set_defaults(function=cmd_summarize)
+
+    p = sub.add_parser('graph', help="draw the residue graph of every pair of chains")
+    p.add_argument("csv_file", help="the InteractionSheet csv file", type=str)
+    p.add_argument("--keep_duplicates", help="draw every copy of a pair of chains", action='store_true')
+    p.set_defaults(function=cmd_graph)
+
+    p = sub.add_parser('contacts', help="find the bonds locally and check the bonds of PISA")
+    p.add_argument("structure", help="the pdb or mmCIF file", type=str)
+    p.add_argument("--out", help="the output directory", default='Results/', type=str)
+    p.add_argument("--compare", help="the InteractionSheet of PISA to check", default=None, type=str)
+    p.set_defaults(function=cmd_contacts)
+
+    return parser
+
+
+if __name__ == '__main__':
+
+    ARGS = make_parser().parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s',
+                        handlers=[logging.StreamHandler(sys.stdout)])
+
+    if ARGS.profile is None:
+        ARGS.function(ARGS)
+    else:
+        import time
+        import Run_Profiler as rp
+        PROFILE = os.path.join(ARGS.profile, 'run-'+time.strftime('%Y%m%d-%H%M%S')+'-'+str(os.getpid()))
+        with rp.profiled(ARGS.command, PROFILE):
+            ARGS.function(ARGS)
+        print("Profile written in "+rp.write_report(PROFILE))
@@ -0,0 +1,249 @@
+#!/usr/bin/python3
+"""
+Code giving an in-memory python API to PisaPy : one call processes the PISA
+xml files (and the structure) of a complex and returns its tables as pandas
+DataFrames, writing files is optional.
+
+  How to use
+  ----------
+    import Pisa_Api
+
+    result = Pisa_Api.process_structure('Results/6ta5.pdb_PDBePISA_xml_files/',
+                                        structure='Results/6ta5.pdb/6ta5.pdb')
+    result.bonds            # the InteractionSheet rows
+    result.interfaces       # the InterfaceTable rows
+    result.residues         # the ResidueTable rows of every residue<i>.xml
+    result.fingerprints     # the fingerprint of every interface
+    result.accessibility    # chain -> solo and complex accessibility
+    result.major_interaction_types()
+    result.save('Results/')
+
+The accessibility is computed in process with the Shrake-Rupley backend and
+without chain files. With backend='naccess' the chain files are written in
+Results/ (the binary reads files) but the tables are still returned in memory.
+The copies of an interface (see Interface_Fingerprint.py) are computed once :
+their chains get the accessibility of the first copy, with the chain names of
+the copy (dedupe=False computes them). The residue<i>.xml files on disk are
+always read, a copy whose file was not downloaded gets the residues of the
+first copy.
+
+It can also be run on a folder of xml files to save every table :
+
+    python Pisa_Api.py Results/6ta5.pdb_PDBePISA_xml_files/ --structure 6ta5.pdb --out Results/
+
+"""
+
+import argparse
+import os
+import re
+import pandas as pd
+import Auto_Naccess as an
+import Chain_Roles as cr
+import Interface_Fingerprint as ifp
+import Parse_Interfacetable as pi
+import Pdb_Structure as ps
+import Pisa_xml_parser as pxp
+import Residue_xml_parser as rxp
+import Xml_Archive as xa
+
+
+class PisaResult:
+    """
+    The tables of one processed structure.
+
+    Attributes
+    ----------
+    name : string
+        the structure name, prefix of the saved files
+    interfaces : pandas DataFrame
+        one row per interface (Parse_Interfacetable.parse_interface())
+    bonds : pandas DataFrame
+        one row per hydrogen bond or salt bridge (Pisa_xml_parser.create_df())
+    residues : pandas DataFrame
+        one row per interface residue, with its INTERFACE number
+    accessibility : dictionary
+        chain -> pandas DataFrame, empty when no structure was given
+    fingerprints : pandas DataFrame
+        one row per interface (Interface_Fingerprint.fingerprint_table())
+    """
+
+    def __init__(self, name, interfaces, bonds, residues, accessibility, fingerprints=None):
+        self.name = name
+        self.interfaces = interfaces
+        self.bonds = bonds
+        self.residues = residues
+        self.accessibility = accessibility
+        self.fingerprints = fingerprints if fingerprints is not None else pd.DataFrame()
+
+    def interacting_chains(self):
+        """
+        The partner residues of every interacting chain, see
+        Auto_Naccess.interacting_chains().
+        """
+        return an.interacting_chains(self.bonds)
+
+    def major_interaction_types(self):
+        """
+        The major interaction type of every pair of chains, see
+        Interaction_Type.py.
+
+        Returns
+        -------
+        pandas DataFrame
+        """
+        import Interaction_Type as it
+
+        return pd.DataFrame.from_dict(it.inter_type_prct(it.dict_inter_type(it.get_chains(self.bonds), self.bonds)))
+
+    def save(self, out_dir='Results/'):
+        """
+        The function to write the tables in <out_dir>/<name>/ with the names
+        used by the pipeline.
+
+        Returns
+        -------
+        string
+            the output folder
+        """
+        folder = os.path.join(out_dir, self.name)
+        os.makedirs(folder, exist_ok=True)
+        self.bonds.to_csv(os.path.join(folder, self.name+'_InteractionSheet.csv'))
+        self.interfaces.to_csv(os.path.join(folder, self.name+'_InterfaceTable.csv'))
+        self.residues.to_csv(os.path.join(folder, self.name+'_ResidueTable.csv'))
+        self.fingerprints.to_csv(os.path.join(folder, self.name+'_FingerprintTable.csv'))
+        for k, df in self.accessibility.items():
+            os.makedirs(os.path.join(folder, 'chain_'+k), exist_ok=True)
+            df.to_csv(os.path.join(folder, 'chain_'+k, k+'_access.csv'))
+        return folder
+
+
+def read_residues(xml_dir, same=None):
+    """
+    The function to parse every residue<i>.xml file of a folder.
+
+    Parameters
+    ----------
+    xml_dir : string
+        the folder of the xml files
+    same : dictionary
+        interface number -> (representative number, chain map) given by
+        Interface_Fingerprint.interface_duplicates(), a copy without
+        residue<i>.xml gets the residues of its representative with the
+        chains of the copy
+
+    Returns
+    -------
+    pandas DataFrame
+    """
+    same = same or {}
+    parsed = {}
+    for xml_file in xa.list_xml(xml_dir, 'residue*.xml'):
+        number = re.findall(r'\d+', os.path.basename(xml_file))
+        number = int(number[0]) if number else 0
+        parsed[number] = rxp.xmlresidue_parser(xml_file).assign(INTERFACE=number)
+
+    tables = list(parsed.values())
+    #residue<i>.xml is the interface i + 1
+    for copy, (rep, chains) in same.items():
+        if copy - 1 not in parsed and rep - 1 in parsed:
+            df = parsed[rep - 1].assign(INTERFACE=copy - 1)
+            tables.append(df.assign(CHAIN=df['CHAIN'].map(lambda c: chains.get(c, c))))
+
+    if not tables:
+        return pd.DataFrame()
+    return pd.concat(tables, ignore_index=True).sort_values(['INTERFACE', 'CHAIN', 'RESIDUE'], ignore_index=True)
+
+
+def process_structure(xml_dir, structure=None, name=None, backend='shrake', naccess_path=None,
+                      n_points=100, chains=None, dedupe=True, results='Results/'):
+    """
+    The function to process the PISA results of one structure in memory.
+
+    Parameters
+    ----------
+    xml_dir : string
+        the folder of the xml files (interfacetable.xml, ...)
+    structure : string or numpy structured array
+        the pdb or mmCIF file, or atoms given by Pdb_Structure.load_structure(),
+        the accessibility is skipped when not given
+    name : string
+        the structure name, taken from xml_dir when not given
+    backend : string
+        'shrake' computes the accessibility in memory, 'naccess' runs the binary
+        on chain files written in <results>/<name>/
+    naccess_path : string
+        the full path to the naccess bin
+    n_points : int
+        sphere point density of the shrake backend
+    chains : dictionary
+        protein -> chains naming the proteins of the bonds (see
+        Chain_Roles.py), Pisa_xml_parser.DICT_CHAINS when
+        not given
+    dedupe : boolean
+        compute the copies of an interface once (see Interface_Fingerprint.py)
+    results : string
+        the directory of the chain files of the naccess backend
+
+    Returns
+    -------
+    PisaResult
+    """
+    xml_dir = os.path.abspath(xml_dir)
+    table = os.path.join(xml_dir, 'interfacetable.xml')
+    if name is None:
+        name = os.path.basename(xml_dir).replace('_PDBePISA_xml_files', '')
+
+    records = pxp.interfacetable_parse(table)
+    bonds = pxp.create_df(records, chains)
+    interfaces = pd.DataFrame.from_dict(pi.parse_interface(table))
+    residues = read_residues(xml_dir, ifp.interface_duplicates(records) if dedupe else None)
+
+    accessibility = {}
+    if structure is not None and not bonds.empty:
+        dico = an.interacting_chains(bonds)
+        same = an.chain_duplicates(bonds) if dedupe else None
+        if backend == 'shrake':
+            atoms = ps.load_structure(structure) if isinstance(structure, str) else structure
+            accessibility = an.chains_access(atoms, dico, n_points=n_points, same=same)
+        else:
+            if not isinstance(structure, str):
+                raise ValueError("The naccess backend needs the structure file")
+            atoms = ps.load_structure(structure)
+            an.pdb_solo_chains(name, atoms, results=results)
+            an.pdb_complex_chains(name, dico, atoms, results=results)
+            accessibility = an.call_naccess(dico, naccess_path, name, backend='naccess', same=same, results=results)
+
+    return PisaResult(name, interfaces, bonds, residues, accessibility, ifp.fingerprint_table(records))
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("xml_dir", help="the folder of the PISA xml files", type=str)
+
+    PARSER.add_argument("--structure", help="the pdb or mmCIF file, needed for the accessibility", default=None, type=str)
+
+    PARSER.add_argument("--backend", help="accessibility backend", choices=an.BACKENDS, default='shrake', type=str)
+
+    PARSER.add_argument("--naccess_path", help="the full path to the naccess bin", default=None, type=str)
+
+    PARSER.add_argument("--n_points", help="sphere point density of the shrake backend", default=100, type=int)
+
+    PARSER.add_argument("--chain_map", help="the <id>_chains.json map written by Download_pdbfasta.py", default=None, type=str)
+
+    PARSER.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
+
+    PARSER.add_argument("--keep_duplicates", help="compute every copy of an interface", action='store_true')
+
+    PARSER.add_argument("--out", help="the output directory", default='Results/', type=str)
+
+    ARGS = PARSER.parse_args()
+
+    RESULT = process_structure(ARGS.xml_dir, ARGS.structure, backend=ARGS.backend,
+                               naccess_path=ARGS.naccess_path, n_points=ARGS.n_points,
+                               chains=pxp.load_chain_map(ARGS.chain_map) if ARGS.chain_map else
+                               cr.roles_for_file(os.path.join(ARGS.xml_dir, 'interfacetable.xml'), ARGS.roles),
+                               dedupe=not ARGS.keep_duplicates, results=ARGS.out)
+
+    print("Saved in "+RESULT.save(ARGS.out))
@@ -0,0 +1,134 @@
+#!/usr/bin/python3
+"""
+Code naming the xml files PISA gives for each interface and the download
+profiles choosing which of them a run fetches, with the inputs of every
+parser.
+
+  How to use
+  ----------
+The profile is given to the scripts submitting to PISA :
+
+    python PisaAuto_file.py path_to_pdb_files_folder/ --download_profile bonds
+    python RunPisaPy.py "6ta5 6iol" --backend shrake --download_profile bonds residues
+
+    bonds      hydrogenbond<i>.xml and saltbridge<i>.xml (InteractionSheet,
+               accessibility, the interface areas come from interfacetable.xml)
+    residues   residue<i>.xml (ResidueTable and residue plots)
+    summary    interfacesummary<i>.xml (InterfaceSurface of the InterfaceTable)
+    all        every xml file of the interface pages (default)
+
+interfacetable.xml is always downloaded. The profile is written in
+download_profile.json in the xml folder, the parsers read it with
+missing_inputs() to tell which of their inputs were not downloaded. Folders
+without it were fully downloaded.
+
+"""
+
+import json
+import logging
+import os
+import re
+from Xml_Archive import open_xml
+
+#xml files of an interface page, <kind><interface number - 1>.xml
+ARTIFACTS = ('hydrogenbond', 'saltbridge', 'interfacesummary', 'residue')
+
+#profile -> artifacts downloaded, None for every xml file of the page
+PROFILES = {'bonds': ('hydrogenbond', 'saltbridge'),
+            'residues': ('residue',),
+            'summary': ('interfacesummary',),
+            'all': None}
+
+#parser -> artifacts it reads besides interfacetable.xml
+PARSER_INPUTS = {'Pisa_xml_parser': ('hydrogenbond', 'saltbridge'),
+                 'Parse_Interfacetable': ('hydrogenbond', 'saltbridge', 'interfacesummary'),
+                 'Residue_xml_parser': ('residue',)}
+
+MANIFEST = 'download_profile.json'
+
+
+def profile_artifacts(profiles):
+    """
+    The function to get the artifacts of one or several profiles.
+
+    Parameters
+    ----------
+    profiles : string or list of strings
+        names of PROFILES
+
+    Returns
+    -------
+    set or None
+        the artifacts, None when every xml file is downloaded
+    """
+    if isinstance(profiles, str):
+        profiles = [profiles]
+    artifacts = set()
+    for profile in profiles:
+        if PROFILES[profile] is None:
+            return None
+        artifacts.update(PROFILES[profile])
+    return artifacts
+
+
+def artifact_kind(file_name):
+    """
+    The function to get the artifact of an xml file name,
+    e.g. 'hydrogenbond3.xml' -> 'hydrogenbond'.
+
+    Returns
+    -------
+    string or None
+    """
+    match = re.match(r'([a-z]+?)\d*\.xml$', os.path.basename(file_name))
+    return match.group(1) if match else None
+
+
+def write_manifest(xml_dir, profiles):
+    """
+    The function to record the profiles downloaded in an xml folder.
+    """
+    if isinstance(profiles, str):
+        profiles = [profiles]
+    artifacts = profile_artifacts(profiles)
+    with open(os.path.join(xml_dir, MANIFEST), 'w') as f:
+        json.dump({'profiles': list(profiles),
+                   'artifacts': sorted(artifacts) if artifacts is not None else list(ARTIFACTS)}, f)
+
+
+def provided(xml_dir):
+    """
+    The function to get the artifacts downloaded in an xml folder.
+
+    Returns
+    -------
+    set
+    """
+    try:
+        with open_xml(os.path.join(xml_dir, MANIFEST)) as f:
+            return set(json.load(f)['artifacts'])
+    except FileNotFoundError:
+        return set(ARTIFACTS)
+
+
+def missing_inputs(xml_dir, parser):
+    """
+    The function to list the inputs of a parser the download profile of an
+    xml folder did not fetch, a warning is logged when some are missing.
+
+    Parameters
+    ----------
+    xml_dir : string
+        the xml folder
+    parser : string
+        a key of PARSER_INPUTS
+
+    Returns
+    -------
+    set
+    """
+    missing = set(PARSER_INPUTS[parser]) - provided(xml_dir)
+    if missing:
+        logging.warning("%s: %s not downloaded in %s (download profile)"
+                        % (parser, ', '.join(sorted(missing)), xml_dir))
+    return missing
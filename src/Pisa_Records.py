@@ -0,0 +1,132 @@
+#!/usr/bin/python3
+"""
+Code for the records the xml parsers fill : the bonds of an interface are kept
+as contiguous NumPy columns (Bonds) and every interface is a slotted Interface
+record, instead of nested positional lists.
+
+  How to use
+  ----------
+The records are returned by Pisa_xml_parser.xmlbond_parser() and
+Pisa_xml_parser.interfacetable_parse() and read by Pisa_xml_parser.create_df() :
+
+    interfaces = interfacetable_parse('interfacetable.xml')
+    interfaces[0].number, interfaces[0].area, len(interfaces[0].hbonds)
+    interfaces[0].fingerprint
+    interfaces[0].hbonds.distance        # numpy array
+    for bond in interfaces[0].saltbridges:
+        bond.chain1, bond.res1, bond.distance, bond.chain2, bond.res2
+
+"""
+
+import numpy as np
+
+#interaction types of the bonds, in the order create_df() writes them
+BOND_TYPES = ('Hydrogen bond', 'Salt bridge')
+
+
+class Bond:
+    """
+    One bond, a view on a row of Bonds.
+    """
+
+    __slots__ = ('chain1', 'res1', 'distance', 'chain2', 'res2')
+
+    def __init__(self, chain1, res1, distance, chain2, res2):
+        self.chain1 = chain1
+        self.res1 = res1
+        self.distance = distance
+        self.chain2 = chain2
+        self.res2 = res2
+
+    def __repr__(self):
+        return 'Bond(%s:%s - %s:%s, %.2f)' % (self.chain1, self.res1, self.chain2, self.res2, self.distance)
+
+
+class Bonds:
+    """
+    The bonds of one kind of one interface, one NumPy array per field.
+
+    Attributes
+    ----------
+    chain1, res1, chain2, res2 : numpy arrays of strings
+        e.g. 'A' and 'ASN  37[ ND2]'
+    distance : numpy array of floats
+    """
+
+    __slots__ = ('chain1', 'res1', 'distance', 'chain2', 'res2')
+
+    def __init__(self, chain1=(), res1=(), distance=(), chain2=(), res2=()):
+        self.chain1 = np.asarray(chain1, dtype='U')
+        self.res1 = np.asarray(res1, dtype='U')
+        self.distance = np.asarray(distance, dtype=np.float64)
+        self.chain2 = np.asarray(chain2, dtype='U')
+        self.res2 = np.asarray(res2, dtype='U')
+
+    def __len__(self):
+        return len(self.distance)
+
+    def __getitem__(self, i):
+        return Bond(str(self.chain1[i]), str(self.res1[i]), float(self.distance[i]),
+                    str(self.chain2[i]), str(self.res2[i]))
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+    def __repr__(self):
+        return 'Bonds(%d)' % len(self)
+
+
+class Interface:
+    """
+    One interface of the interface table.
+
+    Attributes
+    ----------
+    number : int
+        the INTERFACENO, bond files are numbered number - 1
+    hbonds : Bonds
+        the hydrogen bonds
+    saltbridges : Bonds
+        the salt bridges
+    area : float
+        the INTERFACEAREA, written in the 'ΔiG kcal/mol' column of create_df()
+    pvalue : float
+        the INTERFACEDELTAGPVALUE
+    fingerprint : string
+        the hash of the bonds and interface residues without the chain
+        labels, None without bonds
+        (see Interface_Fingerprint.py)
+    swapped : boolean
+        orientation of the fingerprint, None for a symmetric interface
+    chains : tuple
+        (chain1, chain2) of the bonds, None without bonds
+    """
+
+    __slots__ = ('number', 'hbonds', 'saltbridges', 'area', 'pvalue', 'fingerprint', 'swapped', 'chains')
+
+    def __init__(self, number, hbonds=None, saltbridges=None, area=np.nan, pvalue=np.nan):
+        self.number = number
+        self.hbonds = hbonds if hbonds is not None else Bonds()
+        self.saltbridges = saltbridges if saltbridges is not None else Bonds()
+        self.area = area
+        self.pvalue = pvalue
+        self.fingerprint = None
+        self.swapped = None
+        self.chains = None
+
+    def bonds(self):
+        """
+        The bonds of every kind.
+
+        Returns
+        -------
+        list of tuples
+            (interaction type, Bonds) in the order of BOND_TYPES
+        """
+        return list(zip(BOND_TYPES, (self.hbonds, self.saltbridges)))
+
+    def __len__(self):
+        return len(self.hbonds) + len(self.saltbridges)
+
+    def __repr__(self):
+        return 'Interface(%d, %d hbonds, %d saltbridges)' % (self.number, len(self.hbonds), len(self.saltbridges))
@@ -14,6 +14,11 @@ Then you can run the script with the following command :
 
 Note that the hydrogen bond and slat bridge files must be on the same directory as interfacetable
 
+The fingerprints of the interfaces (see Interface_Fingerprint.py) are written in
+FingerprintTable.csv next to InteractionSheet.csv. The proteins of the chains
+are read from --roles, --chain_map or the <id>_chains.json of the structure,
+see Chain_Roles.py.
+
   Author
   ------
     Hocine Meraoun
@@ -21,14 +26,63 @@ Note that the hydrogen bond and slat bridge files must be on the same directory
 """
 
 import argparse
+import json
 import pandas as pd
 import re
 import os.path
 import logging
+import numpy as np
 from Parse_Interfacetable import find_xml_files
+from Pisa_Records import Bonds, Interface
+from Interface_Fingerprint import interface_fingerprint, interface_residues, fingerprint_table
+from Pisa_Artifacts import missing_inputs
+from Xml_Archive import open_xml, xml_exists, output_dir
+import Run_Metrics as rm
+import Chain_Roles as cr
+
+#protein -> chains of the bonds, see Chain_Roles.py for the files that replace it
+DICT_CHAINS = cr.DEFAULT_ROLES
+
+def load_chain_map(json_file, entry=None):
+    """
+    Function to load the entity -> chains map written by
+    Download_pdbfasta.parse_fasta(), in the DICT_CHAINS format.
+
+    Parameters
+    ----------
+    json_file : string
+        the <id>_chains.json file
+    entry : string
+        the pdb entry to read, the first one of the file when not given
+
+    Returns
+    -------
+    dictionary
+        entity name -> list of chains
+    """
+    with open(json_file, 'r') as f:
+        chain_map = json.load(f)
+
+    return cr.entity_roles(chain_map, entry)
+
+def split_structure(line):
+    """
+    Function to split a <STRUCTURE1>/<STRUCTURE2> line in chain and residue,
+    chains can be several characters long (mmCIF inputs).
+
+    Parameters
+    ----------
+    line : string
+        e.g. '<STRUCTURE1>A:ASN  37[ ND2]</STRUCTURE1>'
+
+    Returns
+    -------
+    list
+        [chain, residue] e.g. ['A', 'ASN  37[ ND2]']
+    """
+    chain, res = line.split('>', 1)[1].split('</', 1)[0].split(':', 1)
 
-#this dict works generally assigns chain A as binder and chain B as target
-DICT_CHAINS = {'Binder': 'A', 'Target': 'B'}
+    return [chain.strip(), res.rstrip()[:13]]
 
 def xmlbond_parser(xml_file):
     """
@@ -42,30 +96,30 @@ def xmlbond_parser(xml_file):
 
     Returns
     -------
-    list
+    Pisa_Records.Bonds
     """
-    value = []
-    lst = []
+    chain1, res1, distance, chain2, res2 = [], [], [], [], []
 
-    if os.path.exists(xml_file):
-        with open(xml_file, "r") as f_xml:
+    if xml_exists(xml_file):
+        with open_xml(xml_file) as f_xml:
             for line in f_xml :
                 if line.startswith("<STRUCTURE1>"):
-                    value.append(line[12:13])
-                    value.append(line[14:27])
+                    chain, res = split_structure(line)
                 elif line.startswith("<DISTANCE>"):
-                    value.append(float(re.split('<|>',line[10:17])[0]))
+                    dist = float(re.split('<|>',line[10:17])[0])
                 elif line.startswith("<STRUCTURE2>"):
-                    value.append(line[13:14])
-                    value.append(line[15:28])
-                    lst.append(value)
-                    value = []
+                    chain1.append(chain)
+                    res1.append(res)
+                    distance.append(dist)
+                    chain, res = split_structure(line)
+                    chain2.append(chain)
+                    res2.append(res)
     else:
-        logging.info("No ",xml_file, "found")
+        logging.info("No "+xml_file+" found")
 
-    return(lst)
+    return Bonds(chain1, res1, distance, chain2, res2)
 
-def give_prot(search_chain):
+def give_prot(search_chain, chains=None):
     """
     Function to get the protein with the chain.
 
@@ -73,19 +127,22 @@ def give_prot(search_chain):
     ----------
     search_chain : string
         the name of the chain
+    chains : dictionary
+        protein -> chains, DICT_CHAINS when not given
 
     Returns
     -------
     string
     """
-    for protein in DICT_CHAINS.keys():
-        for chain in DICT_CHAINS[protein]:
-            if chain == search_chain:
-                return(protein)
+    chains = DICT_CHAINS if chains is None else chains
+    protein = cr.chain_roles(chains).get(search_chain)
+    if protein is None:
+        logging.info("The chain corresponds to none of the proteins")
+        return('')
 
-    logging.info("The chain corresponds to none of the proteins")
-    return('')
+    return(protein)
 
+@rm.timed('parse.interfacetable')
 def interfacetable_parse(xml_file):
     """
     Function to parse interfacetable.xml and calls xmlbond_parser().
@@ -97,88 +154,88 @@ def interfacetable_parse(xml_file):
 
     Returns
     -------
-    list
+    list of Pisa_Records.Interface
     """
     lst = []
-    intern_lst = []
 
     path = '/'.join(xml_file.split('/')[:-1])+'/'
+    missing_inputs(path, 'Pisa_xml_parser')
 
-    with open(xml_file, "r") as f_xml:
+    with open_xml(xml_file) as f_xml:
         for line in f_xml :
             if line.startswith("<INTERFACENO>"):
-                i = int(line[13:15].strip("<"))
-                intern_lst.append(i)
-                intern_lst.append(xmlbond_parser(path+"hydrogenbond"+str(i-1)+".xml"))
-                intern_lst.append(xmlbond_parser(path+"saltbridge"+str(i-1)+".xml"))
+                i = int(line.split('>')[1].split('<')[0])
+                interface = Interface(i, xmlbond_parser(path+"hydrogenbond"+str(i-1)+".xml"),
+                                      xmlbond_parser(path+"saltbridge"+str(i-1)+".xml"))
             elif line.startswith("<INTERFACEAREA>"):
-                intern_lst.append(float(line.split('>')[1].split('<')[0]))
+                interface.area = float(line.split('>')[1].split('<')[0])
             elif line.startswith("<INTERFACEDELTAGPVALUE>"):
-                intern_lst.append(float(line.split('>')[1].split('<')[0]))
-                lst.append(intern_lst)
-                intern_lst = []
+                interface.pvalue = float(line.split('>')[1].split('<')[0])
+                interface.fingerprint, interface.swapped, interface.chains = interface_fingerprint(
+                    interface, interface_residues(path+"residue"+str(i-1)+".xml"))
+                lst.append(interface)
 
     return(lst)
 
-def create_df(lst):
+@rm.timed('parse.interactions')
+def create_df(lst, chains=None):
     """
-    Function that creates the dataframe to save in a csv file.
+    Function that creates the dataframe to save in a csv file, the bond
+    columns of the interfaces are concatenated instead of appended row by row.
 
     Parameters
     ----------
     lst : list
-        list of lists given by interfacetable_parse()
+        the Pisa_Records.Interface records given by interfacetable_parse()
+    chains : dictionary
+        protein -> chains (Chain_Roles.py), DICT_CHAINS when not given
 
     Returns
     -------
     pandas DataFrame
     """
-    data = {'protein1': [], 'chain1': [], 'res1': [], 
-    'distance': [], 'protein2': [], 'chain2': [], 
-    'res2': [], 'interaction type': [], 'ΔiG kcal/mol': [], 
-    'ΔiG P-value': []}
-
-    for c in lst:
-        for i in c[1]:
-            data['protein1'].append(give_prot(i[0]))
-            data['chain1'].append(i[0])
-            data['res1'].append(i[1])
-            data['distance'].append(i[2])
-            data['protein2'].append(give_prot(i[3]))
-            data['chain2'].append(i[3])
-            data['res2'].append(i[4])
-            data['interaction type'].append("Hydrogen bond")
-            data['ΔiG kcal/mol'].append(c[3])
-            data['ΔiG P-value'].append(c[4])
-        if c[2] != []:
-            for j in c[2]:
-                data['protein1'].append(give_prot(j[0]))
-                data['chain1'].append(j[0])
-                data['res1'].append(j[1])
-                data['distance'].append(j[2])
-                data['protein2'].append(give_prot(j[3]))
-                data['chain2'].append(j[3])
-                data['res2'].append(j[4])
-                data['interaction type'].append("Salt bridge")
-                data['ΔiG kcal/mol'].append(c[3])
-                data['ΔiG P-value'].append(c[4])
+    parts = [(kind, bonds, interface) for interface in lst for kind, bonds in interface.bonds()]
+    columns = {}
+    for field in ('chain1', 'res1', 'distance', 'chain2', 'res2'):
+        columns[field] = np.concatenate([getattr(bonds, field) for kind, bonds, interface in parts]
+                                        or [getattr(Bonds(), field)])
+    sizes = [len(bonds) for kind, bonds, interface in parts]
+
+    chains = DICT_CHAINS if chains is None else chains
+
+    data = {'protein1': cr.assign_roles(columns['chain1'], chains), 'chain1': columns['chain1'].astype(object),
+            'res1': columns['res1'].astype(object), 'distance': columns['distance'],
+            'protein2': cr.assign_roles(columns['chain2'], chains), 'chain2': columns['chain2'].astype(object),
+            'res2': columns['res2'].astype(object),
+            'interaction type': np.repeat([kind for kind, bonds, interface in parts], sizes).astype(object),
+            'ΔiG kcal/mol': np.repeat([interface.area for kind, bonds, interface in parts], sizes).astype(np.float64),
+            'ΔiG P-value': np.repeat([interface.pvalue for kind, bonds, interface in parts], sizes).astype(np.float64)}
 
     return(pd.DataFrame.from_dict(data))
 
-
 if __name__ == '__main__':
 
     PARSER = argparse.ArgumentParser()
 
     PARSER.add_argument("root_dir", help="the root directory to search for interfacetable.xml files", type=str)
 
+    PARSER.add_argument("--chain_map", help="the <id>_chains.json map written by Download_pdbfasta.py, its entities replace Binder/Target", default=None, type=str)
+
+    PARSER.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
+
     ARGS = PARSER.parse_args()
 
     ROOT_DIR = ARGS.root_dir
 
+    if ARGS.chain_map:
+        DICT_CHAINS = load_chain_map(ARGS.chain_map)
+
     xml_files = find_xml_files(ROOT_DIR)
 
     for xml_file in xml_files:
-        df = create_df(interfacetable_parse(xml_file))
-        output_file = os.path.join(os.path.dirname(xml_file), "InteractionSheet.csv")
-        df.to_csv(output_file)
\ No newline at end of file
+        interfaces = interfacetable_parse(xml_file)
+        roles = cr.roles_for_file(xml_file, ARGS.roles) if ARGS.roles or not ARGS.chain_map else None
+        df = create_df(interfaces, roles)
+        output_file = os.path.join(output_dir(xml_file), "InteractionSheet.csv")
+        df.to_csv(output_file)
+        fingerprint_table(interfaces).to_csv(os.path.join(output_dir(xml_file), "FingerprintTable.csv"))
\ No newline at end of file
@@ -0,0 +1,212 @@
+#!/usr/bin/python3
+"""
+Code to pace the submissions to the PDBePISA server : a token bucket limits
+the submission rate and an adaptive limit caps the jobs in flight, both are
+lowered when jobs slow down or fail and raised again while they are fast.
+
+  How to use
+  ----------
+Every PISA job (browser start, submission, waiting and downloads) runs inside
+a slot of the shared limiter, as Pipeline_Dag.py, PisaPy.py submit and
+PisaAuto_file.py do :
+
+    import Rate_Limiter as rl
+
+    rl.configure(rate=0.2, max_concurrency=4)
+    with rl.limiter().slot('6ta5'):
+        ...
+
+A job is slow when it takes more than slow_factor times the smoothed latency
+of the jobs before it (exponential moving average, weight smoothing). The
+latency follows the size of the structures, a batch going from small to large
+structures is not taken for a slowdown, a sudden jump is.
+A slow job multiplies the limit and the rate by 0.75 and a failed job halves
+them. A fast job adds 1/limit to the limit (one more job after a full round of
+fast jobs) and 10% to the rate. The limiter state (concurrency limit, jobs in
+flight, queue depth, rate, latency) is returned by stats(), logged on every
+change and recorded as Run_Metrics gauges.
+
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+import Run_Metrics as rm
+
+
+def record(stats):
+    """
+    The function to record the limiter state as Run_Metrics gauges.
+    """
+    for name in ('concurrency', 'in_flight', 'queue', 'rate'):
+        rm.gauge('pisa_'+name, stats[name])
+
+
+class AdaptiveLimiter:
+    """
+    Token bucket and AIMD concurrency limit.
+
+    Parameters
+    ----------
+    rate : float
+        submissions per second at start
+    burst : int
+        submissions allowed at once when the bucket is full
+    concurrency : float
+        jobs in flight at start
+    min_concurrency, max_concurrency : int
+        bounds of the jobs in flight
+    min_rate, max_rate : float
+        bounds of the submission rate
+    slow_factor : float
+        a job slower than slow_factor times the smoothed latency is a slowdown
+    smoothing : float
+        weight of the last job in the smoothed latency
+    """
+
+    def __init__(self, rate=0.2, burst=2, concurrency=1, min_concurrency=1, max_concurrency=2,
+                 min_rate=0.01, max_rate=1.0, slow_factor=2.0, smoothing=0.3):
+        self.rate = rate
+        self.burst = burst
+        self.limit = float(concurrency)
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.slow_factor = slow_factor
+        self.smoothing = smoothing
+        self.tokens = float(burst)
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency = None
+        self.jobs = 0
+        self.errors = 0
+        self._stamp = time.monotonic()
+        self._cond = threading.Condition()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+
+    def acquire(self):
+        """
+        The function blocking until a token and a job slot are free.
+        """
+        with self._cond:
+            self.waiting += 1
+            try:
+                while True:
+                    self._refill()
+                    if self.tokens >= 1 and self.in_flight < max(int(self.limit), self.min_concurrency):
+                        self.tokens -= 1
+                        self.in_flight += 1
+                        break
+                    wait = (1 - self.tokens) / self.rate if self.tokens < 1 else None
+                    self._cond.wait(wait)
+            finally:
+                self.waiting -= 1
+        record(self.stats())
+
+    def release(self, seconds, error=False):
+        """
+        The function freeing a job slot and adapting the limit and the rate
+        to the job outcome.
+
+        Parameters
+        ----------
+        seconds : float
+            the job latency
+        error : boolean
+            True when the job failed
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self.jobs += 1
+            if error:
+                self.errors += 1
+                self._scale(0.5)
+                outcome = 'error'
+            elif self.latency is not None and seconds > self.slow_factor * self.latency:
+                self._scale(0.75)
+                outcome = 'slow'
+            else:
+                self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+                self.rate = min(self.max_rate, self.rate * 1.1)
+                outcome = 'fast'
+            if not error:
+                #failed jobs often end early, they would pull the latency down
+                self.latency = (seconds if self.latency is None else
+                                (1 - self.smoothing) * self.latency + self.smoothing * seconds)
+            stats = self._stats()
+            self._cond.notify_all()
+
+        logging.info("PISA job %s in %.1f s, concurrency %d, rate %.3f/s, queue %d"
+                     % (outcome, seconds, stats['concurrency'], stats['rate'], stats['queue']))
+        record(stats)
+
+    def _scale(self, factor):
+        self.limit = max(self.min_concurrency, self.limit * factor)
+        self.rate = max(self.min_rate, self.rate * factor)
+
+    def _stats(self):
+        return {'concurrency': max(int(self.limit), self.min_concurrency), 'in_flight': self.in_flight,
+                'queue': self.waiting, 'rate': round(self.rate, 4), 'tokens': round(self.tokens, 2),
+                'latency': self.latency, 'jobs': self.jobs,
+                'error_rate': self.errors / self.jobs if self.jobs else 0.0}
+
+    def stats(self):
+        """
+        The current state of the limiter.
+
+        Returns
+        -------
+        dictionary
+            concurrency limit, jobs in flight, queue depth, rate, tokens,
+            smoothed latency, jobs and error rate
+        """
+        with self._cond:
+            self._refill()
+            return self._stats()
+
+    @contextmanager
+    def slot(self, name=''):
+        """
+        The context manager running one PISA job in a slot, an exception
+        counts as a failed job.
+        """
+        with rm.timer('pisa.queue', structure=name):
+            self.acquire()
+        start = time.monotonic()
+        error = True
+        try:
+            yield
+            error = False
+        finally:
+            self.release(time.monotonic() - start, error=error)
+
+
+#limiter shared by the PISA jobs of this process
+_LIMITER = AdaptiveLimiter()
+
+
+def limiter():
+    """
+    The function to get the limiter shared by this process.
+    """
+    return _LIMITER
+
+
+def configure(**options):
+    """
+    The function to replace the shared limiter, see AdaptiveLimiter for the
+    options.
+
+    Returns
+    -------
+    AdaptiveLimiter
+    """
+    global _LIMITER
+    _LIMITER = AdaptiveLimiter(**options)
+    return _LIMITER
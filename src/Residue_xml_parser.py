@@ -11,6 +11,20 @@ Then you can run the script with the following command :
 
     python Residue_xml_parser.py path/to/pisa_results/
 
+Plots are rendered off screen, --jobs spreads the files over worker processes,
+--plots lazy writes the tables and marks their plots as pending
+(ResiduePlot.pending), --render_pending renders the pending plots later and
+--plots skip only writes the tables :
+
+    python Residue_xml_parser.py path/to/pisa_results/ --jobs 8 --plots lazy
+    python Residue_xml_parser.py path/to/pisa_results/ --render_pending
+
+The parts of the plots are labelled with the roles of the chains, read from
+--roles or the <id>_chains.json of the structure (Binder and Target for the
+chains A and B otherwise, see Chain_Roles.py) :
+
+    python Residue_xml_parser.py path/to/pisa_results/ --roles campaign_roles.json
+
 
 
 """
@@ -18,15 +32,32 @@ Then you can run the script with the following command :
 import os
 import xml.etree.ElementTree as ET
 import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-from sklearn.preprocessing import StandardScaler
 import argparse
-from src.Parse_Interfacetable import find_xml_files
+from concurrent.futures import ProcessPoolExecutor
+from Parse_Interfacetable import find_xml_files
+from Xml_Archive import open_xml, output_dir
+import Run_Metrics as rm
+import Chain_Roles as cr
+
+PROPERTIES = ['SOLVENTACCESSIBLEAREA', 'BURIEDSURFACEAREA', 'BURIEDSURFACEAREASCORE', 'SOLVATIONENERGY']
+
+TITLES = {
+    'SOLVENTACCESSIBLEAREA': 'Solvent Accessible Area',
+    'BURIEDSURFACEAREA': 'Buried Surface Area',
+    'BURIEDSURFACEAREASCORE': 'Buried Surface Area Score',
+    'SOLVATIONENERGY': 'Solvation Energy'
+}
+
+#plots modes of render_residue_plots()
+PLOT_MODES = ('eager', 'lazy', 'skip')
+
+#marker of a plot left to render_pending()
+PENDING_FILE = "ResiduePlot.pending"
 
 def xmlresidue_parser(xml_file):
     # Parse the XML file
-    tree = ET.parse(xml_file)
+    with open_xml(xml_file) as f_xml:
+        tree = ET.parse(f_xml)
     root = tree.getroot()
     # List to store residue data
     residues_data = []
@@ -52,79 +83,260 @@ def xmlresidue_parser(xml_file):
 
     # Convert to DataFrame
     df = pd.DataFrame(residues_data)
-    max_residue_a = df[df['CHAIN'] == 'A']['RESIDUE'].max()
-    df['CONTINUOUS_RESIDUE'] = df.apply(lambda row: row['RESIDUE'] if row['CHAIN'] == 'A' else row['RESIDUE'] + max_residue_a, axis=1)
+    # every chain is numbered after the last residue of the chains before it
+    maxima = df.groupby('CHAIN', sort=False)['RESIDUE'].max()
+    df['CONTINUOUS_RESIDUE'] = df['RESIDUE'] + df['CHAIN'].map(maxima.cumsum().shift(fill_value=0))
     return df
 
-def plot_residue_data(df):
+def scale_values(data):
+    """
+    Function to add the z-score of every value within its property, computed
+    with vectorized groupby transforms (same result as a StandardScaler fitted
+    per property).
+
+    Parameters
+    ----------
+    data : pandas DataFrame
+        long format table with 'Property' and 'Value' columns
+
+    Returns
+    -------
+    pandas DataFrame
+    """
+    grouped = data.groupby('Property')['Value']
+    std = grouped.transform('std', ddof=0).replace(0, 1)
+    data['ScaledValue'] = (data['Value'] - grouped.transform('mean')) / std
+    return data
+
+def plot_residue_data(df, fig=None, roles=None):
+    """
+    Function to draw the residue properties plot.
+    The plot is drawn on a matplotlib Figure that is not registered with pyplot,
+    so it needs no display and is released as soon as it is not referenced;
+    passing the same fig again clears and reuses it.
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        the table given by xmlresidue_parser()
+    fig : matplotlib Figure
+        the figure to draw on, a new one is created when not given
+    roles : dictionary
+        role -> chains labelling the parts of the plot,
+        Chain_Roles.DEFAULT_ROLES when not given
+
+    Returns
+    -------
+    matplotlib Figure
+    """
+    from matplotlib.figure import Figure
+
     data = df.melt(id_vars=['CHAIN', 'RESIDUE', 'AMINOACID', 'CONTINUOUS_RESIDUE'], 
-                   value_vars=['SOLVENTACCESSIBLEAREA', 'BURIEDSURFACEAREA', 'BURIEDSURFACEAREASCORE', 'SOLVATIONENERGY'],
-                   var_name='Property', value_name='Value')
-    
-    scaler = StandardScaler()
-    data['ScaledValue'] = data.groupby('Property')['Value'].transform(lambda x: scaler.fit_transform(x.values.reshape(-1, 1)).flatten())
-    
+                   value_vars=PROPERTIES, var_name='Property', value_name='Value')
+    data = scale_values(data)
+
     aspect_ratio = df['CONTINUOUS_RESIDUE'].max() / 100 * 3
-    g = sns.catplot(data=data, x = 'CONTINUOUS_RESIDUE', y = 'Value', hue='ScaledValue', kind='strip', col='Property', palette='viridis', 
-                    col_wrap=2, sharey=False, height=2, aspect=aspect_ratio, edgecolor='black', jitter=False)
-    
-    chain_b_start = df[df['CHAIN'] == 'B']['CONTINUOUS_RESIDUE'].min()-0.5
+    if fig is None:
+        fig = Figure()
+    else:
+        fig.clear()
+    fig.set_size_inches(2 * 2 * aspect_ratio, 2 * 2)
+    axes = fig.subplots(2, 2, squeeze=False).flat
 
-    for ax in g.axes.flat:
-        ax.set_xticks(range(0, int(df['CONTINUOUS_RESIDUE'].max()), 50))
+    segments = cr.role_segments(list(dict.fromkeys(df['CHAIN'])), roles)
+    residue_max = df['CONTINUOUS_RESIDUE'].max()
+    bounds = [0] + [df[df['CHAIN'].isin(chains)]['CONTINUOUS_RESIDUE'].min()-0.5
+                    for label, chains in segments[1:]] + [residue_max]
+
+    for ax, prop in zip(axes, PROPERTIES):
+        values = data[data['Property'] == prop]
+        ax.scatter(values['CONTINUOUS_RESIDUE'], values['Value'], c=values['ScaledValue'],
+                   cmap='viridis', edgecolors='black', linewidths=0.5, s=20)
+        ax.set_xticks(range(0, int(residue_max), 50))
         ax.set_xlabel('Amino Acid')
-        ax.axvline(chain_b_start, color='#624da0', linestyle='--')
-        ax.text(chain_b_start / 2, ax.get_ylim()[1] * 0.95, 'Binder', horizontalalignment='center', color='#624da0', fontsize=10)
-        ax.text(chain_b_start + (df['CONTINUOUS_RESIDUE'].max() - chain_b_start) / 2, ax.get_ylim()[1] * 0.95, 'Target', horizontalalignment='center', color='#624da0', fontsize=10)
-    
-    
-
-    titles = {
-        'SOLVENTACCESSIBLEAREA': 'Solvent Accessible Area',
-        'BURIEDSURFACEAREA': 'Buried Surface Area',
-        'BURIEDSURFACEAREASCORE': 'Buried Surface Area Score',
-        'SOLVATIONENERGY': 'Solvation Energy'
-    }
-    g.set_titles(col_template="{col_name}", row_template="{row_name}")
-    for ax in g.axes.flat:
-        col_name = ax.get_title().split(' = ')[-1]
-        ax.set_title(titles.get(col_name, col_name), size=14, color='#2b215f', fontweight='bold')
-
-    min_solvation_energy = df[df['CHAIN'] == 'A'].nsmallest(1, 'SOLVATIONENERGY').iloc[0]
+        ax.set_ylabel('Value')
+        ax.set_title(TITLES[prop], size=14, color='#2b215f', fontweight='bold')
+        for k, (label, chains) in enumerate(segments):
+            if k:
+                ax.axvline(bounds[k], color='#624da0', linestyle='--')
+            ax.text(bounds[k] + (bounds[k+1] - bounds[k]) / 2, ax.get_ylim()[1] * 0.95, label, horizontalalignment='center', color='#624da0', fontsize=10)
+
+    first = df[df['CHAIN'].isin(segments[0][1])]
+    min_solvation_energy = first.nsmallest(1, 'SOLVATIONENERGY').iloc[0]
     min_residue = min_solvation_energy['CONTINUOUS_RESIDUE']
     min_value = min_solvation_energy['SOLVATIONENERGY']
     min_amino_acid = min_solvation_energy['AMINOACID']
     min_residue_number = min_solvation_energy['RESIDUE']
 
-    max_solvation_energy = df[df['CHAIN'] == 'A'].nlargest(1, 'SOLVATIONENERGY').iloc[0]
+    max_solvation_energy = first.nlargest(1, 'SOLVATIONENERGY').iloc[0]
     max_residue = max_solvation_energy['CONTINUOUS_RESIDUE']
     max_value = max_solvation_energy['SOLVATIONENERGY']
     max_amino_acid = max_solvation_energy['AMINOACID']
     max_residue_number = max_solvation_energy['RESIDUE']
 
-    for ax in g.axes.flat:
-        if ax.get_title() == 'Solvation Energy':
-            ax.text(min_residue-2, min_value, f'{min_amino_acid}{min_residue_number} : ΔG = {round(min_value, 2)} kcal/M', color='#f8991d', fontsize=8, ha='right')
-            ax.text(max_residue-2, max_value, f'{max_amino_acid}{max_residue_number} : ΔG = {round(max_value, 2)} kcal/M', color='#f8991d', fontsize=8, ha='right')
-    return g
+    ax = list(fig.axes)[PROPERTIES.index('SOLVATIONENERGY')]
+    ax.text(min_residue-2, min_value, f'{min_amino_acid}{min_residue_number} : ΔG = {round(min_value, 2)} kcal/M', color='#f8991d', fontsize=8, ha='right')
+    ax.text(max_residue-2, max_value, f'{max_amino_acid}{max_residue_number} : ΔG = {round(max_value, 2)} kcal/M', color='#f8991d', fontsize=8, ha='right')
+    fig.tight_layout()
+    return fig
+
+#figure reused by every plot rendered in this process
+_FIGURE = None
+
+def save_residue_plot(df, output_file, roles=None):
+    """
+    Function to draw the residue plot on the figure of this process, save it
+    and clear the figure so memory does not grow over a batch.
+
+    Parameters
+    ----------
+    df : pandas DataFrame
+        the table given by xmlresidue_parser()
+    output_file : string
+        the pdf file
+    roles : dictionary
+        role -> chains, see plot_residue_data()
+
+    Returns
+    -------
+    Nothing
+    """
+    global _FIGURE
+    _FIGURE = plot_residue_data(df, fig=_FIGURE, roles=roles)
+    _FIGURE.savefig(output_file)
+    _FIGURE.clear()
+
+def residue_job(job):
+    """
+    Function processing one residue0.xml file: ResidueTable.csv and, with
+    plots 'eager', ResiduePlot.pdf in the same folder (with plots 'lazy' the
+    PENDING_FILE marker instead).
+
+    Parameters
+    ----------
+    job : tuple
+        (xml file, plots mode, roles), the roles are a dictionary or the
+        --roles file (see Chain_Roles.roles_for_file())
+
+    Returns
+    -------
+    string
+        the xml file
+    """
+    xml_file, plots, roles = job
+    with rm.timer('residues.parse'):
+        df = xmlresidue_parser(xml_file)
+        df.to_csv(os.path.join(output_dir(xml_file), "ResidueTable.csv"))
+    rm.count('residues', len(df))
+    pending = os.path.join(output_dir(xml_file), PENDING_FILE)
+    if plots == 'eager':
+        with rm.timer('residues.plot'):
+            save_residue_plot(df, os.path.join(os.path.dirname(xml_file), "ResiduePlot.pdf"),
+                              cr.roles_for_file(xml_file, roles))
+    if plots == 'lazy':
+        open(pending, 'w').close()
+    elif os.path.isfile(pending):
+        os.remove(pending)
+    return xml_file
+
+def plot_job(job):
+    """
+    Function rendering the ResiduePlot.pdf of an existing ResidueTable.csv
+    and removing its PENDING_FILE marker.
+
+    Parameters
+    ----------
+    job : tuple
+        (csv file, roles) like residue_job()
+    """
+    csv_file, roles = job
+    with rm.timer('residues.plot'):
+        save_residue_plot(pd.read_csv(csv_file, index_col=0),
+                          os.path.join(os.path.dirname(csv_file), "ResiduePlot.pdf"),
+                          cr.roles_for_file(csv_file, roles))
+    pending = os.path.join(os.path.dirname(csv_file), PENDING_FILE)
+    if os.path.isfile(pending):
+        os.remove(pending)
+    return csv_file
+
+def _run(function, todo, jobs):
+    if jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs == 1 or len(todo) < 2:
+        return [function(job) for job in todo]
+    with ProcessPoolExecutor(max_workers=min(jobs, len(todo))) as executor:
+        return list(executor.map(function, todo))
+
+def render_residue_plots(xml_files, jobs=1, plots='eager', roles=None):
+    """
+    Function to parse a batch of residue0.xml files on a pool of worker
+    processes, each worker reuses one figure for all its plots.
+
+    Parameters
+    ----------
+    xml_files : list
+        the residue0.xml files
+    jobs : int
+        number of worker processes, 0 uses every core
+    plots : string
+        one of PLOT_MODES, 'eager' renders the plots now, 'lazy' writes the
+        tables and leaves the plots to render_pending(), 'skip' only writes
+        the tables
+    roles : dictionary or string
+        the roles of the chains, or the --roles file read for every structure
+
+    Returns
+    -------
+    list
+        the processed xml files
+    """
+    if plots not in PLOT_MODES:
+        raise ValueError("Unknown plots mode "+str(plots)+", use one of "+', '.join(PLOT_MODES))
+    return _run(residue_job, [(xml_file, plots, roles) for xml_file in xml_files], jobs)
+
+def render_pending(root_dir, jobs=1, roles=None):
+    """
+    Function to render on demand the pending plots, those of the tables
+    written with plots 'lazy' (the tables written with plots 'skip' are left
+    without plot).
+
+    Parameters
+    ----------
+    root_dir : string
+        the root directory searched like find_xml_files()
+    jobs : int
+        number of worker processes, 0 uses every core
+    roles : dictionary or string
+        see render_residue_plots()
+
+    Returns
+    -------
+    list
+        the rendered tables
+    """
+    pending = [os.path.join(os.path.dirname(marker), "ResidueTable.csv")
+               for marker in find_xml_files(root_dir, filename=PENDING_FILE)]
+    return _run(plot_job, [(csv_file, roles) for csv_file in pending], jobs)
 
 if __name__ == '__main__':
     PARSER = argparse.ArgumentParser()
 
     PARSER.add_argument("root_dir", help="the root directory to search for residue0.xml files", type=str)
 
-    ARGS = PARSER.parse_args()
+    PARSER.add_argument("--plots", help="eager renders the plots, lazy leaves them to --render_pending, skip never plots", choices=PLOT_MODES, default='eager', type=str)
 
-    ROOT_DIR = ARGS.root_dir
+    PARSER.add_argument("--jobs", help="number of worker processes (0 for all cores)", default=1, type=int)
 
-    xml_files = find_xml_files(ROOT_DIR, filename="residue0.xml")
+    PARSER.add_argument("--render_pending", help="only render the plots left pending by --plots lazy", action='store_true')
 
-    for xml_file in xml_files:
-        df = xmlresidue_parser(xml_file)
-        output_file = os.path.join(os.path.dirname(xml_file), "ResidueTable.csv")
-        df.to_csv(output_file)
-        plot_residue_data(df)
-        plt.savefig(os.path.join(os.path.dirname(xml_file), "ResiduePlot.pdf"))
-        plt.close
+    PARSER.add_argument("--roles", help="the json file of the chain roles of the structures (see Chain_Roles.py)", default=None, type=str)
 
+    ARGS = PARSER.parse_args()
+
+    ROOT_DIR = ARGS.root_dir
 
+    if ARGS.render_pending:
+        render_pending(ROOT_DIR, jobs=ARGS.jobs, roles=ARGS.roles)
+    else:
+        render_residue_plots(find_xml_files(ROOT_DIR, filename="residue0.xml"), jobs=ARGS.jobs, plots=ARGS.plots,
+                             roles=ARGS.roles)
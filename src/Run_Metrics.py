@@ -0,0 +1,299 @@
+#!/usr/bin/python3
+"""
+Code to record the time spent in every step of the pipeline and the amount of
+work done (structures, interfaces, artifacts, bytes, retries) as machine
+readable events.
+
+  How to use
+  ----------
+The steps of PisaAuto_id.py, PisaAuto_file.py, the xml parsers, Auto_Naccess.py,
+Download_pdbfasta.py and Pipeline_Dag.py are wrapped with timer(), timed() and
+count(). Nothing is recorded until a run is started with start_run(), which
+RunPisaPy.py and PisaAuto_file.py do, every event is then appended as one
+json line to <dir>/run-<id>.jsonl :
+
+    {"event": "timer", "step": "pisa.wait", "seconds": 41.2, "status": "ok", ...}
+    {"event": "count", "name": "artifacts", "value": 1, ...}
+    {"event": "gauge", "name": "pisa_concurrency", "value": 2, ...}
+
+Worker processes write to the same file (the path is passed through the
+PISAPY_METRICS environment variable). When the run ends finish_run() writes a
+Prometheus text file, <dir>/run-<id>.prom, with the totals per step and
+counter. It can also be rebuilt from the events of any run :
+
+    python Run_Metrics.py Results/metrics/run-20240101-120000-1234.jsonl
+
+"""
+
+import argparse
+import functools
+import json
+import os
+import time
+from contextlib import contextmanager
+
+METRICS_ENV = 'PISAPY_METRICS'
+
+#events file of the current run, None when metrics are off
+_EVENTS = None
+
+#fields of every event, the other fields of a count are its labels
+EVENT_FIELDS = ('event', 'time', 'pid', 'name', 'value')
+
+
+def events_file():
+    """
+    The function to get the events file of the current run.
+
+    Returns
+    -------
+    string or None
+    """
+    return _EVENTS or os.environ.get(METRICS_ENV) or None
+
+
+def configure(path):
+    """
+    The function to send the events of this process and of its future worker
+    processes to path, None turns the metrics off.
+    """
+    global _EVENTS
+    _EVENTS = path
+    if path:
+        os.environ[METRICS_ENV] = path
+    else:
+        os.environ.pop(METRICS_ENV, None)
+
+
+def emit(event, **fields):
+    """
+    The function to append one event, each event is written with a single
+    append so lines of concurrent processes do not interleave.
+
+    Parameters
+    ----------
+    event : string
+        'timer', 'count', 'run_start', 'run_end', ...
+    fields :
+        the values of the event, they must be json serializable
+    """
+    path = events_file()
+    if path is None:
+        return
+    line = json.dumps(dict(event=event, time=round(time.time(), 3), pid=os.getpid(), **fields))
+    with open(path, 'a') as f:
+        f.write(line+'\n')
+
+
+def count(name, value=1, **labels):
+    """
+    The function to add value to a counter (structures, interfaces, artifacts,
+    bytes, retries, ...).
+    """
+    if value:
+        emit('count', name=name, value=value, **labels)
+
+
+def gauge(name, value, **labels):
+    """
+    The function to record the current value of a gauge (concurrency in use,
+    queue depth, ...), the last value and the highest one are kept.
+    """
+    emit('gauge', name=name, value=value, **labels)
+
+
+@contextmanager
+def timer(step, **labels):
+    """
+    The context manager timing a step, the event is written even when the
+    step raises (status 'error').
+
+    Parameters
+    ----------
+    step : string
+        '<component>.<step>', e.g. 'pisa.wait'
+    labels :
+        extra fields of the event, e.g. structure='6ta5'
+    """
+    if events_file() is None:
+        yield
+        return
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        emit('timer', step=step, seconds=round(time.perf_counter() - start, 6), status=status, **labels)
+
+
+def timed(step):
+    """
+    The decorator timing every call of a function with timer().
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(step):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_run(directory, **fields):
+    """
+    The function to start recording a run in directory.
+
+    Returns
+    -------
+    string
+        the events file
+    """
+    os.makedirs(directory, exist_ok=True)
+    run_id = time.strftime('%Y%m%d-%H%M%S')+'-'+str(os.getpid())
+    path = os.path.join(os.path.abspath(directory), 'run-'+run_id+'.jsonl')
+    configure(path)
+    emit('run_start', run=run_id, **fields)
+    return path
+
+
+def finish_run(**fields):
+    """
+    The function to end the current run and write its Prometheus file.
+
+    Returns
+    -------
+    string or None
+        the Prometheus file
+    """
+    path = events_file()
+    if path is None:
+        return None
+    emit('run_end', **fields)
+    configure(None)
+    return write_prometheus(path)
+
+
+def summarize(path):
+    """
+    The function to aggregate the events of a run.
+
+    Parameters
+    ----------
+    path : string
+        the events file
+
+    Returns
+    -------
+    dictionary
+        'steps': step -> {'count', 'seconds', 'max', 'errors'},
+        'counters': name -> {labels: total}, labels being the sorted
+        (label, value) pairs of the count() calls, 'gauges': name ->
+        {'last', 'max'}, 'seconds': wall time of the run
+    """
+    steps = {}
+    counters = {}
+    gauges = {}
+    first = last = None
+
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                e = json.loads(line)
+            except ValueError:
+                continue
+            first = e['time'] if first is None else min(first, e['time'])
+            last = e['time'] if last is None else max(last, e['time'])
+            if e['event'] == 'timer':
+                s = steps.setdefault(e['step'], {'count': 0, 'seconds': 0.0, 'max': 0.0, 'errors': 0})
+                s['count'] += 1
+                s['seconds'] += e['seconds']
+                s['max'] = max(s['max'], e['seconds'])
+                s['errors'] += e['status'] != 'ok'
+            elif e['event'] == 'count':
+                labels = tuple(sorted((k, str(v)) for k, v in e.items() if k not in EVENT_FIELDS))
+                totals = counters.setdefault(e['name'], {})
+                totals[labels] = totals.get(labels, 0) + e['value']
+            elif e['event'] == 'gauge':
+                g = gauges.setdefault(e['name'], {'last': e['value'], 'max': e['value']})
+                g['last'] = e['value']
+                g['max'] = max(g['max'], e['value'])
+
+    return {'steps': steps, 'counters': counters, 'gauges': gauges,
+            'seconds': (last - first) if first is not None else 0.0}
+
+
+def label_set(labels):
+    """
+    The function to write (label, value) pairs as a Prometheus label set,
+    e.g. {stage="parse"}, empty without labels.
+    """
+    if not labels:
+        return ''
+    return '{'+','.join('%s="%s"' % (k, v.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                        for k, v in labels)+'}'
+
+
+def write_prometheus(path, out_file=None):
+    """
+    The function to write the totals of a run in the Prometheus text format.
+
+    Parameters
+    ----------
+    path : string
+        the events file
+    out_file : string
+        the output file, path with a .prom extension when not given
+
+    Returns
+    -------
+    string
+        the output file
+    """
+    out_file = out_file or os.path.splitext(path)[0]+'.prom'
+    summary = summarize(path)
+    lines = ['# HELP pisapy_run_seconds Wall time of the run.',
+             '# TYPE pisapy_run_seconds gauge',
+             'pisapy_run_seconds %.3f' % summary['seconds'],
+             '# HELP pisapy_step_seconds Time spent in each step.',
+             '# TYPE pisapy_step_seconds summary']
+    for step, s in sorted(summary['steps'].items()):
+        lines.append('pisapy_step_seconds_sum{step="%s"} %.6f' % (step, s['seconds']))
+        lines.append('pisapy_step_seconds_count{step="%s"} %d' % (step, s['count']))
+    lines += ['# HELP pisapy_step_seconds_max Longest call of each step.',
+              '# TYPE pisapy_step_seconds_max gauge']
+    lines += ['pisapy_step_seconds_max{step="%s"} %.6f' % (step, s['max'])
+              for step, s in sorted(summary['steps'].items())]
+    lines += ['# HELP pisapy_step_errors_total Calls of each step that raised.',
+              '# TYPE pisapy_step_errors_total counter']
+    lines += ['pisapy_step_errors_total{step="%s"} %d' % (step, s['errors'])
+              for step, s in sorted(summary['steps'].items())]
+    for name, totals in sorted(summary['counters'].items()):
+        lines.append('# TYPE pisapy_%s_total counter' % name)
+        lines += ['pisapy_%s_total%s %s' % (name, label_set(labels), value)
+                  for labels, value in sorted(totals.items())]
+    for name, g in sorted(summary['gauges'].items()):
+        lines += ['# TYPE pisapy_%s gauge' % name,
+                  'pisapy_%s %s' % (name, g['last']),
+                  '# TYPE pisapy_%s_max gauge' % name,
+                  'pisapy_%s_max %s' % (name, g['max'])]
+
+    tmp = out_file+'.part'
+    with open(tmp, 'w') as f:
+        f.write('\n'.join(lines)+'\n')
+    os.replace(tmp, out_file)
+
+    return out_file
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("events_file", help="the run-<id>.jsonl events file", type=str)
+
+    ARGS = PARSER.parse_args()
+
+    print(open(write_prometheus(ARGS.events_file)).read(), end='')
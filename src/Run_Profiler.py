@@ -0,0 +1,354 @@
+#!/usr/bin/python3
+"""
+Code to profile the stages of a run : a CPU profile (cProfile) and the peak
+memory and allocation sites (tracemalloc) of every stage of every structure,
+ranked in one report.
+
+  How to use
+  ----------
+The profiling is turned on with --profile :
+
+    python RunPisaPy.py "6ta5 6iol" --backend shrake --profile
+    python PisaPy.py --profile Results/profile/ parse path/to/pisa_results/
+
+Pipeline_Dag.py wraps every stage with profiled(), the worker processes write
+in <results>/profile/run-<id>/ (the id of the run metrics, see Run_Metrics.py)
+one file per stage and structure :
+
+    parse-6ta5.pdb-1234-1.prof          cProfile statistics (pstats, snakeviz)
+    parse-6ta5.pdb-1234-1.json          seconds, peak memory, allocation sites
+
+and write_report() merges them at the end of the run in profile_report.txt :
+per stage, the calls, seconds and peak memory, the functions with the most
+cumulative time among the PisaPy scripts (xmlresidue_parser,
+plot_residue_data, create_df, pdb_complex_chains, ...) and among all the
+functions, the functions with the most own time and the sites holding the
+most memory when the stage ends. The report can be rebuilt from the files of any run :
+
+    python Run_Profiler.py Results/profile/run-20240101-120000-1234/ --top 40
+
+PisaAuto_file.py --profile profiles each PISA job and each step of the batch
+in <pdb_path>/profile/run-<id>/.
+
+Without --profile, profiled() only checks its directory, tracemalloc and
+cProfile are never started. cProfile and tracemalloc work for the whole
+process, the stages running in threads of the same process (fetch, pisa) are
+profiled one at a time, the others are run unprofiled meanwhile, and the
+memory of a threaded stage mixes in the allocations of the other threads.
+Every allocation is traced with FRAMES frames so its site is the line of the
+PisaPy scripts behind the pandas or numpy line that allocated, this makes a
+profiled run a few times slower, mostly in the first stage importing
+matplotlib or scipy (the imported modules are left out of the sites).
+
+"""
+
+import argparse
+import cProfile
+import glob
+import io
+import itertools
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+REPORT_FILE = 'profile_report.txt'
+
+#allocation sites kept per stage call
+SITES = 25
+
+#frames kept by tracemalloc for every allocation, enough to go up from the
+#pandas or numpy internals to the line of the script calling them (every frame
+#makes each allocation and the comparison of the snapshots slower)
+FRAMES = 10
+
+#the PisaPy scripts, their functions are ranked apart from the libraries
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPTS = sorted(f[:-3] for f in os.listdir(SCRIPTS_DIR) if f.endswith('.py'))
+OWN_FUNCTIONS = '^('+'|'.join(map(re.escape, SCRIPTS))+r')\.py:'
+
+#frames of the import machinery, see held_by_site()
+IMPORT_FRAMES = ('<frozen importlib._bootstrap>', '<frozen importlib._bootstrap_external>')
+
+_LOCK = threading.Lock()
+_CALLS = itertools.count(1)
+
+
+def _after_fork():
+    """
+    The function resetting the profiler in a forked worker process : the
+    parent may fork while one of its threads is profiled.
+    """
+    global _LOCK
+    _LOCK = threading.Lock()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+os.register_at_fork(after_in_child=_after_fork)
+
+
+def stage_file(directory, stage, name):
+    """
+    The function to name the files of one profiled call, without extension.
+    """
+    name = re.sub(r'[^\w.-]', '_', name or 'run')
+    return os.path.join(directory, '%s-%s-%d-%d' % (stage, name, os.getpid(), next(_CALLS)))
+
+
+def site_of(traceback):
+    """
+    The function to name an allocation site : the last line of the PisaPy
+    scripts in the traceback, followed by the library line that allocated.
+
+    Parameters
+    ----------
+    traceback : tracemalloc.Traceback
+        the oldest frame first
+
+    Returns
+    -------
+    string
+        e.g. 'Residue_xml_parser.py:77 (pandas/core/frame.py:716)'
+    """
+    inner = traceback[-1]
+    own = next((frame for frame in reversed(traceback) if os.path.dirname(os.path.abspath(frame.filename)) == SCRIPTS_DIR),
+               None)
+    if own is None:
+        return inner.filename+':'+str(inner.lineno)
+    site = os.path.basename(own.filename)+':'+str(own.lineno)
+    if own != inner:
+        site += ' ('+inner.filename+':'+str(inner.lineno)+')'
+    return site
+
+
+def held_by_site(snapshot):
+    """
+    The function to add up the memory of a snapshot per allocation site,
+    leaving out the modules imported meanwhile (their code is not the memory
+    of a stage, only of the first stage importing them).
+
+    Returns
+    -------
+    dictionary
+        site (see site_of()) -> (bytes, blocks)
+    """
+    sites = {}
+    for stat in snapshot.statistics('traceback'):
+        if any(frame.filename in IMPORT_FRAMES for frame in stat.traceback):
+            continue
+        site = site_of(stat.traceback)
+        size, count = sites.get(site, (0, 0))
+        sites[site] = (size + stat.size, count + stat.count)
+    return sites
+
+
+def allocation_sites(before, after, top=SITES):
+    """
+    The function to list the sites whose memory grew the most during a call.
+
+    Parameters
+    ----------
+    before, after : tracemalloc.Snapshot
+
+    Returns
+    -------
+    list of dictionaries
+        'site' (see site_of()), 'size' (bytes) and 'count' (blocks) of the
+        growth
+    """
+    held = held_by_site(before)
+    grown = []
+    for site, (size, count) in held_by_site(after).items():
+        size_before, count_before = held.get(site, (0, 0))
+        if size > size_before:
+            grown.append({'site': site, 'size': size - size_before, 'count': count - count_before})
+    return sorted(grown, key=lambda entry: -entry['size'])[:top]
+
+
+@contextmanager
+def profiled(stage, directory=None, name=None):
+    """
+    The context manager profiling a stage, it does nothing when directory is
+    None or when another thread of the process is already profiled.
+
+    Parameters
+    ----------
+    stage : string
+        the stage, e.g. 'parse'
+    directory : string
+        the profile directory of the run
+    name : string
+        the structure, e.g. '6ta5.pdb'
+    """
+    if directory is None or not _LOCK.acquire(blocking=False):
+        yield
+        return
+    try:
+        os.makedirs(directory, exist_ok=True)
+        started = not tracemalloc.is_tracing()
+        if started:
+            tracemalloc.start(FRAMES)
+        before = tracemalloc.take_snapshot()
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        profiler = cProfile.Profile()
+        status = 'ok'
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            yield
+        except BaseException:
+            status = 'error'
+            raise
+        finally:
+            profiler.disable()
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] - base
+            sites = allocation_sites(before, tracemalloc.take_snapshot())
+            if started:
+                tracemalloc.stop()
+            path = stage_file(directory, stage, name)
+            profiler.dump_stats(path+'.prof')
+            with open(path+'.json', 'w') as f:
+                json.dump({'stage': stage, 'name': name, 'seconds': round(seconds, 6), 'status': status,
+                           'peak': peak, 'sites': sites}, f)
+    finally:
+        _LOCK.release()
+
+
+def load_calls(directory):
+    """
+    The function to read the profiled calls of a run.
+
+    Returns
+    -------
+    dictionary
+        stage -> list of (call summary, pstats file)
+    """
+    stages = {}
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path, 'r') as f:
+            call = json.load(f)
+        stages.setdefault(call['stage'], []).append((call, os.path.splitext(path)[0]+'.prof'))
+    return stages
+
+
+def ranked_functions(prof_files, sort, top, restrict=None):
+    """
+    The function to merge the cProfile statistics of a stage and rank its
+    functions.
+
+    Parameters
+    ----------
+    prof_files : list of strings
+    sort : string
+        'cumulative' or 'tottime'
+    top : int
+    restrict : string
+        regular expression of the functions to keep, e.g. OWN_FUNCTIONS
+
+    Returns
+    -------
+    string
+        the pstats table
+    """
+    prof_files = [p for p in prof_files if os.path.exists(p)]
+    if not prof_files:
+        return ''
+    stream = io.StringIO()
+    stats = pstats.Stats(*prof_files, stream=stream)
+    stats.strip_dirs().sort_stats(sort).print_stats(*([restrict, top] if restrict else [top]))
+    #the table only, without the header of pstats
+    text = stream.getvalue()
+    return text[text.find('   ncalls'):].rstrip()
+
+
+def merged_sites(calls, top):
+    """
+    The function to add up the allocation sites of the calls of a stage.
+
+    Returns
+    -------
+    list of tuples
+        (site, bytes, blocks), the largest first
+    """
+    sites = {}
+    for call in calls:
+        for s in call['sites']:
+            size, count = sites.get(s['site'], (0, 0))
+            sites[s['site']] = (size + s['size'], count + s['count'])
+    return sorted(((site, size, count) for site, (size, count) in sites.items()),
+                  key=lambda s: -s[1])[:top]
+
+
+def write_report(directory, top=25):
+    """
+    The function to write the ranked report of the profiled calls of a run.
+
+    Parameters
+    ----------
+    directory : string
+        the profile directory of the run
+    top : int
+        functions and allocation sites listed per stage
+
+    Returns
+    -------
+    string or None
+        the report file, None when nothing was profiled
+    """
+    stages = load_calls(directory)
+    if not stages:
+        return None
+
+    order = sorted(stages, key=lambda stage: -sum(call['seconds'] for call, prof in stages[stage]))
+    lines = ['PisaPy profile of '+os.path.abspath(directory), '',
+             'tracemalloc traces the whole process : the memory of a stage run in a thread',
+             '(fetch, pisa) also holds the allocations of the threads running meanwhile.', '',
+             '%-12s %6s %12s %12s %14s  %s' % ('stage', 'calls', 'seconds', 'max seconds', 'peak MB', 'slowest')]
+    for stage in order:
+        calls = [call for call, prof in stages[stage]]
+        slowest = max(calls, key=lambda call: call['seconds'])
+        lines.append('%-12s %6d %12.3f %12.3f %14.1f  %s' % (
+            stage, len(calls), sum(c['seconds'] for c in calls), slowest['seconds'],
+            max(c['peak'] for c in calls) / 1024**2, slowest['name'] or '-'))
+
+    for stage in order:
+        calls = [call for call, prof in stages[stage]]
+        prof_files = [prof for call, prof in stages[stage]]
+        lines += ['', '='*78, 'Stage '+stage, '='*78, '',
+                  'Top PisaPy functions by cumulative time :',
+                  ranked_functions(prof_files, 'cumulative', top, OWN_FUNCTIONS), '',
+                  'Top functions by cumulative time :',
+                  ranked_functions(prof_files, 'cumulative', top), '',
+                  'Top functions by own time :',
+                  ranked_functions(prof_files, 'tottime', top), '',
+                  'Top allocation sites (memory held when the stage ends) :']
+        lines += ['  %10.1f KB %8d blocks  %s' % (size / 1024, count, site)
+                  for site, size, count in merged_sites(calls, top)] or ['  none']
+
+    out_file = os.path.join(directory, REPORT_FILE)
+    tmp = out_file+'.part'
+    with open(tmp, 'w') as f:
+        f.write('\n'.join(lines)+'\n')
+    os.replace(tmp, out_file)
+
+    return out_file
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("directory", help="the profile directory of a run, e.g. Results/profile/run-<id>/", type=str)
+
+    PARSER.add_argument("--top", help="functions and allocation sites listed per stage", default=25, type=int)
+
+    ARGS = PARSER.parse_args()
+
+    print("Written in "+str(write_report(ARGS.directory, ARGS.top)))
@@ -0,0 +1,153 @@
+#!/usr/bin/python3
+"""
+Code to compare the speed and accuracy of the in process Shrake-Rupley
+accessibility backend against NACCESS.
+
+  How to use
+  ----------
+First you need the chain files generated by Auto_Naccess.py (Results/<pdb>/chain_*/,
+--results for another directory) and the naccess bin.
+
+Then you can run the script with the following command :
+
+    python Sasa_Benchmark.py pdb_name.pdb /path/to/naccess --n_points 50 100 200
+
+A SasaBenchmark.csv table is saved in <results>/<pdb>/ with, for every chain file
+and point density, the run times of both backends and the mean absolute error,
+the maximum absolute error and the Pearson correlation of the per residue
+accessibility.
+
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from glob import glob
+import pandas as pd
+import Auto_Naccess as an
+
+
+def time_backend(k, sol_comp, pdb, backend, naccess_path=None, n_points=100, results='Results/'):
+    """
+    The function to run one backend on one chain file and time it.
+
+    Parameters
+    ----------
+    k : string
+        the chain name
+    sol_comp : string
+        'solo' or 'complex'
+    pdb : string
+        the pdb file name (Results/ sub folder)
+    backend : string
+        'naccess' or 'shrake'
+    naccess_path : string
+        the full path to the naccess bin
+    n_points : int
+        sphere point density of the shrake backend
+    results : string
+        the results directory of the chain files
+
+    Returns
+    -------
+    pandas DataFrame and float (seconds)
+    """
+    start = time.perf_counter()
+    if backend == 'naccess':
+        tmp_dir = tempfile.mkdtemp(prefix='naccess_bench_')
+        try:
+            df = an.run_naccess(k, sol_comp, naccess_path, pdb, tmp_dir=tmp_dir, results=results)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+    else:
+        df = an.run_shrake_rupley(k, sol_comp, pdb, n_points=n_points, results=results)
+
+    return df, time.perf_counter() - start
+
+
+def compare(reference, other, column):
+    """
+    The function to compute the accuracy of a backend against the reference.
+
+    Parameters
+    ----------
+    reference : pandas DataFrame
+        NACCESS results
+    other : pandas DataFrame
+        Shrake-Rupley results
+    column : string
+        the accessibility column name
+
+    Returns
+    -------
+    dictionary
+    """
+    both = pd.merge(reference, other, on=['chain', 'res'], suffixes=(' naccess', ' shrake'))
+    diff = (both[column+' naccess'] - both[column+' shrake']).abs()
+
+    return {'residues': len(both),
+            'mae': diff.mean(),
+            'max abs error': diff.max(),
+            'pearson r': both[column+' naccess'].corr(both[column+' shrake'])}
+
+
+def benchmark(pdb, naccess_path, n_points_lst, results='Results/'):
+    """
+    The function to benchmark both backends on every chain file of a structure.
+
+    Parameters
+    ----------
+    pdb : string
+        the pdb file name (Results/ sub folder)
+    naccess_path : string
+        the full path to the naccess bin
+    n_points_lst : list
+        the point densities to test
+    results : string
+        the results directory of the chain files
+
+    Returns
+    -------
+    pandas DataFrame
+    """
+    rows = []
+
+    for chain_dir in sorted(glob(os.path.join(results, pdb, 'chain_*/'))):
+        k = chain_dir.rstrip('/').split('chain_')[-1]
+        for sol_comp in ('solo', 'complex'):
+            if not os.path.isfile(chain_dir+k+'_'+sol_comp+'.pdb'):
+                continue
+            ref, ref_time = time_backend(k, sol_comp, pdb, 'naccess', naccess_path=naccess_path, results=results)
+            for n_points in n_points_lst:
+                df, sr_time = time_backend(k, sol_comp, pdb, 'shrake', n_points=n_points, results=results)
+                row = {'chain': k, 'file': sol_comp, 'n_points': n_points,
+                       'naccess s': ref_time, 'shrake s': sr_time}
+                row.update(compare(ref, df, sol_comp+' access'))
+                rows.append(row)
+
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("pdb_file", help="the pdb file name", type=str)
+
+    PARSER.add_argument("naccess_path", help="the full path to the naccess bin", type=str)
+
+    PARSER.add_argument("--n_points", help="the shrake point densities to test", nargs='+', default=[50, 100, 200], type=int)
+
+    PARSER.add_argument("--results", help="the directory of the chain files", default='Results/', type=str)
+
+    ARGS = PARSER.parse_args()
+
+    PDB = ARGS.pdb_file.split('/')[-1]
+
+    DF = benchmark(PDB, ARGS.naccess_path, ARGS.n_points, ARGS.results)
+
+    print(DF.to_string(index=False))
+
+    DF.to_csv(os.path.join(ARGS.results, PDB, 'SasaBenchmark.csv'))
@@ -0,0 +1,294 @@
+#!/usr/bin/python3
+"""
+Code for an on-disk cache of downloaded structure and fasta files shared by
+every run and every user of a node.
+
+  How to use
+  ----------
+The cache is used by Download_pdbfasta.py and RunPisaPy.py, its directory is
+given with --cache_dir (or the PISAPY_CACHE environment variable) and its size
+cap in MB with --cache_size.
+
+The statistics of a cache can be printed, and the cache emptied, with :
+
+    python Structure_Cache.py /path/to/cache
+    python Structure_Cache.py /path/to/cache --clear
+
+Files are stored as <dir>/<format>/<id>.<format>. Writes go through a temporary
+file renamed in place so readers never see partial files, every hit refreshes
+the file modification time and the least recently used files are evicted
+once the cache grows past its size cap. Hits, misses and evictions are counted
+in <dir>/stats.json.
+
+"""
+
+import argparse
+import fcntl
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+#default size cap of the cache in bytes
+DEFAULT_SIZE = 10 * 1024**3
+
+#modes of the cache directories and files, group writable so every user of
+#the node shares the cache (setgid directories keep the group of the root)
+DIR_MODE = 0o2775
+FILE_MODE = 0o664
+
+
+def default_cache_dir():
+    """
+    The function to get the cache directory used when none is given.
+
+    Returns
+    -------
+    string
+    """
+    return os.environ.get('PISAPY_CACHE',
+                          os.path.join(os.path.expanduser('~'), '.cache', 'pisapy'))
+
+
+class StructureCache:
+    """
+    The on-disk cache of structure and fasta files.
+
+    Parameters
+    ----------
+    root : string
+        the cache directory, default_cache_dir() when not given
+    max_bytes : int
+        the size cap, the least recently used files are evicted past it
+    """
+
+    def __init__(self, root=None, max_bytes=DEFAULT_SIZE):
+        self.root = root or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._makedirs(self.root)
+
+    @staticmethod
+    def _makedirs(directory):
+        os.makedirs(directory, exist_ok=True)
+        if os.stat(directory).st_uid == os.getuid():
+            os.chmod(directory, DIR_MODE)
+
+    @staticmethod
+    def _share(fd):
+        #only the owner may change the mode, the umask is not applied
+        try:
+            os.fchmod(fd, FILE_MODE)
+        except OSError:
+            pass
+
+    def path(self, key, fmt):
+        """
+        The path of a cached file.
+
+        Parameters
+        ----------
+        key : string
+            the pdb id
+        fmt : string
+            'pdb', 'cif', 'fasta', ...
+
+        Returns
+        -------
+        string
+        """
+        return os.path.join(self.root, fmt, key.lower()+'.'+fmt)
+
+    @contextmanager
+    def _lock(self):
+        fd = os.open(os.path.join(self.root, '.lock'), os.O_RDWR | os.O_CREAT, FILE_MODE)
+        try:
+            self._share(fd)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+        finally:
+            os.close(fd)
+
+    def _count(self, total=None, **counts):
+        with self._lock():
+            self._update(total, **counts)
+
+    def _update(self, total=None, **counts):
+        #the caller holds _lock()
+        stats = self.stats()
+        for name, n in counts.items():
+            stats[name] = stats.get(name, 0) + n
+        if total is not None:
+            stats['bytes'] = total
+        fd, tmp = tempfile.mkstemp(dir=self.root, prefix='.stats')
+        self._share(fd)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(stats, f)
+        os.replace(tmp, os.path.join(self.root, 'stats.json'))
+
+    def stats(self):
+        """
+        The hit, miss, store and eviction counters of the cache.
+
+        Returns
+        -------
+        dictionary
+        """
+        try:
+            with open(os.path.join(self.root, 'stats.json'), 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'bytes': 0}
+
+    def get(self, key, fmt):
+        """
+        The function to look a file up, a hit marks it as recently used.
+
+        Parameters
+        ----------
+        key : string
+            the pdb id
+        fmt : string
+
+        Returns
+        -------
+        string or None
+            the cached file
+        """
+        path = self.path(key, fmt)
+        try:
+            os.utime(path)
+        except OSError:
+            self._count(misses=1)
+            return None
+
+        self._count(hits=1)
+        return path
+
+    def put(self, key, fmt, src):
+        """
+        The function to store a copy of a file, written atomically.
+
+        Parameters
+        ----------
+        key : string
+            the pdb id
+        fmt : string
+        src : string
+            the file to store
+
+        Returns
+        -------
+        string
+            the cached file
+        """
+        path = self.path(key, fmt)
+        self._makedirs(os.path.dirname(path))
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.'+key.lower())
+        try:
+            self._share(fd)
+            with os.fdopen(fd, 'wb') as out, open(src, 'rb') as f:
+                shutil.copyfileobj(f, out, 1 << 20)
+            #an overwritten file is already in the byte count, two processes
+            #storing the same file must not both count it as new
+            with self._lock():
+                try:
+                    old = os.path.getsize(path)
+                except OSError:
+                    old = 0
+                os.replace(tmp, path)
+                self._update(stores=1, bytes=os.path.getsize(path) - old)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        if self.stats().get('bytes', 0) > self.max_bytes:
+            self.evict()
+        return path
+
+    def copy_to(self, key, fmt, dest):
+        """
+        The function to copy a cached file to dest.
+
+        Returns
+        -------
+        string or None
+            dest on a hit, None on a miss
+        """
+        path = self.get(key, fmt)
+        if path is None:
+            return None
+        try:
+            shutil.copyfile(path, dest)
+        except FileNotFoundError:
+            #evicted by another process between get() and the copy
+            self._count(hits=-1, misses=1)
+            return None
+        return dest
+
+    def evict(self):
+        """
+        The function to remove the least recently used files until the cache
+        fits in max_bytes. put() only calls it once the running byte count of
+        stats.json passes the cap, the walk then resets that count.
+
+        Returns
+        -------
+        int
+            number of evicted files
+        """
+        entries = []
+        for root, dirs, files in os.walk(self.root):
+            for name in files:
+                if name.startswith('.') or name == 'stats.json':
+                    continue
+                try:
+                    st = os.stat(os.path.join(root, name))
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, os.path.join(root, name)))
+
+        total = sum(size for mtime, size, path in entries)
+        evicted = 0
+        for mtime, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            evicted += 1
+
+        self._count(total=total, evictions=evicted)
+        return evicted
+
+    def clear(self):
+        """
+        The function to remove every cached file.
+        """
+        for fmt in os.listdir(self.root):
+            if os.path.isdir(os.path.join(self.root, fmt)):
+                shutil.rmtree(os.path.join(self.root, fmt), ignore_errors=True)
+        self._count(total=0)
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("cache_dir", help="the cache directory", nargs='?', default=None, type=str)
+
+    PARSER.add_argument("--clear", help="remove every cached file", action='store_true')
+
+    ARGS = PARSER.parse_args()
+
+    CACHE = StructureCache(ARGS.cache_dir)
+
+    if ARGS.clear:
+        CACHE.clear()
+
+    print(json.dumps(dict(CACHE.stats(), directory=CACHE.root), indent=2))
@@ -0,0 +1,257 @@
+#!/usr/bin/python3
+"""
+Code to generate synthetic PDBePISA results (xml files) and the matching pdb
+file at a chosen scale, to benchmark and test the parsers without running PISA.
+
+  How to use
+  ----------
+First you need to have the python package numpy.
+
+Then you can run the script with the following command :
+
+    python Synthetic_Pisa.py out_dir/ --chains 4 --interfaces 6 --bonds 40 --residues 300
+
+It writes, like PisaAuto_file.py :
+
+    out_dir/synthetic.pdb
+    out_dir/synthetic.pdb_PDBePISA_xml_files/interfacetable.xml
+                                            /hydrogenbond<i>.xml
+                                            /saltbridge<i>.xml
+                                            /interfacesummary<i>.xml
+                                            /residue<i>.xml
+
+Interfaces pair the chains in turn, every interface gets `bonds` hydrogen
+bonds, a fifth of that in salt bridges (between ASP/GLU and LYS/ARG
+residues) and `residues` // 4 interface residues per side. The residue
+numbers of the bonds all exist in the pdb file. The same seed gives the same
+files.
+
+"""
+
+import argparse
+import itertools
+import os
+import numpy as np
+import Pdb_Structure as ps
+
+AMINO_ACIDS = ['ALA', 'ARG', 'ASN', 'ASP', 'CYS', 'GLN', 'GLU', 'GLY', 'HIS', 'ILE',
+               'LEU', 'LYS', 'MET', 'PHE', 'PRO', 'SER', 'THR', 'TRP', 'TYR', 'VAL']
+
+#atom given to the bonds of each kind of residue
+DONORS = {'LYS': 'NZ', 'ARG': 'NH1', 'ASN': 'ND2', 'GLN': 'NE2', 'SER': 'OG', 'THR': 'OG1'}
+ACCEPTORS = {'ASP': 'OD1', 'GLU': 'OE1', 'ASN': 'OD1', 'GLN': 'OE1', 'SER': 'OG', 'TYR': 'OH'}
+
+BACKBONE = ['N', 'CA', 'C', 'O']
+
+
+def chain_names(n_chains):
+    """
+    The function to name the chains A, B, ... then AA, AB, ... (mmCIF like).
+    """
+    letters = [chr(ord('A')+i) for i in range(26)]
+    names = letters + [a+b for a in letters for b in letters]
+    return names[:n_chains]
+
+
+def make_sequences(names, n_residues, rng):
+    """
+    The function to draw the residue names of every chain.
+
+    Returns
+    -------
+    dictionary
+        chain -> numpy array of residue names
+    """
+    return {name: rng.choice(AMINO_ACIDS, n_residues) for name in names}
+
+
+def make_atoms(sequences):
+    """
+    The function to build the backbone atoms of every chain, chains are
+    straight helices side by side.
+
+    Returns
+    -------
+    numpy structured array
+    """
+    rows = []
+    for c, (name, seq) in enumerate(sequences.items()):
+        for i, resname in enumerate(seq):
+            angle = i * 100 * np.pi / 180
+            centre = np.array([2.3 * np.cos(angle) + 12.0 * c, 2.3 * np.sin(angle), 1.5 * i])
+            for j, atom in enumerate(BACKBONE):
+                rows.append((atom, resname, name, i+1, centre + (0.4 * j, 0.3 * j, 0.2 * j)))
+
+    n = len(rows)
+    atom, resname, chain, resseq, xyz = zip(*rows) if rows else ([],) * 5
+    return ps.from_columns(np.full(n, 'ATOM'), np.arange(1, n+1), np.array(atom),
+                           np.full(n, ''), np.array(resname), np.array(chain),
+                           np.array(resseq), np.full(n, ''), np.array(xyz).reshape(n, 3),
+                           np.ones(n), np.full(n, 20.0), np.array([a[0] for a in atom]))
+
+
+def structure_field(chain, resname, resseq, atom=None):
+    """
+    The function to write a residue like PISA does, e.g. 'A:ASP  37[ OD1]'.
+    """
+    if atom is None:
+        return chain+':'+resname+' '+str(resseq)
+    return chain+':'+resname+str(resseq).rjust(4)+'[ '+atom.ljust(3)+']'
+
+
+def pick_bonds(seq1, seq2, n_bonds, kinds1, kinds2, rng):
+    """
+    The function to draw bonded residue pairs, residues of the wanted kinds
+    when the chains have some.
+
+    Returns
+    -------
+    list of tuples
+        (resseq 1, atom 1, resseq 2, atom 2)
+    """
+    pos1 = [i for i, r in enumerate(seq1) if r in kinds1] or list(range(len(seq1)))
+    pos2 = [i for i, r in enumerate(seq2) if r in kinds2] or list(range(len(seq2)))
+    bonds = []
+    for i, j in zip(rng.choice(pos1, n_bonds), rng.choice(pos2, n_bonds)):
+        bonds.append((i+1, kinds1.get(seq1[i], 'O'), j+1, kinds2.get(seq2[j], 'N')))
+    return bonds
+
+
+def write_bonds(path, chain1, seq1, chain2, seq2, bonds, rng):
+    with open(path, 'w') as f:
+        f.write('<BONDS>\n')
+        for res1, atom1, res2, atom2 in bonds:
+            f.write('<BOND>\n')
+            f.write('<STRUCTURE1>'+structure_field(chain1, seq1[res1-1], res1, atom1)+'</STRUCTURE1>\n')
+            f.write('<DISTANCE>%.2f</DISTANCE>\n' % rng.uniform(2.5, 3.9))
+            f.write('<STRUCTURE2>'+structure_field(chain2, seq2[res2-1], res2, atom2)+'</STRUCTURE2>\n')
+            f.write('</BOND>\n')
+        f.write('</BONDS>\n')
+
+
+def write_residues(path, sides, rng):
+    with open(path, 'w') as f:
+        f.write('<?xml version="1.0"?>\n<INTERFACE>\n')
+        for k, (chain, seq, positions) in enumerate(sides):
+            f.write('<RESIDUE%d>\n' % (k+1))
+            for i in positions:
+                f.write('<RESIDUE><STRUCTURE>'+structure_field(chain, seq[i], i+1)+'</STRUCTURE>'
+                        '<SOLVENTACCESSIBLEAREA>%.2f</SOLVENTACCESSIBLEAREA>'
+                        '<BURIEDSURFACEAREA>%.2f</BURIEDSURFACEAREA>'
+                        '<BURIEDSURFACEAREASCORE>%d</BURIEDSURFACEAREASCORE>'
+                        '<SOLVATIONENERGY>%.2f</SOLVATIONENERGY></RESIDUE>\n'
+                        % (rng.uniform(0, 100), rng.uniform(0, 45), rng.integers(0, 11),
+                           rng.uniform(-0.5, 0.5)))
+            f.write('</RESIDUE%d>\n' % (k+1))
+        f.write('</INTERFACE>\n')
+
+
+def write_summary(path, chain1, chain2, area1, area2):
+    with open(path, 'w') as f:
+        f.write('<INTERFACESUMMARY>\n')
+        f.write('<STRUCTURE1>'+chain1+'</STRUCTURE1>\n<INTERFACEAREA>%.1f</INTERFACEAREA>\n' % area1)
+        f.write('<STRUCTURE2>'+chain2+'</STRUCTURE2>\n<INTERFACEAREA>%.1f</INTERFACEAREA>\n' % area2)
+        f.write('</INTERFACESUMMARY>\n')
+
+
+def generate(out_dir, n_chains=2, n_interfaces=1, n_bonds=10, n_residues=100,
+             name='synthetic.pdb', seed=0):
+    """
+    The function to write a synthetic structure and its PISA xml files.
+
+    Parameters
+    ----------
+    out_dir : string
+        the output directory
+    n_chains : int
+        number of chains (at least 2)
+    n_interfaces : int
+        number of interfaces
+    n_bonds : int
+        hydrogen bonds per interface
+    n_residues : int
+        residues per chain
+    name : string
+        the pdb file name
+    seed : int
+
+    Returns
+    -------
+    dictionary
+        'pdb', 'xml_dir' and the counts of interfaces, bonds, residues and atoms
+    """
+    rng = np.random.default_rng(seed)
+    names = chain_names(max(n_chains, 2))
+    sequences = make_sequences(names, n_residues, rng)
+    xml_dir = os.path.join(out_dir, name+'_PDBePISA_xml_files')
+    os.makedirs(xml_dir, exist_ok=True)
+
+    atoms = make_atoms(sequences)
+    ps.write_pdb(atoms, os.path.join(out_dir, name), ps.chain_aliases(names))
+
+    pairs = itertools.islice(itertools.cycle(itertools.combinations(names, 2)), n_interfaces)
+    n_salt = max(n_bonds // 5, 1)
+    counts = {'interfaces': n_interfaces, 'bonds': 0, 'residues': 0, 'atoms': len(atoms)}
+
+    with open(os.path.join(xml_dir, 'interfacetable.xml'), 'w') as table:
+        table.write('<INTERFACETABLE>\n')
+        for i, (chain1, chain2) in enumerate(pairs):
+            seq1, seq2 = sequences[chain1], sequences[chain2]
+            hbonds = pick_bonds(seq1, seq2, n_bonds, DONORS, ACCEPTORS, rng)
+            salts = pick_bonds(seq1, seq2, n_salt, {'LYS': 'NZ', 'ARG': 'NH1'},
+                               {'ASP': 'OD1', 'GLU': 'OE1'}, rng)
+            write_bonds(os.path.join(xml_dir, 'hydrogenbond%d.xml' % i), chain1, seq1, chain2, seq2, hbonds, rng)
+            write_bonds(os.path.join(xml_dir, 'saltbridge%d.xml' % i), chain1, seq1, chain2, seq2, salts, rng)
+
+            n_side = max(n_residues // 4, 1)
+            sides = [(chain1, seq1, np.sort(rng.choice(n_residues, n_side, replace=False))),
+                     (chain2, seq2, np.sort(rng.choice(n_residues, n_side, replace=False)))]
+            write_residues(os.path.join(xml_dir, 'residue%d.xml' % i), sides, rng)
+
+            area = rng.uniform(300, 2500)
+            write_summary(os.path.join(xml_dir, 'interfacesummary%d.xml' % i), chain1, chain2,
+                          area * rng.uniform(0.9, 1.1), area * rng.uniform(0.9, 1.1))
+
+            table.write('<INTERFACE>\n')
+            table.write('<INTERFACENO>%d</INTERFACENO>\n' % (i+1))
+            table.write('<INTERFACENRESIDUES1>%d</INTERFACENRESIDUES1>\n' % n_side)
+            table.write('<TOTALSURFACEAREA1>%.1f</TOTALSURFACEAREA1>\n' % (n_residues * 110.0))
+            table.write('<INTERFACENRESIDUES2>%d</INTERFACENRESIDUES2>\n' % n_side)
+            table.write('<TOTALSURFACEAREA2>%.1f</TOTALSURFACEAREA2>\n' % (n_residues * 110.0))
+            table.write('<INTERFACEAREA>%.1f</INTERFACEAREA>\n' % area)
+            table.write('<INTERFACEDELTAGPVALUE>%.3f</INTERFACEDELTAGPVALUE>\n' % rng.uniform(0, 1))
+            table.write('<INTERFACENHBONDS>%d</INTERFACENHBONDS>\n' % len(hbonds))
+            table.write('<INTERFACENSALTBRIDGES>%d</INTERFACENSALTBRIDGES>\n' % len(salts))
+            table.write('<INTERFACENDISULFIDEBONDS>0</INTERFACENDISULFIDEBONDS>\n')
+            table.write('<INTERFACECSS>%.3f</INTERFACECSS>\n' % rng.uniform(0, 1))
+            table.write('</INTERFACE>\n')
+
+            counts['bonds'] += len(hbonds) + len(salts)
+            counts['residues'] += 2 * n_side
+        table.write('</INTERFACETABLE>\n')
+
+    return dict(counts, pdb=os.path.join(out_dir, name), xml_dir=xml_dir)
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("out_dir", help="the output directory", type=str)
+
+    PARSER.add_argument("--chains", help="number of chains", default=2, type=int)
+
+    PARSER.add_argument("--interfaces", help="number of interfaces", default=1, type=int)
+
+    PARSER.add_argument("--bonds", help="hydrogen bonds per interface", default=10, type=int)
+
+    PARSER.add_argument("--residues", help="residues per chain", default=100, type=int)
+
+    PARSER.add_argument("--name", help="the pdb file name", default='synthetic.pdb', type=str)
+
+    PARSER.add_argument("--seed", help="random seed", default=0, type=int)
+
+    ARGS = PARSER.parse_args()
+
+    print(generate(ARGS.out_dir, ARGS.chains, ARGS.interfaces, ARGS.bonds, ARGS.residues,
+                   name=ARGS.name, seed=ARGS.seed))
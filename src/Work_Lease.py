@@ -0,0 +1,263 @@
+#!/usr/bin/python3
+"""
+Code to share the structures of one input directory between several
+processes or nodes through lease files on the shared filesystem, without a
+queue service.
+
+  How to use
+  ----------
+The leases are used by PisaAuto_file.py --distributed, every node is started
+on the same directory :
+
+    node1$ python PisaAuto_file.py /shared/pdb_files/ --distributed
+    node2$ python PisaAuto_file.py /shared/pdb_files/ --distributed
+
+The state of the leases can be printed with :
+
+    python Work_Lease.py /shared/pdb_files/.leases
+
+A node works on an item only after creating its lease,
+<lease_dir>/<item>.lease. The lease is created with a hard link from a
+temporary file, an atomic operation that fails when the lease exists, also
+on NFS. While a node holds leases a heartbeat thread refreshes their
+modification time. A lease not refreshed for ttl seconds belongs to a
+crashed node : the next node renames it away (only one rename can succeed)
+and claims the item again. Finished items get a <item>.done marker and are
+never claimed again.
+
+"""
+
+import argparse
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+#seconds without heartbeat after which a lease is reclaimed
+DEFAULT_TTL = 600
+
+#seconds between two heartbeats
+DEFAULT_HEARTBEAT = 60
+
+
+def lease_name(item):
+    """
+    The function to turn an item (file or folder name) into a lease file name.
+    """
+    return item.strip('/').replace('/', '_').replace(os.sep, '_')
+
+
+class LeaseDir:
+    """
+    The lease files of a shared work list.
+
+    Parameters
+    ----------
+    root : string
+        the lease directory, on the filesystem shared by every node
+    ttl : int
+        seconds without heartbeat after which a lease is reclaimed
+    heartbeat : int
+        seconds between two heartbeats, well below ttl
+    """
+
+    def __init__(self, root, ttl=DEFAULT_TTL, heartbeat=DEFAULT_HEARTBEAT):
+        self.root = root
+        self.ttl = ttl
+        self.heartbeat = heartbeat
+        self.owner = socket.gethostname()+':'+str(os.getpid())+':'+uuid.uuid4().hex[:8]
+        self.held = set()
+        self._stop = threading.Event()
+        self._thread = None
+        self._mutex = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, item, suffix='.lease'):
+        return os.path.join(self.root, lease_name(item)+suffix)
+
+    def owner_of(self, item):
+        """
+        The owner written in the lease of item, None when it has no lease.
+        """
+        try:
+            with open(self._path(item), 'r') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def is_done(self, item):
+        return os.path.exists(self._path(item, '.done'))
+
+    def _create(self, item):
+        tmp = self._path(item, '.'+self.owner.replace(':', '_')+'.tmp')
+        with open(tmp, 'w') as f:
+            f.write(self.owner+'\n')
+        try:
+            os.link(tmp, self._path(item))
+            return True
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp)
+
+    def _reclaim(self, item):
+        """
+        The function to remove the lease of item when it expired, only one
+        node can win the rename of an expired lease.
+        """
+        lease = self._path(item)
+        try:
+            age = time.time() - os.stat(lease).st_mtime
+        except FileNotFoundError:
+            return True
+        if age <= self.ttl:
+            return False
+
+        stale_owner = self.owner_of(item)
+        tombstone = lease+'.expired.'+uuid.uuid4().hex[:8]
+        try:
+            os.rename(lease, tombstone)
+        except FileNotFoundError:
+            return True
+        try:
+            with open(tombstone, 'r') as f:
+                moved_owner = f.read().strip()
+            if moved_owner != stale_owner:
+                #another node reclaimed it between the check and the rename, put its lease back
+                try:
+                    os.link(tombstone, lease)
+                except FileExistsError:
+                    pass
+                return False
+            logging.info("Reclaiming the expired lease of "+item+" held by "+str(stale_owner))
+            return True
+        finally:
+            os.remove(tombstone)
+
+    def claim(self, item):
+        """
+        The function to take the lease of item.
+
+        Returns
+        -------
+        boolean
+            True when this node now holds the lease
+        """
+        if self.is_done(item):
+            return False
+        if not self._create(item):
+            if not (self._reclaim(item) and self._create(item)):
+                return False
+        if self.is_done(item):
+            #finished by another node while we were claiming
+            os.remove(self._path(item))
+            return False
+
+        with self._mutex:
+            self.held.add(item)
+        self._start()
+        return True
+
+    def release(self, item, done=False):
+        """
+        The function to give the lease of item back, done marks it finished.
+        """
+        with self._mutex:
+            self.held.discard(item)
+        if done:
+            with open(self._path(item, '.done'), 'w') as f:
+                f.write(self.owner+' '+time.strftime('%Y-%m-%d %H:%M:%S')+'\n')
+        if self.owner_of(item) == self.owner:
+            try:
+                os.remove(self._path(item))
+            except FileNotFoundError:
+                pass
+
+    def items(self, items):
+        """
+        The generator yielding the items this node manages to claim, the
+        caller releases them.
+        """
+        for item in items:
+            if self.claim(item):
+                yield item
+
+    def beat(self):
+        """
+        The function refreshing the leases held, leases reclaimed by another
+        node are dropped.
+        """
+        with self._mutex:
+            held = list(self.held)
+        for item in held:
+            if self.owner_of(item) != self.owner:
+                logging.warning("Lost the lease of "+item)
+                with self._mutex:
+                    self.held.discard(item)
+                continue
+            try:
+                os.utime(self._path(item))
+            except FileNotFoundError:
+                pass
+
+    def _run(self):
+        while not self._stop.wait(self.heartbeat):
+            self.beat()
+
+    def _start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='lease-heartbeat', daemon=True)
+            self._thread.start()
+
+    def close(self):
+        """
+        The function to stop the heartbeat and release every lease still held.
+        """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        for item in list(self.held):
+            self.release(item)
+
+    def status(self):
+        """
+        The function listing the leases and done markers of the directory.
+
+        Returns
+        -------
+        dictionary
+            'done': items, 'held': item -> (owner, seconds since heartbeat)
+        """
+        done, held = [], {}
+        now = time.time()
+        for name in sorted(os.listdir(self.root)):
+            path = os.path.join(self.root, name)
+            if name.endswith('.done'):
+                done.append(name[:-len('.done')])
+            elif name.endswith('.lease'):
+                try:
+                    with open(path, 'r') as f:
+                        held[name[:-len('.lease')]] = (f.read().strip(), round(now - os.stat(path).st_mtime))
+                except OSError:
+                    continue
+        return {'done': done, 'held': held}
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("lease_dir", help="the lease directory", type=str)
+
+    PARSER.add_argument("--ttl", help="seconds after which a lease expires", default=DEFAULT_TTL, type=int)
+
+    ARGS = PARSER.parse_args()
+
+    STATUS = LeaseDir(ARGS.lease_dir, ttl=ARGS.ttl).status()
+
+    print(len(STATUS['done']), "done")
+    for ITEM, (OWNER, AGE) in STATUS['held'].items():
+        print(ITEM, OWNER, str(AGE)+' s', 'EXPIRED' if AGE > ARGS.ttl else '')
@@ -0,0 +1,275 @@
+#!/usr/bin/python3
+"""
+Code to store the xml files of a structure in one compressed archive,
+<name>_PDBePISA_xml_files.zip, instead of a folder of small files, the
+parsers read them in place.
+
+  How to use
+  ----------
+The archives are written by the scripts submitting to PISA with --archive,
+folders of earlier runs can be packed with :
+
+    python Xml_Archive.py Results/
+
+Inside the code, an xml file keeps the path it would have in the folder
+(Results/6ta5.pdb_PDBePISA_xml_files/hydrogenbond0.xml) and is read with :
+
+    import Xml_Archive as xa
+
+    with xa.open_xml(path) as f:
+        ...
+    xa.xml_exists(path)
+    xa.list_xml(folder, 'residue*.xml')
+
+The file is read from the folder when it exists there, from the archive
+otherwise. The zip central directory is the index of the archive : a member
+is read without extracting or reading the others, and the opened archives
+are kept for the next reads. find_xml_files() of Parse_Interfacetable.py
+finds the interfacetable.xml of the archives too. The csv files and plots
+written next to the xml files go in a folder of the same name, created when
+needed.
+
+"""
+
+import argparse
+import fnmatch
+import io
+import os
+import threading
+import zipfile
+from collections import OrderedDict
+
+SUFFIX = '_PDBePISA_xml_files'
+
+EXTENSION = '.zip'
+
+#archives kept open
+MAX_OPEN = 64
+
+_OPEN = OrderedDict()
+_MUTEX = threading.Lock()
+
+
+def _forget():
+    #a forked worker reopens its own archives, the file offsets of the parent are shared
+    global _OPEN, _MUTEX
+    _OPEN = OrderedDict()
+    _MUTEX = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_forget)
+
+
+def archive_of(folder):
+    """
+    The function to get the archive path of an xml folder.
+    """
+    return folder.rstrip('/').rstrip(os.sep)+EXTENSION
+
+
+def _archive(folder):
+    """
+    The function to get the opened archive of an xml folder, None when it has
+    no archive.
+    """
+    path = archive_of(folder)
+    try:
+        stamp = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _MUTEX:
+        cached = _OPEN.get(path)
+        if cached is not None and cached[0] == stamp:
+            _OPEN.move_to_end(path)
+            return cached[1]
+        if cached is not None:
+            cached[1].close()
+        archive = zipfile.ZipFile(path, 'r')
+        _OPEN[path] = (stamp, archive)
+        while len(_OPEN) > MAX_OPEN:
+            _OPEN.popitem(last=False)[1][1].close()
+        return archive
+
+
+def _member(path):
+    """
+    The function to split an xml path into its archive and member name.
+    """
+    folder, name = os.path.split(path)
+    archive = _archive(folder)
+    if archive is None:
+        return None, name
+    return archive, name
+
+
+def xml_exists(path):
+    """
+    The function to check if an xml file is in its folder or in its archive.
+
+    Returns
+    -------
+    boolean
+    """
+    if os.path.isfile(path):
+        return True
+    archive, name = _member(path)
+    if archive is None:
+        return False
+    try:
+        archive.getinfo(name)
+    except KeyError:
+        return False
+    return True
+
+
+def open_xml(path):
+    """
+    The function to open an xml file for reading, from its folder or from its
+    archive.
+
+    Returns
+    -------
+    text file object
+
+    Raises
+    ------
+    FileNotFoundError
+    """
+    if os.path.isfile(path):
+        return open(path, 'r')
+    archive, name = _member(path)
+    if archive is not None:
+        try:
+            return io.TextIOWrapper(archive.open(name), encoding='utf-8')
+        except KeyError:
+            pass
+    raise FileNotFoundError(path)
+
+
+def list_xml(folder, pattern='*.xml'):
+    """
+    The function to list the files of an xml folder or of its archive
+    matching pattern.
+
+    Returns
+    -------
+    list of strings
+        the paths, as if every file was in the folder
+    """
+    names = set()
+    if os.path.isdir(folder):
+        names.update(fnmatch.filter(os.listdir(folder), pattern))
+    archive = _archive(folder)
+    if archive is not None:
+        names.update(fnmatch.filter(archive.namelist(), pattern))
+    return [os.path.join(folder, name) for name in sorted(names)]
+
+
+def output_dir(xml_file):
+    """
+    The function to get the folder the outputs of an xml file are written in,
+    created when the xml file is in an archive.
+    """
+    folder = os.path.dirname(xml_file)
+    os.makedirs(folder, exist_ok=True)
+    return folder
+
+
+def stored(folder):
+    """
+    The function to check if the xml files of a structure are stored, in a
+    folder or in an archive.
+    """
+    return os.path.exists(folder) or os.path.exists(archive_of(folder))
+
+
+def pack(folder, remove=True):
+    """
+    The function to pack the xml files of a folder in its archive.
+
+    Parameters
+    ----------
+    folder : string
+        the <name>_PDBePISA_xml_files folder
+    remove : boolean
+        remove the xml files once the archive is written, the folder is
+        removed when nothing else is left in it
+
+    Returns
+    -------
+    string
+        the archive
+    """
+    folder = folder.rstrip('/').rstrip(os.sep)
+    path = archive_of(folder)
+    names = sorted(fnmatch.filter(os.listdir(folder), '*.xml') + fnmatch.filter(os.listdir(folder), '*.json'))
+
+    tmp = path+'.part'
+    with zipfile.ZipFile(tmp, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        if os.path.exists(path):
+            with zipfile.ZipFile(path, 'r') as previous:
+                for name in previous.namelist():
+                    if name not in names:
+                        archive.writestr(previous.getinfo(name), previous.read(name))
+        for name in names:
+            archive.write(os.path.join(folder, name), name)
+    with zipfile.ZipFile(tmp, 'r') as archive:
+        if archive.testzip() is not None:
+            raise IOError("Corrupted archive "+tmp)
+    os.replace(tmp, path)
+
+    if remove:
+        for name in names:
+            os.remove(os.path.join(folder, name))
+        if not os.listdir(folder):
+            os.rmdir(folder)
+
+    return path
+
+
+def unpack(folder):
+    """
+    The function to extract the archive of a folder back into the folder.
+    """
+    with zipfile.ZipFile(archive_of(folder), 'r') as archive:
+        archive.extractall(folder)
+    os.remove(archive_of(folder))
+
+
+def find_archives(root_dir):
+    """
+    The function to list the archives of a directory, one level deep like
+    Parse_Interfacetable.find_xml_files().
+
+    Returns
+    -------
+    list of strings
+        the xml folders of the archives
+    """
+    folders = []
+    for root, dirs, files in os.walk(root_dir):
+        if root.count(os.sep) - root_dir.count(os.sep) < 2:
+            folders += [os.path.join(root, f[:-len(EXTENSION)]) for f in files if f.endswith(SUFFIX+EXTENSION)]
+    return sorted(folders)
+
+
+if __name__ == '__main__':
+
+    PARSER = argparse.ArgumentParser()
+
+    PARSER.add_argument("root_dir", help="the directory of the _PDBePISA_xml_files folders", type=str)
+
+    PARSER.add_argument("--unpack", help="extract the archives back into folders", action='store_true')
+
+    ARGS = PARSER.parse_args()
+
+    if ARGS.unpack:
+        for FOLDER in find_archives(ARGS.root_dir):
+            unpack(FOLDER)
+            print("Extracted "+FOLDER)
+    else:
+        for ROOT, DIRS, FILES in os.walk(ARGS.root_dir):
+            for DIR in sorted(DIRS):
+                if DIR.endswith(SUFFIX):
+                    print("Packed "+pack(os.path.join(ROOT, DIR)))
+            DIRS[:] = [d for d in DIRS if not d.endswith(SUFFIX)]
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import Auto_Naccess as an
+import Pdb_Structure as ps
+
+
+def structure(n_residues=30, seed=0):
+    rng = np.random.default_rng(seed)
+    n = n_residues * 4
+    xyz = np.cumsum(rng.normal(0, 1.2, (n, 3)), axis=0)
+    names = ['N', 'CA', 'C', 'O'] * n_residues
+    return ps.from_columns(['ATOM'] * n, np.arange(1, n + 1), names, [''] * n, ['ALA'] * n, ['A'] * n,
+                           np.repeat(np.arange(1, n_residues + 1), 4), [''] * n, xyz, np.ones(n),
+                           np.zeros(n), [name[0] for name in names])
+
+
+def test_same_areas_as_biopython(tmp_path):
+    pdb = pytest.importorskip('Bio.PDB')
+    from Bio.PDB.SASA import ShrakeRupley
+    ps.write_pdb(structure(), str(tmp_path / 'a.pdb'))
+    #the coordinates as rounded in the pdb file
+    atoms = ps.load_pdb(str(tmp_path / 'a.pdb'))
+    model = pdb.PDBParser(QUIET=True).get_structure('a', str(tmp_path / 'a.pdb'))[0]
+    ShrakeRupley(n_points=100).compute(model, level='A')
+
+    areas = an.shrake_rupley(atoms, n_points=100)
+
+    assert np.allclose(areas, [a.sasa for a in model.get_atoms()], atol=1e-6)
+
+
+def test_small_chunks_give_the_same_areas():
+    atoms = structure(60)
+
+    assert np.allclose(an.shrake_rupley(atoms, chunk=500), an.shrake_rupley(atoms))
+
+
+def test_isolated_atom_is_fully_exposed():
+    atoms = structure(1)[:1]
+
+    assert an.shrake_rupley(atoms)[0] == pytest.approx(4 * np.pi * (1.55 + 1.40) ** 2)
+
+
+def test_alternate_locations_are_counted_once():
+    atoms = structure(5)
+    copy = atoms[8:12].copy()
+    atoms['altloc'][8:12] = 'A'
+    copy['altloc'] = 'B'
+    copy['xyz'] += 0.3
+    with_alternates = np.concatenate([atoms, copy])
+
+    assert len(ps.first_altlocs(with_alternates)) == len(atoms)
+    assert an.residue_access(with_alternates, 'solo').equals(an.residue_access(atoms, 'solo'))
+
+
+def test_chain_files_and_tables_go_to_the_results_directory(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    atoms = structure(20)
+    atoms['chain'][40:] = 'B'
+    results = str(tmp_path / 'run1')
+    dico = {'A': ['B 11'], 'B': ['A 10']}
+
+    an.pdb_solo_chains('ab.pdb', atoms, results=results)
+    an.pdb_complex_chains('ab.pdb', dico, atoms, results=results)
+    merged = an.call_naccess(dico, None, 'ab.pdb', backend='shrake', results=results)
+
+    assert not (tmp_path / 'Results').exists()
+    for k in dico:
+        assert sorted(p.name for p in (tmp_path / 'run1' / 'ab.pdb' / ('chain_'+k)).iterdir()) == \
+            [k+'_access.csv', k+'_complex.pdb', k+'_solo.pdb']
+        assert (merged[k]['solo access'] >= merged[k]['complex access']).all()
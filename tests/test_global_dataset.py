@@ -0,0 +1,70 @@
+import os
+import threading
+
+import pandas as pd
+
+import Global_Dataset as gd
+import Pisa_Api
+import Synthetic_Pisa as sp
+
+
+def tables(n):
+    return {'interfaces': pd.DataFrame({'NUMBER': list(range(n))}),
+            'bonds': pd.DataFrame({'chain1': ['A'] * n, 'interaction type': ['Hydrogen bond'] * n}),
+            'residues': pd.DataFrame({'RESIDUE': ['ALA %d' % i for i in range(n)]})}
+
+
+def test_numeric_looking_names_survive_compaction(tmp_path):
+    dataset = gd.GlobalDataset(str(tmp_path))
+    for name, n in (('1e10', 2), ('1234', 3), ('NA', 1), ('6ta5.pdb', 4)):
+        dataset.ingest(name, tables(n))
+
+    dataset.compact(part_rows=3)
+
+    bonds = dataset.read('bonds')
+    assert sorted(bonds['STRUCTURE'].unique()) == ['1234', '1e10', '6ta5.pdb', 'NA']
+    assert len(bonds) == 10
+    assert len(dataset.read('residues', ['1e10'])) == 2
+    assert not os.listdir(tmp_path / 'bonds' / 'delta')
+
+
+def test_ingest_again_replaces_the_rows(tmp_path):
+    dataset = gd.GlobalDataset(str(tmp_path))
+    dataset.ingest('6ta5', tables(2))
+    dataset.compact()
+
+    assert dataset.ingest('6ta5', tables(2)) is False
+    assert dataset.ingest('6ta5', tables(5)) is True
+    assert len(dataset.read('bonds')) == 5
+    dataset.compact()
+    assert len(dataset.read('bonds')) == 5
+    assert dataset.campaign_stats()['hydrogen_bonds'] == 5
+
+
+def test_read_waits_for_the_compaction(tmp_path):
+    dataset = gd.GlobalDataset(str(tmp_path))
+    dataset.ingest('6ta5', tables(2))
+    rows = []
+    reader = threading.Thread(target=lambda: rows.append(len(dataset.read('bonds'))))
+
+    with dataset._lock():
+        reader.start()
+        reader.join(0.3)
+        assert reader.is_alive()
+    reader.join(5)
+
+    assert rows == [2]
+
+
+def test_ingest_tables_reads_the_written_tables(tmp_path):
+    xml_dir = sp.generate(str(tmp_path), n_chains=3, n_interfaces=2, n_residues=20, name='s.pdb')['xml_dir']
+    result = Pisa_Api.process_structure(xml_dir)
+    folder = result.save(str(tmp_path / 'out'))
+    from_xml = gd.GlobalDataset(str(tmp_path / 'xml'))
+    from_tables = gd.GlobalDataset(str(tmp_path / 'tables'))
+
+    from_xml.ingest_xml(xml_dir)
+    assert from_tables.ingest_tables(xml_dir, folder, prefix='s.pdb_') is True
+
+    assert from_tables.manifest()['s.pdb']['counts'] == from_xml.manifest()['s.pdb']['counts']
+    assert len(from_tables.read('residues')) == len(result.residues)
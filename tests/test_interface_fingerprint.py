@@ -0,0 +1,77 @@
+import pandas as pd
+
+import Interface_Fingerprint as ifp
+from Pisa_Records import Bonds, Interface
+
+HBOND = 'Hydrogen bond'
+
+
+def interface(number, chain1, chain2, pairs):
+    res1, res2 = zip(*pairs)
+    interface = Interface(number, Bonds([chain1] * len(pairs), list(res1), [3.0] * len(pairs),
+                                        [chain2] * len(pairs), list(res2)))
+    interface.fingerprint, interface.swapped, interface.chains = ifp.interface_fingerprint(interface)
+    return interface
+
+
+def sheet(*pairs):
+    rows = [{'chain1': c1, 'chain2': c2, 'interaction type': HBOND, 'res1': r1, 'res2': r2}
+            for c1, c2, bonds in pairs for r1, r2 in bonds]
+    return pd.DataFrame(rows)
+
+
+BONDS = [('ASN  37[ ND2]', 'GLU  12[ OE1]'), ('LYS   5[ NZ ]', 'ASP  40[ OD2]')]
+REVERSED = [(r2, r1) for r1, r2 in BONDS]
+
+
+def test_swapped_copy_has_the_same_fingerprint():
+    forward = ifp.fingerprint([(HBOND, r1, r2) for r1, r2 in BONDS])
+    backward = ifp.fingerprint([(HBOND, r1, r2) for r1, r2 in REVERSED])
+
+    assert forward[0] == backward[0]
+    assert {forward[1], backward[1]} == {True, False}
+
+
+def test_symmetric_pair_has_no_orientation():
+    fp, swapped = ifp.fingerprint([(HBOND, 'ASN 37', 'ASN 37'), (HBOND, 'GLU 12', 'LYS 5'),
+                                   (HBOND, 'LYS 5', 'GLU 12')])
+
+    assert fp is not None and swapped is None
+    assert ifp.fingerprint([]) == (None, None)
+
+
+def test_interface_residues_are_fingerprinted():
+    bonds = [(HBOND, r1, r2) for r1, r2 in BONDS]
+
+    assert ifp.fingerprint(bonds, [(1, 'ASN 37')])[0] != ifp.fingerprint(bonds, [(1, 'ALA 38')])[0]
+    assert ifp.fingerprint(bonds, [(1, 'ASN 37')])[0] != ifp.fingerprint(bonds, [(2, 'ASN 37')])[0]
+    assert ifp.fingerprint(bonds, [(1, 'ASN 37')])[0] == \
+        ifp.fingerprint([(HBOND, r1, r2) for r1, r2 in REVERSED], [(2, 'ASN 37')])[0]
+
+
+def test_side_map_follows_the_orientation():
+    assert ifp.side_map(('C', 'D'), True, ('A', 'B'), True) == {'A': 'C', 'B': 'D'}
+    assert ifp.side_map(('D', 'C'), False, ('A', 'B'), True) == {'A': 'C', 'B': 'D'}
+
+
+def test_interface_duplicates_maps_the_chains_of_the_copies():
+    interfaces = [interface(1, 'A', 'B', BONDS), interface(2, 'D', 'C', REVERSED),
+                  interface(3, 'A', 'E', [('SER 1', 'THR 2')])]
+
+    copies = ifp.interface_duplicates(interfaces)
+
+    assert copies == {2: (1, {'A': 'C', 'B': 'D'})}
+    assert ifp.table_duplicates(ifp.fingerprint_table(interfaces)) == copies
+
+
+def test_same_bonds_on_other_chains_are_copies():
+    bonds = sheet(('A', 'B', BONDS), ('C', 'D', BONDS), ('A', 'E', [('SER 1', 'THR 2')]))
+
+    assert ifp.pair_duplicates(bonds) == {('C', 'D'): ('A', 'B')}
+    assert ifp.chain_duplicates(bonds) == {'D': 'B'}
+
+
+def test_pairs_are_not_confused_by_their_chain_names():
+    bonds = sheet(('A', 'BC', BONDS), ('AB', 'C', [('SER 1', 'THR 2')]), ('X', 'Y', BONDS))
+
+    assert ifp.pair_duplicates(bonds) == {('X', 'Y'): ('A', 'BC')}
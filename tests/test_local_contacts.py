@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+import Local_Contacts as lc
+
+
+@pytest.mark.parametrize('cutoff', [1.0, 3.5, 8.0])
+def test_close_pairs_are_the_brute_force_pairs(cutoff):
+    coords = np.random.default_rng(1).uniform(-20, 20, (400, 3))
+
+    i, j, distance = lc.close_pairs(coords, cutoff)
+
+    full = np.sqrt(((coords[:, None] - coords[None]) ** 2).sum(axis=2))
+    expected = {(a, b) for a, b in zip(*np.nonzero(full <= cutoff)) if a < b}
+    assert set(zip(i.tolist(), j.tolist())) == expected
+    assert len(i) == len(expected)
+    assert np.allclose(distance, full[i, j])
+
+
+def test_close_pairs_of_a_single_point():
+    i, j, distance = lc.close_pairs(np.zeros((1, 3)), 4.0)
+
+    assert len(i) == len(j) == len(distance) == 0
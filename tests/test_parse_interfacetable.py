@@ -0,0 +1,15 @@
+import Parse_Interfacetable as pi
+import Synthetic_Pisa as sp
+import Xml_Archive as xa
+
+
+def test_a_folder_and_its_archive_are_found_once(tmp_path):
+    first = sp.generate(str(tmp_path), name='a.pdb')['xml_dir']
+    second = sp.generate(str(tmp_path), name='b.pdb')['xml_dir']
+    xa.pack(first, remove=False)
+    xa.pack(second)
+
+    found = pi.find_xml_files(str(tmp_path))
+
+    assert len(found) == len(set(found)) == 2
+    assert sorted(found) == sorted(xml_dir+'/interfacetable.xml' for xml_dir in (first, second))
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+
+import Auto_Naccess as an
+import Pdb_Structure as ps
+
+
+def write_cif(path, chains):
+    lines = ['data_test', 'loop_']
+    lines += ['_atom_site.'+item for item in ('group_PDB', 'id', 'type_symbol', 'label_atom_id',
+                                              'label_comp_id', 'auth_asym_id', 'auth_seq_id',
+                                              'Cartn_x', 'Cartn_y', 'Cartn_z', 'occupancy')]
+    for i, chain in enumerate(chains):
+        lines.append('ATOM %d C CA ALA %s 1 %d.0 0.0 0.0 1.0' % (i + 1, chain, i))
+    path.write_text('\n'.join(lines)+'\n#\n')
+
+
+def test_long_cif_chains_stay_apart(tmp_path):
+    write_cif(tmp_path / 'big.cif', ['AAAAA1', 'AAAAA2'])
+
+    atoms = ps.load_structure(str(tmp_path / 'big.cif'))
+
+    assert ps.chains(atoms) == ['AAAAA1', 'AAAAA2']
+
+
+def test_too_long_chain_raises():
+    with pytest.raises(ValueError):
+        ps.from_columns(['ATOM'], [1], ['CA'], [''], ['ALA'], ['X'*(ps.CHAIN_WIDTH + 1)], [1], [''],
+                        np.zeros((1, 3)), [1.0], [0.0], ['C'])
+
+
+def test_aliases_are_distinct_in_a_file():
+    names = ['A', 'AA', 'AB', 'B']
+
+    aliases = ps.chain_aliases(names, taken=['A', 'B'])
+
+    assert set(aliases) == {'AA', 'AB'}
+    assert len(set(aliases.values())) == 2
+    assert not set(aliases.values()) & {'A', 'B'}
+
+
+def test_aliases_raise_past_the_free_characters():
+    names = ['C%02d' % i for i in range(len(ps.ALIAS_CHARACTERS) + 1)]
+
+    with pytest.raises(ValueError):
+        ps.chain_aliases(names)
+
+
+def two_letter_structure(n_chains):
+    names = [a+b for a in 'ABCDEFGHIJ' for b in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'][:n_chains]
+    n = len(names)
+    return ps.from_columns(['ATOM']*n, np.arange(1, n + 1), ['CA']*n, ['']*n, ['ALA']*n, names,
+                           np.ones(n, dtype=int), ['']*n, np.zeros((n, 3)), np.ones(n), np.zeros(n),
+                           ['C']*n), names
+
+
+def read_chain_column(path):
+    return [line[21] for line in open(path) if line.startswith('ATOM')]
+
+
+def test_solo_and_complex_files_agree_on_the_alias(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    atoms, names = two_letter_structure(120)
+    #'AA' and 'CK' got the same alias when the aliases wrapped around 62 chains
+    dico = {'AA': ['CK 1', 'AB 1'], 'CK': ['AA 1']}
+
+    an.pdb_solo_chains('big.cif', atoms)
+    an.pdb_complex_chains('big.cif', dico, atoms)
+
+    folder = tmp_path / 'Results' / 'big.cif'
+    for k in dico:
+        complex_column = read_chain_column(folder / ('chain_'+k) / (k+'_complex.pdb'))
+        assert len(set(complex_column)) == len(dico[k]) + 1
+        alias = an.written_chain(k, 'big.cif')
+        assert read_chain_column(folder / ('chain_'+k) / (k+'_solo.pdb')) == [alias]
+        assert complex_column.count(alias) == 1
+
+
+def test_hybrid_36_and_overflowing_serials_are_read(tmp_path):
+    lines = ['ATOM  99999  CA  ALA A   1       1.000   2.000   3.000  1.00  0.00           C',
+             'ATOM  A0000  CA  ALA A   2       4.000   5.000   6.000  1.00  0.00           C',
+             'ATOM  *****  CA  ALA A   3       7.000   8.000   9.000  1.00  0.00           C']
+    (tmp_path / 'big.pdb').write_text('\n'.join(lines)+'\nEND\n')
+
+    atoms = ps.load_pdb(str(tmp_path / 'big.pdb'))
+
+    assert atoms['serial'].tolist() == [99999, 2, 3]
+    assert atoms['resseq'].tolist() == [1, 2, 3]
+    assert atoms['xyz'][1].tolist() == [4.0, 5.0, 6.0]
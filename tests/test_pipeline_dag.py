@@ -0,0 +1,73 @@
+import pytest
+
+import Pipeline_Dag as dag
+
+
+@pytest.fixture
+def stages(monkeypatch):
+    """
+    Stub stages run in threads, parse fails for the structures named in
+    failing.
+    """
+    calls, failing = [], set()
+
+    def stub(stage):
+        def run(task):
+            calls.append((task['name'], stage))
+            if stage == 'parse' and task['name'] in failing:
+                raise ValueError("bad xml")
+            return True
+        return run
+
+    monkeypatch.setattr(dag, 'THREAD_KINDS', ('network', 'browser', 'cpu', 'binary'))
+    monkeypatch.setattr(dag, 'STAGE_FUNCTIONS', {stage: stub(stage) for stage, kind, needs in dag.STAGES})
+    return calls, failing
+
+
+def test_a_failed_stage_blocks_only_its_dependents(tmp_path, stages):
+    calls, failing = stages
+    failing.add('bad.pdb')
+    tasks = dag.make_tasks('good bad', False, results=str(tmp_path / 'Results'))
+
+    state = dag.run_pipeline(tasks, results=str(tmp_path / 'Results'))
+
+    assert all(entry['status'] == 'done' for entry in state['good.pdb'].values())
+    bad = {stage: entry['status'] for stage, entry in state['bad.pdb'].items()}
+    assert bad['parse'] == 'failed'
+    assert {stage for stage, status in bad.items() if status == 'blocked'} == \
+        {'chains', 'access', 'plots', 'aggregate', 'crosscheck'}
+    assert {stage for stage, status in bad.items() if status == 'done'} == {'fetch', 'pisa', 'contacts'}
+    assert ('bad.pdb', 'chains') not in calls
+
+
+def test_a_rerun_skips_the_done_stages(tmp_path, stages):
+    calls, failing = stages
+    results = str(tmp_path / 'Results')
+    failing.add('bad.pdb')
+    dag.run_pipeline(dag.make_tasks('good bad', False, results=results), results=results)
+    assert dag.load_state(results)['bad.pdb']['parse']['status'] == 'failed'
+
+    failing.clear()
+    del calls[:]
+    state = dag.run_pipeline(dag.make_tasks('good bad', False, results=results), results=results)
+
+    assert sorted(calls) == sorted(('bad.pdb', stage) for stage in
+                                   ('parse', 'chains', 'access', 'plots', 'aggregate', 'crosscheck'))
+    assert all(entry['status'] == 'done' for entries in state.values() for entry in entries.values())
+    assert dag.load_state(results) == state
+
+
+def test_the_command_line_gives_the_task_options():
+    args = dag.parse_args(['6ta5 6iol', '--backend', 'shrake', '--no_cache', '--cache_size', '2', '--jobs', '3'])
+
+    tasks = dag.tasks_from(args)
+
+    assert [task['name'] for task in tasks] == ['6ta5.pdb', '6iol.pdb']
+    assert tasks[0]['backend'] == 'shrake' and tasks[0]['cache'] is False
+    assert tasks[0]['cache_size'] == 2 * 1024**2
+    assert dag.limits_from(args)['binary'] == 3
+
+
+def test_naccess_needs_its_path():
+    with pytest.raises(SystemExit):
+        dag.parse_args(['6ta5'])
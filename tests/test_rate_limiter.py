@@ -0,0 +1,48 @@
+import Rate_Limiter as rl
+
+
+def run(limiter, seconds, error=False):
+    limiter.acquire()
+    limiter.release(seconds, error=error)
+
+
+def test_growing_structures_are_not_a_slowdown():
+    limiter = rl.AdaptiveLimiter(rate=1.0, burst=100, max_concurrency=4, max_rate=2.0)
+
+    for seconds in (60, 75, 90, 110, 130, 160, 190, 230, 280, 330):
+        run(limiter, seconds)
+
+    assert limiter.stats()['concurrency'] == 4
+    assert limiter.rate == 2.0
+
+
+def test_a_sudden_jump_is_a_slowdown():
+    limiter = rl.AdaptiveLimiter(rate=1.0, burst=100, concurrency=4, max_concurrency=4)
+    for _ in range(5):
+        run(limiter, 60)
+
+    run(limiter, 300)
+
+    assert limiter.limit == 3.0
+    assert limiter.rate == 0.75
+
+
+def test_errors_halve_and_do_not_change_the_latency():
+    limiter = rl.AdaptiveLimiter(rate=1.0, burst=100, concurrency=2, max_concurrency=2)
+    run(limiter, 60)
+
+    run(limiter, 1, error=True)
+
+    assert limiter.limit == 1.0
+    assert limiter.rate == 0.5
+    assert limiter.latency == 60
+    assert limiter.stats()['error_rate'] == 0.5
+
+
+def test_bounds_are_kept():
+    limiter = rl.AdaptiveLimiter(rate=0.02, burst=100, min_rate=0.01)
+    for _ in range(5):
+        run(limiter, 10, error=True)
+
+    assert limiter.stats()['concurrency'] == 1
+    assert limiter.rate == 0.01
@@ -0,0 +1,24 @@
+import os
+
+import Residue_xml_parser as rxp
+import Synthetic_Pisa as sp
+
+
+def outputs(xml_dir):
+    return sorted(f for f in os.listdir(xml_dir) if f.startswith('Residue'))
+
+
+def test_lazy_plots_are_rendered_on_demand_and_skipped_ones_never(tmp_path):
+    lazy = sp.generate(str(tmp_path), n_residues=20, name='lazy.pdb')['xml_dir']
+    skip = sp.generate(str(tmp_path), n_residues=20, name='skip.pdb')['xml_dir']
+
+    rxp.render_residue_plots([os.path.join(lazy, 'residue0.xml')], plots='lazy')
+    rxp.render_residue_plots([os.path.join(skip, 'residue0.xml')], plots='skip')
+
+    assert outputs(lazy) == ['ResiduePlot.pending', 'ResidueTable.csv']
+    assert outputs(skip) == ['ResidueTable.csv']
+
+    assert rxp.render_pending(str(tmp_path)) == [os.path.join(lazy, 'ResidueTable.csv')]
+    assert outputs(lazy) == ['ResiduePlot.pdf', 'ResidueTable.csv']
+    assert outputs(skip) == ['ResidueTable.csv']
+    assert rxp.render_pending(str(tmp_path)) == []
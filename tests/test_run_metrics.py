@@ -0,0 +1,35 @@
+import os
+
+import Run_Metrics as rm
+
+
+def test_finish_run_without_a_run_returns_none():
+    assert rm.finish_run() is None
+
+
+def test_run_writes_its_events_and_prometheus_file(tmp_path):
+    events = rm.start_run(str(tmp_path), script='test')
+    rm.count('retries')
+    with rm.timer('parse.xml'):
+        pass
+
+    prometheus = rm.finish_run()
+
+    assert os.path.dirname(events) == os.path.dirname(prometheus) == str(tmp_path)
+    assert 'retries' in open(prometheus).read()
+    assert rm.finish_run() is None
+
+
+def test_counters_are_written_per_label_set(tmp_path):
+    rm.start_run(str(tmp_path))
+    rm.count('tasks_done', stage='parse')
+    rm.count('tasks_done', stage='parse')
+    rm.count('tasks_done', stage='plots')
+    rm.count('retries', 2)
+
+    lines = open(rm.finish_run()).read().splitlines()
+
+    assert 'pisapy_tasks_done_total{stage="parse"} 2' in lines
+    assert 'pisapy_tasks_done_total{stage="plots"} 1' in lines
+    assert 'pisapy_retries_total 2' in lines
+    assert lines.count('# TYPE pisapy_tasks_done_total counter') == 1
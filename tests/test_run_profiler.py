@@ -0,0 +1,49 @@
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+import Pdb_Structure as ps
+import Run_Profiler as rp
+
+
+def atoms(n):
+    return ps.from_columns(['ATOM'] * n, np.arange(n), ['CA'] * n, [''] * n, ['ALA'] * n, ['A'] * n,
+                           np.arange(n), [''] * n, np.zeros((n, 3)), np.ones(n), np.zeros(n), ['C'] * n)
+
+
+def test_nothing_is_written_without_a_directory(tmp_path):
+    with rp.profiled('parse', None, '6ta5.pdb'):
+        atoms(10)
+
+    assert rp.write_report(str(tmp_path)) is None
+
+
+def test_report_ranks_the_scripts_and_their_allocation_sites(tmp_path):
+    kept = []
+    with rp.profiled('parse', str(tmp_path), '6ta5.pdb'):
+        kept.append(atoms(200000))
+
+    calls = rp.load_calls(str(tmp_path))
+    report = open(rp.write_report(str(tmp_path))).read()
+
+    [(call, prof)] = calls['parse']
+    assert call['name'] == '6ta5.pdb' and call['peak'] > 0
+    #the site is the line of the script, not the numpy line below it
+    assert calls['parse'][0][0]['sites'][0]['site'].startswith('Pdb_Structure.py:')
+    assert 'Pdb_Structure.py' in report.split('Top functions by cumulative time')[0]
+    assert 'tracemalloc traces the whole process' in report
+
+
+def test_site_is_the_innermost_script_line_above_the_library():
+    def frame(filename, lineno):
+        return SimpleNamespace(filename=filename, lineno=lineno)
+
+    #oldest frame first, as in tracemalloc
+    traceback = [frame(os.path.join(rp.SCRIPTS_DIR, 'Pipeline_Dag.py'), 150),
+                 frame(os.path.join(rp.SCRIPTS_DIR, 'Residue_xml_parser.py'), 77),
+                 frame('/usr/lib/python3/pandas/core/frame.py', 716)]
+
+    assert rp.site_of(traceback) == 'Residue_xml_parser.py:77 (/usr/lib/python3/pandas/core/frame.py:716)'
+    assert rp.site_of(traceback[:2]) == 'Residue_xml_parser.py:77'
+    assert rp.site_of(traceback[2:]) == '/usr/lib/python3/pandas/core/frame.py:716'
@@ -0,0 +1,91 @@
+import os
+import stat
+import threading
+
+import pytest
+
+import Structure_Cache as sc
+
+
+@pytest.fixture
+def umask_022():
+    old = os.umask(0o022)
+    yield
+    os.umask(old)
+
+
+def source(tmp_path, name, size):
+    path = tmp_path / name
+    path.write_bytes(b'x' * size)
+    return str(path)
+
+
+def mode(path):
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+def test_everything_is_group_writable(tmp_path, umask_022):
+    cache = sc.StructureCache(str(tmp_path / 'cache'))
+
+    cache.put('1abc', 'pdb', source(tmp_path, 'in.pdb', 10))
+
+    assert mode(cache.root) == sc.DIR_MODE
+    assert mode(os.path.join(cache.root, 'pdb')) == sc.DIR_MODE
+    assert mode(os.path.join(cache.root, '.lock')) == sc.FILE_MODE
+    assert mode(os.path.join(cache.root, 'stats.json')) == sc.FILE_MODE
+    assert mode(cache.path('1abc', 'pdb')) == sc.FILE_MODE
+
+
+def test_overwrite_counts_the_bytes_once(tmp_path):
+    cache = sc.StructureCache(str(tmp_path / 'cache'))
+
+    cache.put('1abc', 'pdb', source(tmp_path, 'a.pdb', 100))
+    cache.put('1abc', 'pdb', source(tmp_path, 'b.pdb', 40))
+
+    assert cache.stats()['bytes'] == 40
+    assert cache.stats()['stores'] == 2
+
+
+def test_concurrent_stores_of_a_file_count_it_once(tmp_path):
+    cache = sc.StructureCache(str(tmp_path / 'cache'))
+    src = source(tmp_path, 'a.pdb', 100)
+    writers = [threading.Thread(target=cache.put, args=('1abc', 'pdb', src)) for _ in range(8)]
+
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+
+    assert cache.stats()['bytes'] == 100
+    assert cache.stats()['stores'] == 8
+
+
+def test_least_recently_used_is_evicted(tmp_path):
+    cache = sc.StructureCache(str(tmp_path / 'cache'), max_bytes=250)
+    for i, key in enumerate(('1aaa', '2bbb')):
+        cache.put(key, 'pdb', source(tmp_path, key, 100))
+        os.utime(cache.path(key, 'pdb'), (1000 + i, 1000 + i))
+    cache.get('1aaa', 'pdb')
+
+    cache.put('3ccc', 'pdb', source(tmp_path, '3ccc', 100))
+
+    assert cache.get('2bbb', 'pdb') is None
+    assert cache.get('1aaa', 'pdb') is not None
+    assert cache.stats()['evictions'] == 1
+    assert cache.stats()['bytes'] == 200
+
+
+def test_copy_of_an_evicted_file_is_a_miss(tmp_path, monkeypatch):
+    cache = sc.StructureCache(str(tmp_path / 'cache'))
+    cache.put('1abc', 'pdb', source(tmp_path, 'a.pdb', 10))
+    get = cache.get
+
+    def get_then_evict(key, fmt):
+        path = get(key, fmt)
+        os.remove(path)
+        return path
+    monkeypatch.setattr(cache, 'get', get_then_evict)
+
+    assert cache.copy_to('1abc', 'pdb', str(tmp_path / 'out.pdb')) is None
+    assert cache.stats()['hits'] == 0
+    assert cache.stats()['misses'] == 1
@@ -0,0 +1,66 @@
+import json
+import os
+
+import Job_Supervisor as js
+import Work_Lease as wl
+
+
+def test_a_claimed_item_is_not_claimed_twice(tmp_path):
+    node1 = wl.LeaseDir(str(tmp_path), heartbeat=3600)
+    node2 = wl.LeaseDir(str(tmp_path), heartbeat=3600)
+
+    assert node1.claim('6ta5.pdb')
+    assert not node2.claim('6ta5.pdb')
+    assert node2.owner_of('6ta5.pdb') == node1.owner
+
+    node1.release('6ta5.pdb')
+    assert node2.claim('6ta5.pdb')
+    node1.close()
+    node2.close()
+
+
+def test_done_items_are_never_claimed_again(tmp_path):
+    node1 = wl.LeaseDir(str(tmp_path), heartbeat=3600)
+    node2 = wl.LeaseDir(str(tmp_path), heartbeat=3600)
+
+    node1.claim('6ta5.pdb')
+    node1.release('6ta5.pdb', done=True)
+
+    assert node1.owner_of('6ta5.pdb') is None
+    assert not node2.claim('6ta5.pdb')
+    node1.close()
+    node2.close()
+
+
+def test_an_expired_lease_is_reclaimed(tmp_path):
+    crashed = wl.LeaseDir(str(tmp_path), ttl=10, heartbeat=3600)
+    node = wl.LeaseDir(str(tmp_path), ttl=10, heartbeat=3600)
+    crashed.claim('6ta5.pdb')
+    #the node dies without releasing its lease, its heartbeat stops
+    crashed._stop.set()
+    os.utime(os.path.join(str(tmp_path), '6ta5.pdb.lease'), (0, 0))
+
+    assert node.claim('6ta5.pdb')
+    assert node.owner_of('6ta5.pdb') == node.owner
+    node.close()
+
+
+def test_a_dead_lettered_job_is_left_for_a_later_run(tmp_path):
+    def failing():
+        raise ValueError("parser crashed")
+    dead_letter = str(tmp_path / 'dead.jsonl')
+    leases = wl.LeaseDir(str(tmp_path / 'leases'), heartbeat=3600)
+    leases.claim('6ta5.pdb')
+
+    outcome = js.supervise('6ta5.pdb', failing, retries=0, dead_letter=dead_letter)
+    leases.release('6ta5.pdb', done=outcome in js.FINISHED)
+
+    assert outcome == 'error'
+    assert json.loads(open(dead_letter).readline())['name'] == '6ta5.pdb'
+    assert leases.claim('6ta5.pdb')
+    leases.close()
+
+
+def test_finished_outcomes():
+    assert js.supervise('a', lambda: True) in js.FINISHED
+    assert js.supervise('b', lambda: False) == 'no_contacts'